@@ -1,21 +1,45 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from .config import settings
 from .database import init_db
-from .routes import auth, users, places, modes, routes_api, chat_routes
+from .middleware import AdmissionMiddleware, DeadlineMiddleware
+from .services import foursquare_service
+from .services.mistral_client import mistral_client
+from .services.reverse_geocoder import get_reverse_geocoder
+from .services.autocomplete import autocomplete_index
+from .services.session_store import run_session_sweeper
+from .routes import auth, users, places, modes, routes_api, chat_routes, metrics
 
 app = FastAPI(title="URNAV Backend", version="0.1.0")
 
+# Innermost of the three, so shed responses still get CORS headers and queue waits count against the deadline
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Partial", "X-Degraded", "Retry-After"],
 )
+app.add_middleware(DeadlineMiddleware)
 
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    # Parsing the locality dump and indexing the gazetteer take seconds on a
+    # full GeoNames file: do it now, in a thread, rather than on the event
+    # loop inside the first request (autocomplete's budget is 1 s)
+    await asyncio.to_thread(get_reverse_geocoder)
+    await asyncio.to_thread(autocomplete_index.warm)
+    app.state.session_sweeper = asyncio.create_task(run_session_sweeper(settings.SESSION_SWEEP_INTERVAL_SECONDS))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.session_sweeper.cancel()
+    await mistral_client.aclose()
+    await foursquare_service.aclose()
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(users.router, prefix="/users", tags=["users"])
@@ -23,4 +47,5 @@ app.include_router(places.router, prefix="/places", tags=["places"])
 app.include_router(modes.router, prefix="/modes", tags=["modes"])
 app.include_router(routes_api.router, prefix="/routes", tags=["routes"])
 app.include_router(chat_routes.router, tags=["chat"])
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
 
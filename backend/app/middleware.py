@@ -0,0 +1,103 @@
+import json
+from urllib.parse import parse_qs
+from .config import settings
+from .services import admission, deadline
+from .services.admission import AdmissionController, admission_controller
+
+DEADLINE_HEADER = b"x-request-deadline"
+DEADLINE_PARAM = "deadline"
+
+class DeadlineMiddleware:
+    """Gives every HTTP request a latency budget that downstream calls clamp to.
+
+    The budget (seconds) comes from the X-Request-Deadline header or the
+    `deadline` query parameter, else the per-route default in
+    settings.REQUEST_DEADLINES, else settings.REQUEST_DEADLINE_SECONDS, and is
+    capped at settings.REQUEST_DEADLINE_MAX_SECONDS. Responses built after the
+    budget ran out carry an X-Partial: true header. WebSockets are left alone;
+    their connections outlive any single budget.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        seconds = self._requested(scope)
+        if seconds is None:
+            seconds = deadline.route_budget(scope["path"], settings.REQUEST_DEADLINES, settings.REQUEST_DEADLINE_SECONDS)
+        seconds = min(seconds, settings.REQUEST_DEADLINE_MAX_SECONDS)
+
+        with deadline.request_deadline(seconds) as budget:
+            async def send_with_marker(message):
+                if message["type"] == "http.response.start" and budget.partial:
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-partial", b"true")]}
+                await send(message)
+
+            await self.app(scope, receive, send_with_marker)
+
+    def _requested(self, scope) -> float | None:
+        raw = dict(scope.get("headers") or []).get(DEADLINE_HEADER)
+        if raw is None:
+            values = parse_qs(scope.get("query_string", b"").decode()).get(DEADLINE_PARAM)
+            raw = values[0].encode() if values else None
+        if raw is None:
+            return None
+        try:
+            seconds = float(raw)
+        except ValueError:
+            return None
+        return seconds if seconds > 0 else None
+
+class AdmissionMiddleware:
+    """Admission control for the expensive routes listed in settings.ADMISSION_LIMITS.
+
+    Each configured path prefix is a route class with its own in-flight cap
+    (see AdmissionController). Requests admitted under load run degraded and
+    say so with X-Degraded: true; requests turned away get a fast 503 with
+    Retry-After instead of queueing into a timeout. Paths outside the listed
+    classes (auth, metrics, status polling) pass straight through, so they
+    stay responsive however busy the expensive routes are.
+    """
+
+    def __init__(self, app, controller: AdmissionController | None = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        route_class = self.controller.route_class(scope["path"]) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            mode = await self.controller.admit(route_class)
+        except admission.Shed as shed:
+            await self._reject(send, shed)
+            return
+        async def send_with_marker(message):
+            if message["type"] == "http.response.start" and mode == admission.DEGRADED:
+                message = {**message, "headers": [*message.get("headers", []), (b"x-degraded", b"true")]}
+            await send(message)
+
+        try:
+            with admission.admitted_as(mode):
+                await self.app(scope, receive, send_with_marker)
+        finally:
+            self.controller.release(route_class)
+
+    async def _reject(self, send, shed: admission.Shed):
+        body = json.dumps({"error": "Server is busy, please retry shortly", "retry_after": shed.retry_after}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(shed.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
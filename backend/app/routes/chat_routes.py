@@ -1,8 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator
 from ..services.chat_handler import ChatHandler
 from ..services.foursquare_service import FoursquareService
+from ..services import deadline
+import json
 import uuid
 
 router = APIRouter()
@@ -18,6 +21,8 @@ class ChatResponse(BaseModel):
     response: str
     user_id: str
     user_info: Dict[str, Any]
+    # Set when the request deadline ran out and the reply was built without everything
+    partial: bool = False
 
 class LocationInfo(BaseModel):
     lat: float
@@ -49,12 +54,13 @@ async def chat_endpoint(chat_message: ChatMessage):
         )
         
         # Get updated user info
-        user_info = chat_handler.get_user_info(user_id)
+        user_info = await chat_handler.get_user_info(user_id)
         
         return ChatResponse(
             response=response,
             user_id=user_id,
-            user_info=user_info
+            user_info=user_info,
+            partial=deadline.is_partial()
         )
         
     except HTTPException:
@@ -63,13 +69,74 @@ async def chat_endpoint(chat_message: ChatMessage):
         print(f"Chat endpoint error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+def _location_error(location: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not location:
+        return "Location information is required"
+    if not isinstance(location.get("lat"), (int, float)) or not isinstance(location.get("lon"), (int, float)):
+        return "Invalid location coordinates"
+    return None
+
+async def _sse_events(user_id: str, chat_message: ChatMessage) -> AsyncIterator[str]:
+    try:
+        async for event in chat_handler.stream_message(user_id, chat_message.message, chat_message.location):
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    except Exception as e:
+        print(f"Chat stream error: {e}")
+        yield f"event: error\ndata: {json.dumps({'type': 'error', 'message': 'Internal server error'})}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(chat_message: ChatMessage):
+    """
+    Same as /chat, but streams the reply as server-sent events:
+    status (while places are searched), token (reply text as it arrives), done
+    """
+    error = _location_error(chat_message.location)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    
+    user_id = chat_message.user_id or str(uuid.uuid4())
+    return StreamingResponse(
+        _sse_events(user_id, chat_message),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    """
+    WebSocket chat: send {"message", "user_id", "location"} per turn and
+    receive the same events as /chat/stream as JSON messages
+    """
+    await websocket.accept()
+    user_id = None
+    try:
+        while True:
+            payload = await websocket.receive_json()
+            user_id = payload.get("user_id") or user_id or str(uuid.uuid4())
+            location = payload.get("location")
+            error = _location_error(location)
+            if error or not payload.get("message"):
+                await websocket.send_json({"type": "error", "message": error or "Message is required"})
+                continue
+            
+            try:
+                async for event in chat_handler.stream_message(user_id, payload["message"], location):
+                    await websocket.send_json(event)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                print(f"Chat websocket error: {e}")
+                await websocket.send_json({"type": "error", "message": "Internal server error"})
+    except WebSocketDisconnect:
+        pass
+
 @router.get("/chat/user/{user_id}")
 async def get_user_info(user_id: str):
     """
     Get user information and conversation history
     """
     try:
-        user_info = chat_handler.get_user_info(user_id)
+        user_info = await chat_handler.get_user_info(user_id)
         return {"user_id": user_id, "user_info": user_info}
     except Exception as e:
         print(f"Get user info error: {e}")
@@ -81,7 +148,7 @@ async def clear_user_conversation(user_id: str):
     Clear conversation history for a user
     """
     try:
-        chat_handler.clear_conversation(user_id)
+        await chat_handler.clear_conversation(user_id)
         return {"message": "Conversation cleared successfully", "user_id": user_id}
     except Exception as e:
         print(f"Clear conversation error: {e}")
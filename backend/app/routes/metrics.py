@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from ..services.admission import admission_controller
+from ..services.metrics import metrics
+from ..services.response_cache import response_cache
+from ..services.tile_cache import tile_cache
+from ..services.foursquare_service import hedge_policy, scheduler
+
+router = APIRouter()
+
+@router.get("")
+async def get_metrics():
+    """Counters and timings collected since startup"""
+    snapshot = metrics.snapshot()
+    snapshot["mistral_cache"] = response_cache.stats()
+    snapshot["search_tiles"] = tile_cache.stats()
+    snapshot["foursquare"] = hedge_policy.stats()
+    snapshot["upstream_queues"] = scheduler.stats()
+    snapshot["admission"] = admission_controller.stats()
+    return snapshot
@@ -1,26 +1,34 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
 import traceback
-from typing import List, Any, Dict
-from ..services.foursquare_service import FoursquareService
+from typing import AsyncIterator, List, Any, Dict
+from ..services.foursquare_service import FoursquareService, PHOTO_CONCURRENCY
 from ..services.places_manager import PlacesManager
 from ..services.task_manager import TaskManager
-from math import radians, cos, sin, asin, sqrt
+from ..services.meeting_planner import MeetingPlanner, OBJECTIVES
+from ..services.result_cache import MAX_PAGE_SIZE, result_cache
+from ..services.density_model import density_model
+from ..services.geo import haversine_km
+from ..services import deadline
+from ..services.personalizer import UserVector, personalizer
+from ..services.search_pipeline import SearchPipeline, results_of
+from ..models.user import User
+from .auth import get_optional_user
 
 router = APIRouter()
 
 # Initialize services
 places_manager = PlacesManager()
 task_manager = TaskManager()
+meeting_planner = MeetingPlanner()
 
-def haversine(a: tuple[float, float], b: tuple[float, float]) -> float:
-    lon1, lat1, lon2, lat2 = map(radians, [a[1], a[0], b[1], b[0]])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    h = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    return 6371 * 2 * asin(sqrt(h))
+# Candidates fetched per meet-group search, so also the most results it can return
+MEET_GROUP_CANDIDATES = 50
 
 @router.post("/plan-day")
-async def plan_day(body: Dict[str, Any]):
+async def plan_day(body: Dict[str, Any], current: User | None = Depends(get_optional_user)):
     from ..services.mistral_service import MistralService
     
     try:
@@ -30,9 +38,6 @@ async def plan_day(body: Dict[str, Any]):
         origin = body.get("origin") or {"lat": 26.9124, "lng": 75.7873}
         user_id = body.get("user_id", "anonymous")
         
-        # Clean up old sessions
-        task_manager.cleanup_old_sessions()
-        
         # Parse tasks from text if provided
         if text and not tasks:
             try:
@@ -50,44 +55,29 @@ async def plan_day(body: Dict[str, Any]):
         task_places = await places_manager.find_places_for_tasks(
             tasks, 
             origin["lat"], 
-            origin["lng"]
+            origin["lng"],
+            vector=personalizer.vector(current),
         )
         
-        # Add tasks to the session with their places
-        session = task_manager.add_tasks(user_id, origin["lat"], origin["lng"], task_places)
-        
-        # Calculate route summary (only for pending tasks with valid coordinates)
-        pending_tasks = [t for t in task_places if t["status"] == "pending" and t["lat"] and t["lng"]]
-        
-        total_distance = 0
-        if len(pending_tasks) > 0:
-            # Calculate distance from origin to first task
-            if len(pending_tasks) > 0:
-                first_task = (pending_tasks[0]["lat"], pending_tasks[0]["lng"])
-                origin_coords = (origin["lat"], origin["lng"])
-                total_distance += haversine(origin_coords, first_task)
+        async with task_manager.lock(user_id):
+            # Add tasks to the session with their places
+            session = await task_manager.add_tasks(user_id, origin["lat"], origin["lng"], task_places)
             
-            # Calculate total distance between remaining stops
-            if len(pending_tasks) > 1:
-                for i in range(len(pending_tasks) - 1):
-                    current = (pending_tasks[i]["lat"], pending_tasks[i]["lng"])
-                    next_stop = (pending_tasks[i + 1]["lat"], pending_tasks[i + 1]["lng"])
-                    total_distance += haversine(current, next_stop)
-        
-        # Estimate travel time (assuming 4.5 km/h walking speed)
-        eta_min = int(total_distance / 4.5 * 60)
+            # Order the pending stops from the origin using the session's distance matrix
+            route = await task_manager.replan(user_id, origin["lat"], origin["lng"])
         
-        return {
+        return deadline.annotate({
             "origin": origin,
             "tasks": task_places,
+            "route": route["stops"],
             "summary": {
-                "distance_km": round(total_distance, 1),
-                "eta_min": eta_min,
+                "distance_km": route["distance_km"],
+                "eta_min": route["eta_min"],
                 "total_tasks": len(task_places),
                 "pending_tasks": len([t for t in task_places if t["status"] == "pending"]),
                 "completed_tasks": len([t for t in task_places if t["status"] == "completed"])
             }
-        }
+        })
         
     except Exception as e:
         print(f"Error in plan_day: {e}")
@@ -101,6 +91,7 @@ async def complete_task(body: Dict[str, Any]):
         task_name = body.get("task")
         user_id = body.get("user_id", "anonymous")
         origin = body.get("origin")
+        current_location = body.get("current_location")
         
         if not task_name:
             return {"error": "Task name is required"}
@@ -109,19 +100,25 @@ async def complete_task(body: Dict[str, Any]):
             return {"error": "Origin coordinates are required"}
         
         # Mark the task as completed
-        session = task_manager.complete_task(user_id, origin["lat"], origin["lng"], task_name)
+        async with task_manager.lock(user_id):
+            session = await task_manager.complete_task(user_id, origin["lat"], origin["lng"], task_name, current_location)
         
         if not session:
             return {"error": "Task not found or session not found"}
         
         # Get updated session summary
-        summary = task_manager.get_session_summary(user_id, origin["lat"], origin["lng"])
+        summary = await task_manager.get_session_summary(user_id, origin["lat"], origin["lng"])
         
         return {
             "success": True,
             "message": f"Task '{task_name}' marked as completed",
             "session_summary": summary,
-            "updated_tasks": session["tasks"]
+            "updated_tasks": session["tasks"],
+            "route": session["route"]["stops"],
+            "summary": {
+                "distance_km": session["route"]["distance_km"],
+                "eta_min": session["route"]["eta_min"]
+            }
         }
         
     except Exception as e:
@@ -129,18 +126,50 @@ async def complete_task(body: Dict[str, Any]):
         traceback.print_exc()
         return {"error": f"Failed to complete task: {str(e)}"}
 
+@router.post("/plan-day/location")
+async def update_location(body: Dict[str, Any]):
+    """Re-plan the remaining stops from the user's current position"""
+    try:
+        user_id = body.get("user_id", "anonymous")
+        origin = body.get("origin")
+        current_location = body.get("current_location")
+        
+        if not origin or "lat" not in origin or "lng" not in origin:
+            return {"error": "Origin coordinates are required"}
+        
+        if not current_location or "lat" not in current_location or "lng" not in current_location:
+            return {"error": "Current location coordinates are required"}
+        
+        async with task_manager.lock(user_id):
+            route = await task_manager.replan(user_id, origin["lat"], origin["lng"], current_location)
+        
+        if route is None:
+            return {"error": "Session not found"}
+        
+        return {
+            "success": True,
+            "current_location": route["start"],
+            "route": route["stops"],
+            "summary": {
+                "distance_km": route["distance_km"],
+                "eta_min": route["eta_min"]
+            }
+        }
+        
+    except Exception as e:
+        print(f"Error updating location: {e}")
+        traceback.print_exc()
+        return {"error": f"Failed to update location: {str(e)}"}
+
 @router.get("/plan-day/status")
 async def get_task_status(user_id: str, lat: float, lng: float):
     """Get current task status for a user at a location"""
     try:
-        # Clean up old sessions
-        task_manager.cleanup_old_sessions()
-        
         # Get session summary
-        summary = task_manager.get_session_summary(user_id, lat, lng)
+        summary = await task_manager.get_session_summary(user_id, lat, lng)
         
         # Get all tasks
-        tasks = task_manager.get_all_tasks(user_id, lat, lng)
+        tasks = await task_manager.get_all_tasks(user_id, lat, lng)
         
         return {
             "session_summary": summary,
@@ -156,22 +185,13 @@ async def get_task_status(user_id: str, lat: float, lng: float):
 async def free_places(lat: float = 26.9124, lon: float = 75.9231):
     fs = FoursquareService()
     try:
-        data = await fs.search(lat, lon, query="park", radius=3000)
-        results = data.get("results", [])
-        
-        # Add photos to each result
-        for place in results:
-            try:
-                place_id = place.get("fsq_place_id")
-                if place_id:
-                    photos = await fs.get_photos(place_id, limit=3)
-                    place["photos"] = photos
-                else:
-                    place["photos"] = []
-            except Exception:
-                place["photos"] = []
-        
-        return {"results": results}
+        radius = density_model.radius_for(lat, lon, "park", want=10, default=3000, max_radius=10000)
+        result = await SearchPipeline(
+            "free_places",
+            fetch=lambda: results_of(fs.search(lat, lon, query="park", radius=radius)),
+            hydrate=lambda items: fs.attach_photos(items, limit=3),
+        ).run()
+        return {"results": result.results}
     except Exception:
         traceback.print_exc()
         # Fallback data when Foursquare API fails - Updated for new API
@@ -224,18 +244,15 @@ async def meet_friend(body: Dict[str, Any]):
     mid = {"lat": (user["lat"]+friend["lat"])/2, "lon": (user["lon"]+friend["lon"])/2}
     
     # Calculate distance between friends to ensure reasonable search
-    distance_km = haversine((user["lat"], user["lon"]), (friend["lat"], friend["lon"]))
+    distance_km = haversine_km((user["lat"], user["lon"]), (friend["lat"], friend["lon"]))
     
     # Adjust search radius based on distance between friends
     # Ensure we don't search too far from the midpoint
     max_radius = min(radius, int(distance_km * 1000 * 0.8))  # 80% of distance between friends
-    search_radius = min(max_radius, 2000)  # Cap at 2km
+    # As small as the area's density allows; 2km where we know nothing about it yet
+    search_radius = density_model.radius_for(mid["lat"], mid["lon"], activity, want=10, default=min(max_radius, 2000), max_radius=max_radius)
     
-    fs = FoursquareService()
-    try:
-        results = await fs.search(mid["lat"], mid["lon"], query=activity, radius=search_radius)
-        payload = results.get("results", [])
-        
+    def between_friends(payload: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         # Filter results to ensure they're reasonably between the two friends
         # Calculate distance from midpoint and filter out places that are too far
         filtered_payload = []
@@ -245,14 +262,22 @@ async def meet_friend(body: Dict[str, Any]):
             
             if place_lat and place_lon:
                 # Calculate distance from midpoint
-                place_distance = haversine((mid["lat"], mid["lon"]), (place_lat, place_lon))
+                place_distance = haversine_km((mid["lat"], mid["lon"]), (place_lat, place_lon))
                 # Only include places within reasonable distance from midpoint
                 if place_distance <= (distance_km * 0.6):  # Within 60% of friends' distance
                     filtered_payload.append(place)
         
         # If no results after filtering, use original payload
-        if not filtered_payload:
-            filtered_payload = payload
+        return filtered_payload or payload
+    
+    fs = FoursquareService()
+    try:
+        result = await SearchPipeline(
+            "meet_friend",
+            fetch=lambda: results_of(fs.search(mid["lat"], mid["lon"], query=activity, radius=search_radius)),
+            filters=[between_friends],
+        ).run()
+        filtered_payload = result.results
             
     except Exception:
         traceback.print_exc()
@@ -278,123 +303,280 @@ async def meet_friend(body: Dict[str, Any]):
     
     return {"midpoint": mid, "results": filtered_payload}
 
+@router.post("/meet-group")
+async def meet_group(body: Dict[str, Any]):
+    """Find meeting spots for any number of participants"""
+    participants_in: List[Dict[str, Any]] = body.get("participants") or []
+    activity = body.get("activity")
+    objective = body.get("objective", "total")
+    try:
+        limit = int(body.get("limit", 10))
+    except (TypeError, ValueError):
+        return {"error": "Limit must be a whole number"}
+    limit = min(max(limit, 1), MEET_GROUP_CANDIDATES)
+    
+    participants = []
+    for p in participants_in:
+        lat = p.get("lat")
+        lon = p.get("lon", p.get("lng"))
+        if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+            participants.append((lat, lon))
+    
+    if len(participants) < 2:
+        return {"error": "At least two participants with lat/lon are required"}
+    
+    if objective not in OBJECTIVES:
+        return {"error": f"Objective must be one of: {', '.join(OBJECTIVES)}"}
+    
+    center, spread_km = meeting_planner.search_center(participants)
+    
+    # Search around the median, wide enough to reach roughly half way to the furthest participant,
+    # or less where the area is dense enough to fill the candidate list closer in
+    spread_radius = int(min(max(spread_km * 1000 * 0.5, 1000), 10000))
+    search_radius = density_model.radius_for(center["lat"], center["lon"], activity, want=MEET_GROUP_CANDIDATES, default=spread_radius, min_radius=1000, max_radius=spread_radius)
+    
+    fs = FoursquareService()
+    
+    async def candidates() -> List[Dict[str, Any]]:
+        try:
+            return await results_of(fs.search(center["lat"], center["lon"], query=activity, radius=search_radius, limit=MEET_GROUP_CANDIDATES))
+        except Exception:
+            traceback.print_exc()
+            return _meet_group_fallback(center)
+    
+    result = await SearchPipeline(
+        "meet_group",
+        fetch=candidates,
+        rank=[lambda items: meeting_planner.rank(items, participants, objective)],
+        limit=limit,
+    ).run()
+    
+    return {
+        "center": center,
+        "objective": objective,
+        "search_radius": search_radius,
+        "results": result.results
+    }
+
+def _meet_group_fallback(center: Dict[str, float]) -> List[Dict[str, Any]]:
+    """Demo candidates used when Foursquare is unavailable"""
+    return [
+        {
+            "fsq_place_id": "demo-mg-1",
+            "name": "Midpoint Café",
+            "categories": [{"name": "Cafe"}],
+            "latitude": center["lat"] + 0.001,
+            "longitude": center["lon"] + 0.001,
+            "rating": 4.4,
+            "photos": ["https://images.unsplash.com/photo-1554118811-1e0d58224f24?w=400&h=300&fit=crop"]
+        },
+        {
+            "fsq_place_id": "demo-mg-2",
+            "name": "City Park Meetup Spot",
+            "categories": [{"name": "Park"}],
+            "latitude": center["lat"] - 0.001,
+            "longitude": center["lon"] - 0.001,
+            "rating": 4.5,
+            "photos": ["https://images.unsplash.com/photo-1441974231531-c6227db76b6e?w=400&h=300&fit=crop"]
+        },
+    ]
+
+# Queries fanned out by the explorer: a general search plus a few popular categories
+EXPLORER_QUERIES = ["", "restaurant", "park", "cafe", "shop"]
+
+def _explorer_radius(lat: float, lon: float, query: str, radius: int | None) -> int:
+    """The caller's radius, else the smallest one likely to fill a page for this query (20km if unknown)"""
+    if radius:
+        return radius
+    return density_model.radius_for(lat, lon, query, want=20, default=20000, max_radius=20000)
+
+def _explorer_fallback(lat: float, lon: float) -> Dict[str, Any]:
+    """Demo data used when Foursquare is unavailable"""
+    return {
+        "results": [
+            {
+                "fsq_place_id": "demo-attraction-1",
+                "name": "City Palace",
+                "categories": [{"name": "Historic Site"}],
+                "distance": 1200,
+                "rating": 4.6,
+                "latitude": lat + 0.001,
+                "longitude": lon + 0.001,
+                "photos": ["https://images.unsplash.com/photo-1566073771259-6a8506099945?w=400&h=300&fit=crop"]
+            },
+            {
+                "fsq_place_id": "demo-attraction-2",
+                "name": "Hawa Mahal",
+                "categories": [{"name": "Palace"}],
+                "distance": 800,
+                "rating": 4.4,
+                "latitude": lat - 0.001,
+                "longitude": lon - 0.001,
+                "photos": ["https://images.unsplash.com/photo-1566073771259-6a8506099945?w=400&h=300&fit=crop"]
+            },
+            {
+                "fsq_place_id": "demo-food-1",
+                "name": "Local Restaurant",
+                "categories": [{"name": "Restaurant"}],
+                "distance": 500,
+                "rating": 4.2,
+                "latitude": lat + 0.002,
+                "longitude": lon + 0.002,
+                "photos": ["https://images.unsplash.com/photo-1414235077428-338989a2e8c0?w=400&h=300&fit=crop"]
+            },
+            {
+                "fsq_place_id": "demo-park-1",
+                "name": "Central Park",
+                "categories": [{"name": "Park"}],
+                "distance": 400,
+                "rating": 4.3,
+                "latitude": lat - 0.002,
+                "longitude": lon - 0.002,
+                "photos": ["https://images.unsplash.com/photo-1441974231531-c6227db76b6e?w=400&h=300&fit=crop"]
+            },
+            {
+                "fsq_place_id": "demo-cafe-1",
+                "name": "Local Café",
+                "categories": [{"name": "Cafe"}],
+                "distance": 600,
+                "rating": 4.1,
+                "latitude": lat + 0.003,
+                "longitude": lon + 0.003,
+                "photos": ["https://images.unsplash.com/photo-1501339847302-ac426a4a7cbb?w=400&h=300&fit=crop"]
+            }
+        ]
+    }
+
 @router.get("/explorer")
-async def explorer(lat: float = 26.9124, lon: float = 75.9231, radius: int = 20000):
+async def explorer(
+    lat: float = 26.9124,
+    lon: float = 75.9231,
+    radius: int | None = None,
+    page_size: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    current: User | None = Depends(get_optional_user),
+):
     fs = FoursquareService()
+    
+    # Later pages come straight from the cached result set
+    if cursor:
+        page = result_cache.page(cursor, page_size)
+        if page is None:
+            raise HTTPException(status_code=410, detail="Cursor expired or invalid, start a new search")
+        items, next_cursor, total = page
+        await fs.attach_photos([p for p in items if "photos" not in p], limit=3)
+        return {"results": items, "next_cursor": next_cursor, "total": total}
+    
     try:
         print(f"Explorer search: lat={lat}, lon={lon}, radius={radius}")
         
-        # Search for various types of places with broader queries
-        must = await fs.search(lat, lon, query="", radius=radius)  # General search
-        food = await fs.search(lat, lon, query="restaurant", radius=radius)
-        parks = await fs.search(lat, lon, query="park", radius=radius)
-        cafes = await fs.search(lat, lon, query="cafe", radius=radius)
-        shops = await fs.search(lat, lon, query="shop", radius=radius)
-        
-        # Combine all results into a single array
-        all_results = []
-        
-        # Add general places
-        if must.get("results"):
-            all_results.extend(must["results"])
-        
-        # Add food places
-        if food.get("results"):
-            all_results.extend(food["results"])
-        
-        # Add parks
-        if parks.get("results"):
-            all_results.extend(parks["results"])
-        
-        # Add cafes
-        if cafes.get("results"):
-            all_results.extend(cafes["results"])
-        
-        # Add shops
-        if shops.get("results"):
-            all_results.extend(shops["results"])
-        
-        # Remove duplicates based on fsq_place_id
-        seen_ids = set()
-        unique_results = []
-        for place in all_results:
-            if place.get("fsq_place_id") and place["fsq_place_id"] not in seen_ids:
-                seen_ids.add(place["fsq_place_id"])
-                unique_results.append(place)
-        
-        # Sort by distance
-        unique_results.sort(key=lambda x: x.get("distance", 999999))
-        
-        # Add photos to each result
-        for place in unique_results:
-            try:
-                place_id = place.get("fsq_place_id")
-                if place_id:
-                    photos = await fs.get_photos(place_id, limit=3)
-                    place["photos"] = photos
-                else:
-                    place["photos"] = []
-            except Exception:
-                place["photos"] = []
-        
-        print(f"Found {len(unique_results)} unique places")
-        return {"results": unique_results}
+        async def search_all() -> List[Dict[str, Any]]:
+            # Search for various types of places concurrently
+            responses = await asyncio.gather(
+                *(fs.search(lat, lon, query=q, radius=_explorer_radius(lat, lon, q, radius)) for q in EXPLORER_QUERIES),
+                return_exceptions=True,
+            )
+            # Searches that failed or ran past the deadline are skipped; only if all did is it an error
+            failures = [r for r in responses if isinstance(r, BaseException)]
+            if len(failures) == len(responses):
+                raise failures[0]
+            if failures:
+                deadline.mark_partial()
+            return [place for data in responses if not isinstance(data, BaseException) for place in data.get("results") or []]
+        
+        # Merged, deduplicated and sorted by distance, then personalised; only what is returned gets photos
+        vector = personalizer.vector(current)
+        result = await SearchPipeline(
+            "explorer",
+            fetch=search_all,
+            rank=[
+                lambda items: sorted(items, key=lambda x: x.get("distance", 999999)),
+                lambda items: personalizer.rerank(items, vector),
+            ],
+            page_size=page_size,
+            hydrate=lambda items: fs.attach_photos(items, limit=3),
+        ).run()
+        
+        if page_size:
+            print(f"Found {result.total} unique places, returning first {len(result.results)}")
+            return deadline.annotate({"results": result.results, "next_cursor": result.next_cursor, "total": result.total})
+        
+        print(f"Found {result.total} unique places")
+        return deadline.annotate({"results": result.results})
         
     except Exception as e:
         print(f"Explorer error: {e}")
         traceback.print_exc()
-        # Fallback data when Foursquare API fails - Updated for new API
-        return {
-            "results": [
-                {
-                    "fsq_place_id": "demo-attraction-1",
-                    "name": "City Palace",
-                    "categories": [{"name": "Historic Site"}],
-                    "distance": 1200,
-                    "rating": 4.6,
-                    "latitude": lat + 0.001,
-                    "longitude": lon + 0.001,
-                    "photos": ["https://images.unsplash.com/photo-1566073771259-6a8506099945?w=400&h=300&fit=crop"]
-                },
-                {
-                    "fsq_place_id": "demo-attraction-2",
-                    "name": "Hawa Mahal",
-                    "categories": [{"name": "Palace"}],
-                    "distance": 800,
-                    "rating": 4.4,
-                    "latitude": lat - 0.001,
-                    "longitude": lon - 0.001,
-                    "photos": ["https://images.unsplash.com/photo-1566073771259-6a8506099945?w=400&h=300&fit=crop"]
-                },
-                {
-                    "fsq_place_id": "demo-food-1",
-                    "name": "Local Restaurant",
-                    "categories": [{"name": "Restaurant"}],
-                    "distance": 500,
-                    "rating": 4.2,
-                    "latitude": lat + 0.002,
-                    "longitude": lon + 0.002,
-                    "photos": ["https://images.unsplash.com/photo-1414235077428-338989a2e8c0?w=400&h=300&fit=crop"]
-                },
-                {
-                    "fsq_place_id": "demo-park-1",
-                    "name": "Central Park",
-                    "categories": [{"name": "Park"}],
-                    "distance": 400,
-                    "rating": 4.3,
-                    "latitude": lat - 0.002,
-                    "longitude": lon - 0.002,
-                    "photos": ["https://images.unsplash.com/photo-1441974231531-c6227db76b6e?w=400&h=300&fit=crop"]
-                },
-                {
-                    "fsq_place_id": "demo-cafe-1",
-                    "name": "Local Café",
-                    "categories": [{"name": "Cafe"}],
-                    "distance": 600,
-                    "rating": 4.1,
-                    "latitude": lat + 0.003,
-                    "longitude": lon + 0.003,
-                    "photos": ["https://images.unsplash.com/photo-1501339847302-ac426a4a7cbb?w=400&h=300&fit=crop"]
-                }
-            ]
-        }
+        return _explorer_fallback(lat, lon)
+
+@router.get("/explorer/stream")
+async def explorer_stream(
+    lat: float = 26.9124,
+    lon: float = 75.9231,
+    radius: int | None = None,
+    current: User | None = Depends(get_optional_user),
+):
+    """Explorer as NDJSON: place batches as each search lands, then photos, then done.
+
+    Event shapes:
+    - {"type": "places", "query": str, "results": [...]}  new unique places only
+    - {"type": "photos", "fsq_place_id": str, "photos": [...]}
+    - {"type": "error", "query": str, "message": str}
+    - {"type": "done", "total": int, "fallback": bool}
+    """
+    return StreamingResponse(_explorer_events(lat, lon, radius, personalizer.vector(current)), media_type="application/x-ndjson")
+
+async def _explorer_events(lat: float, lon: float, radius: int | None, vector: UserVector | None = None) -> AsyncIterator[str]:
+    fs = FoursquareService()
+    photo_semaphore = asyncio.Semaphore(PHOTO_CONCURRENCY)
+    
+    async def search(query: str):
+        try:
+            return query, await fs.search(lat, lon, query=query, radius=_explorer_radius(lat, lon, query, radius)), None
+        except Exception as e:
+            return query, None, e
+    
+    async def photos(place_id: str):
+        async with photo_semaphore:
+            return place_id, await fs.get_photos(place_id, limit=3)
+    
+    search_tasks = [asyncio.create_task(search(q)) for q in EXPLORER_QUERIES]
+    photo_tasks: List[asyncio.Task] = []
+    seen_ids: set[str] = set()
+    try:
+        for next_done in asyncio.as_completed(search_tasks):
+            query, data, error = await next_done
+            if error is not None:
+                print(f"Explorer stream error for '{query}': {error}")
+                yield json.dumps({"type": "error", "query": query, "message": str(error)}) + "\n"
+                continue
+            
+            # Results arrive nearest first; reranking keeps that as the baseline
+            batch = []
+            for place in personalizer.rerank(data.get("results") or [], vector):
+                place_id = place.get("fsq_place_id")
+                if place_id and place_id not in seen_ids:
+                    seen_ids.add(place_id)
+                    batch.append(place)
+            if not batch:
+                continue
+            
+            yield json.dumps({"type": "places", "query": query, "results": batch}) + "\n"
+            # Start photo lookups now so they overlap with the remaining searches
+            photo_tasks.extend(asyncio.create_task(photos(p["fsq_place_id"])) for p in batch)
+        
+        if not seen_ids:
+            fallback = _explorer_fallback(lat, lon)["results"]
+            yield json.dumps({"type": "places", "query": None, "results": fallback}) + "\n"
+            yield json.dumps({"type": "done", "total": len(fallback), "fallback": True}) + "\n"
+            return
+        
+        for next_done in asyncio.as_completed(photo_tasks):
+            place_id, urls = await next_done
+            yield json.dumps({"type": "photos", "fsq_place_id": place_id, "photos": urls}) + "\n"
+        
+        yield json.dumps(deadline.annotate({"type": "done", "total": len(seen_ids), "fallback": False})) + "\n"
+    finally:
+        # Client went away or we finished early: don't leave upstream calls running
+        for task in search_tasks + photo_tasks:
+            task.cancel()
@@ -4,6 +4,13 @@ import re
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
 from ..services.foursquare_service import FoursquareService
+from ..services.result_cache import MAX_PAGE_SIZE, result_cache
+from ..services.place_index import place_index
+from ..services.density_model import density_model
+from ..services.autocomplete import autocomplete_index
+from ..services.reverse_geocoder import get_reverse_geocoder
+from ..services.personalizer import personalizer
+from ..services.search_pipeline import SearchPipeline, results_of
 from .auth import get_current_user, get_optional_user
 from ..models.user import User
 
@@ -18,31 +25,39 @@ async def places_search(
     tags: str | None = None,
     near: str | None = None,
     lang: str | None = Query(None, alias="lang"),
+    limit: int | None = None,
+    page_size: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
     db: AsyncSession = Depends(get_db),
     current: User | None = Depends(get_optional_user),
 ):
     fs = FoursquareService()
+    
+    # Later pages come straight from the cached result set
+    if cursor:
+        page = result_cache.page(cursor, page_size)
+        if page is None:
+            raise HTTPException(status_code=410, detail="Cursor expired or invalid, start a new search")
+        items, next_cursor, total = page
+        await fs.attach_photos([p for p in items if "photos" not in p], limit=3)
+        return {"results": items, "next_cursor": next_cursor, "total": total}
+    
     try:
-        data = await fs.search(lat, lon, query=query, radius=radius, categories=tags, near=near, lang=lang)
-        items = data.get("results") or []
-        
-        # Add photos to each result
-        for place in items:
-            try:
-                place_id = place.get("fsq_place_id")
-                if place_id:
-                    photos = await fs.get_photos(place_id, limit=3)
-                    place["photos"] = photos
-                else:
-                    place["photos"] = []
-            except Exception:
-                place["photos"] = []
-        
-        if current and current.dislikes:
-            dislikes = set(current.dislikes.keys())
-            # NEW: Use fsq_place_id instead of fsq_id
-            items = [i for i in items if str(i.get("fsq_place_id")) not in dislikes]
-        return {"results": items}
+        if radius is None and lat is not None and lon is not None:
+            # No radius given: use what this area's density suggests, or leave it to Foursquare
+            radius = density_model.radius_for(lat, lon, query or tags, want=limit or 20, default=None)
+        vector = personalizer.vector(current)
+        # Dislikes and the user's taste apply before the page is cut and only that page gets photos
+        result = await SearchPipeline(
+            "places_search",
+            fetch=lambda: results_of(fs.search(lat, lon, query=query, radius=radius, categories=tags, near=near, lang=lang, limit=limit or 20)),
+            rank=[lambda items: personalizer.rerank(items, vector)],
+            page_size=page_size,
+            hydrate=lambda items: fs.attach_photos(items, limit=3),
+        ).run()
+        if page_size:
+            return {"results": result.results, "next_cursor": result.next_cursor, "total": result.total}
+        return {"results": result.results}
     except Exception:
         traceback.print_exc()
         # Fallback data when Foursquare API fails - Updated for new API
@@ -70,11 +85,7 @@ async def places_search(
                 "photos": ["https://images.unsplash.com/photo-1558618666-fcd25c85cd64?w=400&h=300&fit=crop"]
             }
         ]
-        if current and current.dislikes:
-            dislikes = set(current.dislikes.keys())
-            # NEW: Use fsq_place_id instead of fsq_id
-            fallback_items = [i for i in fallback_items if str(i.get("fsq_place_id")) not in dislikes]
-        return {"results": fallback_items}
+        return {"results": personalizer.rerank(fallback_items, personalizer.vector(current))}
 
 @router.get("/geocode")
 async def geocode(query: str | None = Query(None), lat: float | None = Query(None), lon: float | None = Query(None), db: AsyncSession = Depends(get_db)):
@@ -91,6 +102,18 @@ async def geocode(query: str | None = Query(None), lat: float | None = Query(Non
                 coord_match = re.match(r'^(-?\d+\.?\d*),?\s*(-?\d+\.?\d*)$', query.strip())
                 query_lat = float(coord_match.group(1))
                 query_lon = float(coord_match.group(2))
+            # Offline lookup first; Foursquare is only asked for points outside the locality dataset
+            nearest = get_reverse_geocoder().lookup(query_lat, query_lon)
+            if nearest:
+                return {
+                    "lat": query_lat,
+                    "lon": query_lon,
+                    "name": ", ".join(part for part in (nearest["locality"], nearest["region"]) if part),
+                    "id": "reverse-geocode-offline",
+                    "locality": nearest["locality"],
+                    "region": nearest["region"],
+                    "country": nearest["country"],
+                }
             # Use Foursquare's reverse geocoding or search for nearby places to get location name
             try:
                 # Search for places very close to these coordinates to get location context
@@ -187,6 +210,37 @@ async def geocode(query: str | None = Query(None), lat: float | None = Query(Non
         }
         return fallback
 
+@router.get("/viewport")
+async def viewport(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(14, ge=0, le=20),
+):
+    """Clustered markers for a map viewport, computed from places we've already seen"""
+    if min_lat > max_lat:
+        raise HTTPException(status_code=400, detail="min_lat must not exceed max_lat")
+    clusters = place_index.viewport(min_lat, min_lon, max_lat, max_lon, zoom)
+    return {
+        "zoom": zoom,
+        "clusters": clusters,
+        "total": sum(c["count"] for c in clusters)
+    }
+
+@router.get("/autocomplete")
+async def autocomplete(
+    q: str = Query(..., min_length=1),
+    lat: float | None = Query(None, ge=-90, le=90),
+    lon: float | None = Query(None, ge=-180, le=180),
+    limit: int = Query(8, ge=1, le=25),
+):
+    """Place name suggestions from the gazetteer and venues we've already seen, nearest and most popular first"""
+    return {
+        "query": q,
+        "results": autocomplete_index.search(q, lat, lon, limit),
+    }
+
 @router.get("/{place_id}")
 async def place_details(place_id: str, db: AsyncSession = Depends(get_db), current: User = Depends(get_current_user)):
     fs = FoursquareService()
@@ -4,6 +4,7 @@ from sqlalchemy import select, delete
 from ..database import get_db
 from ..models.user import User
 from ..models.session import Session
+from ..services.personalizer import personalizer
 from ..schemas.users import PreferencesUpdate, DislikeUpdate, HistoryResponse, SessionItem
 from .auth import get_current_user
 
@@ -14,6 +15,7 @@ async def update_preferences(body: PreferencesUpdate, db: AsyncSession = Depends
     current.preferences = body.preferences
     db.add(current)
     await db.commit()
+    personalizer.invalidate(current.id)
     return {"status": "ok", "message": "Preference saved"}
 
 @router.put("/dislikes")
@@ -28,6 +30,7 @@ async def update_dislikes(body: DislikeUpdate, db: AsyncSession = Depends(get_db
     current.dislikes = dislikes
     db.add(current)
     await db.commit()
+    personalizer.invalidate(current.id)
     return {"status": "ok", "message": "Updated"}
 
 @router.get("/history", response_model=HistoryResponse)
@@ -45,4 +48,5 @@ async def reset_memory(db: AsyncSession = Depends(get_db), current: User = Depen
     await db.commit()
     await db.execute(delete(Session).where(Session.user_id == current.id))
     await db.commit()
+    personalizer.invalidate(current.id)
     return {"status": "ok", "message": "Memory reset"}
@@ -0,0 +1,158 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, Optional
+from ..config import settings
+from . import deadline
+from .metrics import metrics
+
+FULL = "full"
+DEGRADED = "degraded"
+
+_mode: ContextVar[str] = ContextVar("admission_mode", default=FULL)
+
+class Shed(Exception):
+    """The request was turned away; the client should come back after retry_after seconds"""
+
+    def __init__(self, route_class: str, retry_after: int):
+        super().__init__(f"{route_class} is overloaded")
+        self.route_class = route_class
+        self.retry_after = retry_after
+
+def degraded() -> bool:
+    """Whether the current request was admitted under load and should skip optional work"""
+    return _mode.get() == DEGRADED
+
+@contextmanager
+def admitted_as(mode: str) -> Iterator[None]:
+    """Run the code inside (and every task it starts) in the given admission mode"""
+    token = _mode.set(mode)
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+class RouteClass:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.queue_delay = 0.0  # moving average of seconds spent waiting for a slot
+        self.admitted = 0
+        self.degraded = 0
+        self.shed = 0
+
+class AdmissionController:
+    """Caps in-flight requests per route class and sheds or degrades the rest.
+
+    A request is admitted in full while its class is below degrade_at of
+    its limit, and degraded (no photos, cached-only searches) between that
+    and the limit. At the limit it waits for a slot, at most queue_timeout
+    seconds and never past its deadline, and is admitted degraded. It is
+    shed at once, with a Retry-After, when the queue is already as long as
+    the limit or waits have recently averaged more than max_queue_delay.
+    """
+
+    def __init__(self, limits: Dict[str, int], degrade_at: float = 0.75, queue_timeout: float = 2.0, max_queue_delay: float = 1.0):
+        self.limits = limits
+        self.degrade_at = degrade_at
+        self.queue_timeout = queue_timeout
+        self.max_queue_delay = max_queue_delay
+        self._classes: Dict[str, RouteClass] = {}
+
+    def route_class(self, path: str) -> Optional[str]:
+        """Longest configured prefix of path, or None for uncontrolled paths (also prefixes set to 0)"""
+        matches = [prefix for prefix in self.limits if path.startswith(prefix)]
+        if not matches:
+            return None
+        prefix = max(matches, key=len)
+        return prefix if self.limits[prefix] > 0 else None
+
+    async def admit(self, name: str) -> str:
+        """Take a slot in the class; returns FULL or DEGRADED, or raises Shed"""
+        route = self._classes.get(name)
+        if route is None:
+            route = self._classes[name] = RouteClass(self.limits[name])
+        if route.in_flight < route.limit and not route.waiters:
+            route.in_flight += 1
+            self._record_wait(route, 0.0)
+            mode = FULL if route.in_flight <= route.limit * self.degrade_at else DEGRADED
+            return self._admitted(name, route, mode)
+
+        if len(route.waiters) >= route.limit or route.queue_delay > self.max_queue_delay:
+            self._shed(name, route)
+        timeout = self.queue_timeout
+        left = deadline.remaining()
+        if left is not None:
+            timeout = min(timeout, left)
+        started = time.monotonic()
+        slot = asyncio.get_running_loop().create_future()
+        route.waiters.append(slot)
+        try:
+            await asyncio.wait_for(slot, max(timeout, 0))
+        except asyncio.TimeoutError:
+            # release() may have handed over the slot just as the wait timed
+            # out (wait_for can still raise then); it's ours, so run with it
+            if not slot.done() or slot.cancelled():
+                self._record_wait(route, time.monotonic() - started)
+                self._shed(name, route)
+        except asyncio.CancelledError:
+            if slot.done() and not slot.cancelled():
+                # Handed a slot just as the client went away: pass it on
+                self.release(name)
+            raise
+        finally:
+            if slot in route.waiters:
+                route.waiters.remove(slot)
+        self._record_wait(route, time.monotonic() - started)
+        return self._admitted(name, route, DEGRADED)
+
+    def release(self, name: str):
+        route = self._classes[name]
+        while route.waiters:
+            slot = route.waiters.popleft()
+            if not slot.done():
+                # The slot passes straight to the next waiter, so in_flight stays put
+                slot.set_result(None)
+                return
+        route.in_flight -= 1
+
+    def _admitted(self, name: str, route: RouteClass, mode: str) -> str:
+        route.admitted += 1
+        if mode == DEGRADED:
+            route.degraded += 1
+            metrics.incr("admission.degraded")
+        return mode
+
+    def _shed(self, name: str, route: RouteClass):
+        route.shed += 1
+        metrics.incr("admission.shed")
+        # Come back once the current queue has likely drained
+        raise Shed(name, max(1, math.ceil(route.queue_delay * (len(route.waiters) + 1))))
+
+    def _record_wait(self, route: RouteClass, seconds: float):
+        route.queue_delay += 0.2 * (seconds - route.queue_delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "limit": route.limit,
+                "in_flight": route.in_flight,
+                "queued": len(route.waiters),
+                "queue_delay_ms": round(route.queue_delay * 1000, 1),
+                "admitted": route.admitted,
+                "degraded": route.degraded,
+                "shed": route.shed,
+            }
+            for name, route in self._classes.items()
+        }
+
+admission_controller = AdmissionController(
+    settings.ADMISSION_LIMITS,
+    degrade_at=settings.ADMISSION_DEGRADE_AT,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    max_queue_delay=settings.ADMISSION_MAX_QUEUE_DELAY_SECONDS,
+)
@@ -0,0 +1,206 @@
+import math
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+from .gazetteer import KIND_COUNTRY, get_gazetteer, normalize_name
+from .geo import EARTH_RADIUS_KM
+from .place_index import place_index
+
+KIND_NAMES = {0: "city", 1: "country", 2: "venue"}
+KIND_VENUE = 2
+
+# Ranking weights: popularity is 0..1, proximity decays from 1 with distance,
+# and names that start with the prefix beat ones matched mid-name
+PROXIMITY_WEIGHT = 2.0
+PROXIMITY_SCALE_KM = 25.0
+WORD_MATCH_PENALTY = 0.3
+
+# Keys are stored as fixed-width ASCII (normalized names are [a-z0-9 ]); longer
+# names are cut, which only matters for prefixes typed past this length
+KEY_BYTES = 32
+
+class AutocompleteIndex:
+    """Prefix search over gazetteer places and every venue seen in searches.
+
+    Every word start of a name is a key ("malviya nagar" is found by "mal"
+    and "nag"), kept in a sorted fixed-width byte array with a parallel array
+    of entry ids, so a prefix is a contiguous range found with two bisects and
+    ranked with vectorised NumPy arithmetic. Venues arrive in small batches
+    from search responses; their keys go to a short buffer that queries scan
+    directly and that is spliced into the sorted arrays once it fills.
+    """
+
+    def __init__(self, max_venues: int = 200_000, merge_threshold: int = 512):
+        self.max_venues = max_venues
+        self.merge_threshold = merge_threshold
+        self.entries: List[Dict[str, Any]] = []
+        self.refs: Dict[str, int] = {}
+        self.lats = np.zeros(1024)
+        self.lons = np.zeros(1024)
+        self.popularity = np.zeros(1024)
+        self._lats_r = np.zeros(1024)
+        self._lons_r = np.zeros(1024)
+        self.keys = np.zeros(0, dtype=f"S{KEY_BYTES}")
+        self.key_ids = np.zeros(0, dtype=np.int64)
+        self.key_mid_name = np.zeros(0, dtype=bool)
+        self._pending: List[tuple] = []
+        self._venues = 0
+        self._gazetteer_loaded = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, prefix: str, lat: Optional[float] = None, lon: Optional[float] = None, limit: int = 8) -> List[Dict[str, Any]]:
+        """Best entries whose name (or a word in it) starts with the prefix"""
+        self._ensure_gazetteer()
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+
+        key = prefix.encode()[:KEY_BYTES]
+        lo = int(np.searchsorted(self.keys, key, side="left"))
+        # Every key starting with the prefix sorts below prefix + 0xff
+        hi = int(np.searchsorted(self.keys, key + b"\xff" if len(key) < KEY_BYTES else key, side="left" if len(key) < KEY_BYTES else "right"))
+        ids = self.key_ids[lo:hi]
+        mid_name = self.key_mid_name[lo:hi]
+        pending = [(entry_id, word) for pending_key, entry_id, word in self._pending if pending_key.startswith(key)]
+        if pending:
+            ids = np.concatenate([ids, np.fromiter((p[0] for p in pending), dtype=np.int64, count=len(pending))])
+            mid_name = np.concatenate([mid_name, np.fromiter((p[1] for p in pending), dtype=bool, count=len(pending))])
+        if not len(ids):
+            return []
+
+        scores = self.popularity[ids] - WORD_MATCH_PENALTY * mid_name
+        if lat is not None and lon is not None:
+            # Equirectangular distance is plenty for ranking and far cheaper than haversine
+            lat_r, lon_r = math.radians(lat), math.radians(lon)
+            dlon = np.abs(self._lons_r[ids] - lon_r)
+            dlon = np.minimum(dlon, 2 * math.pi - dlon) * math.cos(lat_r)
+            dist = EARTH_RADIUS_KM * np.hypot(self._lats_r[ids] - lat_r, dlon)
+            scores = scores + PROXIMITY_WEIGHT / (1.0 + dist / PROXIMITY_SCALE_KM)
+
+        # A name reachable through several keys (aliases, word starts) is shown
+        # once, so rank a few more than asked for before deduplicating
+        want = limit * 4
+        if len(scores) > want:
+            top = np.argpartition(-scores, want)[:want]
+            top = top[np.argsort(-scores[top], kind="stable")]
+        else:
+            top = np.argsort(-scores, kind="stable")
+        results, seen = [], set()
+        for i in top:
+            entry_id = int(ids[i])
+            if entry_id in seen:
+                continue
+            seen.add(entry_id)
+            results.append(self.entries[entry_id])
+            if len(results) == limit:
+                break
+        return results
+
+    def add_venues(self, results: List[Dict[str, Any]]) -> int:
+        """Index venues from a Foursquare response (as summarised by the place index); returns how many were new"""
+        added = 0
+        for place in results:
+            summary = place_index.get(place.get("fsq_place_id") or "")
+            if summary is None:
+                continue
+            entry_id = self.refs.get(summary["fsq_place_id"])
+            popularity = min(summary["score"] / 11.0, 1.0)
+            if entry_id is not None:
+                # Known venue: refresh its position and score, keys stay as they are
+                self.lats[entry_id], self.lons[entry_id] = summary["latitude"], summary["longitude"]
+                self._lats_r[entry_id], self._lons_r[entry_id] = math.radians(summary["latitude"]), math.radians(summary["longitude"])
+                self.popularity[entry_id] = popularity
+                continue
+            if self._venues >= self.max_venues:
+                continue
+            entry_id = self._add_entry({
+                "id": summary["fsq_place_id"],
+                "name": summary["name"],
+                "kind": KIND_NAMES[KIND_VENUE],
+                "lat": summary["latitude"],
+                "lon": summary["longitude"],
+                "category": summary["category"],
+                "locality": summary["locality"],
+            }, popularity)
+            self.refs[summary["fsq_place_id"]] = entry_id
+            self._venues += 1
+            key = normalize_name(summary["name"])
+            if key:
+                self._pending.extend(self._word_keys(key, entry_id))
+            added += 1
+        if len(self._pending) >= self.merge_threshold:
+            self._merge_pending()
+        return added
+
+    def warm(self):
+        """Index the gazetteer now; on_startup runs this in a thread so no request pays for it"""
+        self._ensure_gazetteer()
+
+    def _ensure_gazetteer(self):
+        if self._gazetteer_loaded:
+            return
+        self._gazetteer_loaded = True
+        gazetteer = get_gazetteer()
+        started = time.perf_counter()
+        first = len(self.entries)
+        for place_id, name in enumerate(gazetteer.display_names):
+            kind = int(gazetteer.kinds[place_id])
+            population = int(gazetteer.populations[place_id])
+            self._add_entry({
+                "id": f"geonames-{place_id}",
+                "name": name,
+                "kind": KIND_NAMES[kind],
+                "lat": float(gazetteer.lats[place_id]),
+                "lon": float(gazetteer.lons[place_id]),
+                "country": str(gazetteer.countries[place_id]),
+            }, 1.0 if kind == KIND_COUNTRY else min(math.log10(population + 1) / 7.0, 1.0))
+        # The gazetteer's name table already holds normalized names and ASCII aliases
+        for key, place_id in gazetteer.index.items():
+            self._pending.extend(self._word_keys(key, first + place_id))
+        self._merge_pending()
+        print(f"🔤 Autocomplete indexed {len(self.keys)} names in {time.perf_counter() - started:.2f}s")
+
+    def _word_keys(self, key: str, entry_id: int) -> List[tuple]:
+        """(key, entry id, matched mid-name) for the name and each later word in it"""
+        raw = key.encode("ascii", "ignore")
+        keys = [(raw[:KEY_BYTES], entry_id, False)]
+        start = raw.find(b" ")
+        while start != -1:
+            keys.append((raw[start + 1:start + 1 + KEY_BYTES], entry_id, True))
+            start = raw.find(b" ", start + 1)
+        return keys
+
+    def _merge_pending(self):
+        if not self._pending:
+            return
+        self._pending.sort()
+        keys = np.array([p[0] for p in self._pending], dtype=f"S{KEY_BYTES}")
+        ids = np.fromiter((p[1] for p in self._pending), dtype=np.int64, count=len(self._pending))
+        mid_name = np.fromiter((p[2] for p in self._pending), dtype=bool, count=len(self._pending))
+        # One splice of the sorted batch, a memmove rather than a re-sort
+        at = np.searchsorted(self.keys, keys)
+        self.keys = np.insert(self.keys, at, keys)
+        self.key_ids = np.insert(self.key_ids, at, ids)
+        self.key_mid_name = np.insert(self.key_mid_name, at, mid_name)
+        self._pending = []
+
+    def _add_entry(self, entry: Dict[str, Any], popularity: float) -> int:
+        entry_id = len(self.entries)
+        if entry_id == len(self.lats):
+            grow = len(self.lats)
+            self.lats = np.concatenate([self.lats, np.zeros(grow)])
+            self.lons = np.concatenate([self.lons, np.zeros(grow)])
+            self.popularity = np.concatenate([self.popularity, np.zeros(grow)])
+            self._lats_r = np.concatenate([self._lats_r, np.zeros(grow)])
+            self._lons_r = np.concatenate([self._lons_r, np.zeros(grow)])
+        self.entries.append(entry)
+        self.lats[entry_id] = entry["lat"]
+        self.lons[entry_id] = entry["lon"]
+        self.popularity[entry_id] = popularity
+        self._lats_r[entry_id] = math.radians(entry["lat"])
+        self._lons_r[entry_id] = math.radians(entry["lon"])
+        return entry_id
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+class DeadlineExceeded(TimeoutError):
+    """The request's latency budget ran out before a downstream call could finish"""
+
+class RequestBudget:
+    """When the current request has to answer by, and whether anything was cut short to make it"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self.partial = False
+
+_budget: ContextVar[Optional[RequestBudget]] = ContextVar("request_budget", default=None)
+
+@contextmanager
+def request_deadline(seconds: float) -> Iterator[RequestBudget]:
+    """Give the code inside (and every task it starts) a budget of `seconds`"""
+    budget = RequestBudget(seconds)
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+@contextmanager
+def detached() -> Iterator[None]:
+    """Run the code inside (and every task it starts) outside the request's budget, for work that outlives it"""
+    token = _budget.set(None)
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current request's budget, or None outside a request"""
+    budget = _budget.get()
+    return None if budget is None else budget.expires_at - time.monotonic()
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+def mark_partial():
+    budget = _budget.get()
+    if budget is not None:
+        budget.partial = True
+
+def is_partial() -> bool:
+    budget = _budget.get()
+    return budget is not None and budget.partial
+
+def clamp(timeout: float) -> float:
+    """The smaller of a call's own timeout and what is left of the budget; raises once it is spent"""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        mark_partial()
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(timeout, left)
+
+async def wait(awaitable: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Await with a timeout clamped to the budget; running out of budget raises DeadlineExceeded"""
+    left = remaining()
+    if left is None and timeout is None:
+        return await awaitable
+    try:
+        clamped = clamp(timeout if timeout is not None else left)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            # Never started, so close it rather than leave it unawaited
+            awaitable.close()
+        raise
+    try:
+        return await asyncio.wait_for(awaitable, clamped)
+    except DeadlineExceeded:
+        raise
+    except asyncio.TimeoutError:
+        if timeout is None or clamped < timeout:
+            mark_partial()
+            raise DeadlineExceeded("Request deadline exceeded") from None
+        raise
+
+def annotate(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Flag a response built while the budget ran out with "partial": true"""
+    if is_partial():
+        payload["partial"] = True
+    return payload
+
+def route_budget(path: str, defaults: Dict[str, float], fallback: float) -> float:
+    """Default budget for a path: the longest matching prefix in defaults, else fallback"""
+    matches: List[str] = [prefix for prefix in defaults if path.startswith(prefix)]
+    return defaults[max(matches, key=len)] if matches else fallback
@@ -0,0 +1,130 @@
+import math
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .geo import haversine_matrix
+from .metrics import metrics
+from .tile_cache import point_geohash
+
+# Radii are snapped up to these steps so nearby predictions share cache keys
+# (search tiles, chat prefetch) instead of differing by a few metres
+RADIUS_STEPS = [250, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 30000, 50000]
+
+# Predictions aim this much wider than the estimate, which is noisy
+SAFETY = 1.25
+
+# Closest distance treated as meaningful when turning a result page into a density
+MIN_SPAN_M = 50
+
+class DensityModel:
+    """Venue density per area and query, learned from search responses.
+
+    Every upstream search is an observation: n venues within the searched
+    radius (or within the farthest result, when the page came back full) is a
+    density of n per that circle's area. Densities are kept per query as a
+    moving average of their logarithm in geohash tiles at a few precisions
+    (about 5, 40 and 150 km across) plus one query-wide average. An estimate
+    starts from the coarsest level and is refined by each finer tile in
+    proportion to how often it was observed, so an unseen street borrows
+    from its neighbourhood before the whole city. A radius for N results
+    follows from N = density * pi * r^2.
+    """
+
+    def __init__(self, precisions: Tuple[int, ...] = (3, 4, 5), alpha: float = 0.3, max_cells: int = 50_000):
+        self.precisions = precisions
+        self.alpha = alpha
+        self.max_cells = max_cells
+        self._cells: "OrderedDict[Tuple[str, str], Tuple[float, int]]" = OrderedDict()
+        self._queries: Dict[str, Tuple[float, int]] = {}
+
+    def observe(
+        self,
+        lat: float,
+        lon: float,
+        radius: int,
+        results: List[Dict[str, Any]],
+        query: str | None = None,
+        limit: int | None = None,
+    ):
+        """Learn from one search response around (lat, lon)"""
+        distances = [place.get("distance") for place in results]
+        if any(d is None for d in distances):
+            points = [(place.get("latitude"), place.get("longitude")) for place in results]
+            points = [p for p in points if p[0] is not None and p[1] is not None]
+            distances = (haversine_matrix([lat], [lon], [p[0] for p in points], [p[1] for p in points])[0] * 1000).tolist() if points else []
+        # A full page only tells us how far the page reached, not the whole circle
+        span = max(distances) if limit and len(results) >= limit and distances else radius
+        span_km = max(span, MIN_SPAN_M) / 1000
+        # An empty circle is recorded as half a venue, so it still lowers the estimate
+        log_density = math.log(max(len(results), 0.5) / (math.pi * span_km ** 2))
+
+        key = self._query_key(query)
+        for precision in self.precisions:
+            cell = (point_geohash(lat, lon, precision), key)
+            self._cells[cell] = self._update(self._cells.get(cell), log_density)
+            self._cells.move_to_end(cell)
+        while len(self._cells) > self.max_cells:
+            self._cells.popitem(last=False)
+        self._queries[key] = self._update(self._queries.get(key), log_density)
+
+    def density(self, lat: float, lon: float, query: str | None = None) -> Optional[float]:
+        """Estimated venues per km² matching the query around (lat, lon), if anything is known"""
+        key = self._query_key(query)
+        estimate = self._queries.get(key)
+        if estimate is None:
+            return None
+        value = estimate[0]
+        for precision in self.precisions:
+            cell = self._cells.get((point_geohash(lat, lon, precision), key))
+            if cell is None:
+                break
+            # Trust the tile more the more often it has been observed
+            weight = min(cell[1], 5)
+            value = (weight * cell[0] + value) / (weight + 1)
+        return math.exp(value)
+
+    def radius_for(
+        self,
+        lat: float,
+        lon: float,
+        query: str | None = None,
+        want: int = 10,
+        default: int | None = 5000,
+        min_radius: int = 500,
+        max_radius: int = 20000,
+    ) -> int | None:
+        """Smallest radius (metres) likely to hold `want` matching venues; default when the area is unknown"""
+        density = self.density(lat, lon, query)
+        if density is None:
+            metrics.incr("density.defaults")
+            return default
+        metrics.incr("density.predictions")
+        radius = math.sqrt(want / (math.pi * density)) * 1000 * SAFETY
+        radius = next((step for step in RADIUS_STEPS if step >= radius), RADIUS_STEPS[-1])
+        return int(max(min(radius, max_radius), min(min_radius, max_radius)))
+
+    def radius_ladder(
+        self,
+        lat: float,
+        lon: float,
+        queries: Iterable[str],
+        want: int = 5,
+        default: int = 5000,
+        max_radius: int = 20000,
+    ) -> List[int]:
+        """Radii to try in turn for several queries: the widest prediction, doubled up to max_radius"""
+        first = max((self.radius_for(lat, lon, q, want, default, max_radius=max_radius) for q in queries), default=default)
+        ladder = [first]
+        while ladder[-1] < max_radius:
+            ladder.append(min(ladder[-1] * 2, max_radius))
+        return ladder
+
+    def _update(self, current: Optional[Tuple[float, int]], log_density: float) -> Tuple[float, int]:
+        if current is None:
+            return log_density, 1
+        value, count = current
+        return value + self.alpha * (log_density - value), count + 1
+
+    def _query_key(self, query: str | None) -> str:
+        return " ".join((query or "").lower().split())
+
+density_model = DensityModel()
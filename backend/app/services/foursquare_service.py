@@ -1,9 +1,48 @@
+import asyncio
+import time
 import httpx
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from ..config import settings
+from . import admission, deadline
+from .hedging import HedgePolicy
+from .metrics import metrics
+from .rate_limiter import TokenBucket
+from .place_index import place_index
+from .autocomplete import autocomplete_index
+from .density_model import density_model
+from .tile_cache import MAX_TILED_RADIUS_M, TILE_FETCH_LIMIT, tile_cache
+from .upstream_scheduler import HYDRATION, UpstreamScheduler, upstream_priority
 
-# NEW: Updated for Foursquare Places API
-BASE_URL = "https://places-api.foursquare.com"
+# Shared by every FoursquareService: upstream latency history for hedging, and the request rate limit
+hedge_policy = HedgePolicy(percentile=settings.FOURSQUARE_HEDGE_PERCENTILE, max_extra=settings.FOURSQUARE_HEDGE_MAX_EXTRA)
+rate_limiter = TokenBucket(settings.FOURSQUARE_RATE_LIMIT_PER_SECOND)
+# Every call waits its turn here, so photo bursts and prefetches can't crowd out searches
+scheduler = UpstreamScheduler(rate_limiter, settings.FOURSQUARE_MAX_CONCURRENCY, settings.UPSTREAM_PRIORITY_WEIGHTS)
+
+# Keep-alive connections to Foursquare, shared so a hedge reuses a warm connection
+# instead of paying for a new client (and TLS context) per call
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _get_client() -> httpx.AsyncClient:
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    # Pooled connections belong to the loop that opened them
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        # Room for a hedge on top of every scheduled call
+        connections = 2 * settings.FOURSQUARE_MAX_CONCURRENCY
+        _client = httpx.AsyncClient(limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections))
+        _client_loop = loop
+    return _client
+
+async def aclose():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+# Upper bound on simultaneous photo lookups when hydrating a result list
+PHOTO_CONCURRENCY = 8
 
 class FoursquareService:
     def __init__(self, api_key: Optional[str] = None):
@@ -23,17 +62,62 @@ class FoursquareService:
         headers = dict(self.base_headers)
         if lang:
             headers["Accept-Language"] = lang
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            r = await client.get(f"{BASE_URL}{path}", params=params, headers=headers)
-            # Handle specific error codes before calling raise_for_status
-            if r.status_code == 401:
-                raise RuntimeError("FOURSQUARE_API_KEY is invalid or expired. Please check your API key.")
-            elif r.status_code == 429:
-                raise RuntimeError("Foursquare API rate limit exceeded. Please try again later.")
-            elif r.status_code >= 400:
-                raise RuntimeError(f"Foursquare API error: {r.status_code} - {r.text}")
-            
-            return r.json()
+        # Never wait longer than the request deadline allows
+        timeout = deadline.clamp(20.0)
+        url = f"{settings.FOURSQUARE_BASE_URL}{path}"
+        r = await deadline.wait(scheduler.run(lambda: self._send(url, params, headers, timeout)), 20.0)
+        # Handle specific error codes before calling raise_for_status
+        if r.status_code == 401:
+            raise RuntimeError("FOURSQUARE_API_KEY is invalid or expired. Please check your API key.")
+        elif r.status_code == 429:
+            raise RuntimeError("Foursquare API rate limit exceeded. Please try again later.")
+        elif r.status_code >= 400:
+            raise RuntimeError(f"Foursquare API error: {r.status_code} - {r.text}")
+
+        return r.json()
+
+    async def _send(self, url: str, params: Dict[str, Any] | None, headers: Dict[str, str], timeout: float) -> httpx.Response:
+        """GET hedged with a duplicate if it runs past the usual p95 latency; the scheduler has already admitted it"""
+        started = time.monotonic()
+        hedge_after = hedge_policy.start()
+        if not settings.FOURSQUARE_HEDGING:
+            hedge_after = None
+
+        async def attempt() -> httpx.Response:
+            attempt_started = time.monotonic()
+            response = await _get_client().get(url, params=params, headers=headers, timeout=timeout)
+            hedge_policy.record(time.monotonic() - attempt_started)
+            return response
+
+        attempts = [asyncio.create_task(attempt())]
+        try:
+            if hedge_after is not None:
+                done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+                if not done and hedge_policy.try_hedge(rate_limiter.try_acquire):
+                    metrics.incr("foursquare.hedges")
+                    attempts.append(asyncio.create_task(attempt()))
+            pending = set(attempts)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = done.pop()
+                # A failed attempt only loses if the other one can still answer
+                if winner.exception() is None or not pending:
+                    break
+            if winner is not attempts[0]:
+                hedge_policy.hedge_wins += 1
+                metrics.incr("foursquare.hedge_wins")
+                # The primary's latency is at least this long; keep that in the history
+                hedge_policy.record(time.monotonic() - started)
+            response = winner.result()
+            hedge_policy.record_response(time.monotonic() - started)
+            return response
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Retrieve losers' outcomes so they aren't reported as never retrieved
+                    task.exception()
 
     async def search(
         self,
@@ -47,26 +131,59 @@ class FoursquareService:
         sort: str | None = "DISTANCE",
         open_now: bool | None = None,
         lang: str | None = None,
+        tiled: bool | None = None,
     ) -> Dict[str, Any]:
+        """Venue search; nearest-first circle searches are served from the tile cache unless tiled=False"""
+        if tiled is None:
+            tiled = settings.SEARCH_TILE_CACHE
+        # Open-now answers go stale within minutes and other orderings can't be merged
+        # from tiles, so only plain distance-sorted circles are tiled
+        if (
+            tiled and lat is not None and lon is not None and radius and radius <= MAX_TILED_RADIUS_M
+            and sort in (None, "DISTANCE") and open_now is None
+        ):
+            async def fetch_tile(tile_lat: float, tile_lon: float, tile_radius: int) -> List[Dict[str, Any]]:
+                data = await self._search(
+                    {"ll": f"{tile_lat},{tile_lon}", "radius": tile_radius, "limit": TILE_FETCH_LIMIT, "sort": "DISTANCE"},
+                    query, categories, lang,
+                )
+                return data.get("results") or []
+
+            tiled_data = await tile_cache.search(fetch_tile, lat, lon, radius, query, categories, lang, limit)
+            # None: too little of the circle is cached, and one direct call is cheaper than filling it
+            if tiled_data is not None:
+                return tiled_data
+
         params: Dict[str, Any] = {}
         if lat is not None and lon is not None:
             params["ll"] = f"{lat},{lon}"
         elif near:
             params["near"] = near
-        if query:
-            params["query"] = query
         if radius:
             params["radius"] = radius
-        if categories:
-            params["categories"] = categories
         if limit:
             params["limit"] = limit
         if sort:
             params["sort"] = sort
         if open_now is not None:
             params["open_now"] = str(open_now).lower()
+        return await self._search(params, query, categories, lang)
+
+    async def _search(self, params: Dict[str, Any], query: str | None, categories: str | None, lang: str | None) -> Dict[str, Any]:
+        if query:
+            params["query"] = query
+        if categories:
+            params["categories"] = categories
         # NEW: Updated endpoint path (no /v3)
-        return await self._get("/places/search", params, lang=lang)
+        data = await self._get("/places/search", params, lang=lang)
+        # Remember every venue we see so map viewports can be served locally
+        place_index.add_places(data.get("results") or [])
+        autocomplete_index.add_venues(data.get("results") or [])
+        # ...and how many of them each area holds, to size later searches
+        if "ll" in params and params.get("radius"):
+            lat, lon = map(float, params["ll"].split(","))
+            density_model.observe(lat, lon, params["radius"], data.get("results") or [], query or categories, params.get("limit"))
+        return data
 
     async def details(self, place_id: str, lang: str | None = None) -> Dict[str, Any]:
         # NEW: Updated endpoint path (no /v3)
@@ -104,6 +221,10 @@ class FoursquareService:
 
     async def get_photos(self, place_id: str, limit: int | None = 3) -> list[str]:
         """Get photo URLs for a place in a simple format"""
+        if admission.degraded():
+            # Photos are the first thing dropped under load
+            metrics.incr("admission.photos_skipped")
+            return []
         try:
             photos_data = await self.photos(place_id, limit=limit)
             photo_urls = []
@@ -122,3 +243,19 @@ class FoursquareService:
         except Exception:
             # Return empty list if photo fetch fails
             return []
+
+    async def attach_photos(self, places: List[Dict[str, Any]], limit: int | None = 3, concurrency: int = PHOTO_CONCURRENCY) -> None:
+        """Fetch photos for many places concurrently and attach them to each place"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def attach(place: Dict[str, Any]):
+            place_id = place.get("fsq_place_id")
+            if not place_id:
+                place["photos"] = []
+                return
+            async with semaphore:
+                place["photos"] = await self.get_photos(place_id, limit=limit)
+        
+        # Photos decorate results that are already usable, so they queue behind searches
+        with upstream_priority(HYDRATION):
+            await asyncio.gather(*(attach(place) for place in places))
@@ -0,0 +1,270 @@
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional
+import numpy as np
+from ..config import settings
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+DEFAULT_GAZETTEER_PATH = os.path.join(DATA_DIR, "gazetteer.tsv")
+
+# Bump when the cache layout changes so stale caches are rebuilt
+CACHE_VERSION = 2
+
+WORD = re.compile(r"[a-z0-9]+")
+CASED_WORD = re.compile(r"[A-Za-z0-9]+")
+SENTENCE_END = re.compile(r"[.!?]")
+
+# Latin letters NFKD doesn't decompose into a base letter plus accent
+FOLD_EXTRA = str.maketrans({
+    "Ł": "L", "ł": "l", "Ø": "O", "ø": "o", "Đ": "D", "đ": "d", "Ħ": "H", "ħ": "h", "ı": "i",
+    "ß": "ss", "Æ": "AE", "æ": "ae", "Œ": "OE", "œ": "oe", "Þ": "Th", "þ": "th",
+})
+
+# GeoNames dump columns we read (the files have 19 tab-separated columns)
+COL_NAME, COL_ASCII, COL_ALTERNATES, COL_LAT, COL_LON, COL_CLASS, COL_CODE, COL_COUNTRY, COL_POPULATION = 1, 2, 3, 4, 5, 6, 7, 8, 14
+
+KIND_CITY = 0
+KIND_COUNTRY = 1
+
+# A single-word name typed in lowercase mid-sentence only counts as a place
+# for countries and cities at least this big; smaller towns must be written
+# with a capital ("Man", "Çan" and "Nice" are towns, "man" is not)
+SINGLE_WORD_MIN_POPULATION = 200_000
+
+# Everyday words that are also somebody's town name; single-word names in
+# this set are never matched in free text
+STOPWORDS = {
+    "a", "an", "and", "at", "be", "best", "bye", "cafe", "call", "coffee", "date", "day", "do", "eat", "find",
+    "food", "for", "go", "good", "hello", "hey", "hi", "how", "i", "in", "is", "it", "joke", "me", "my", "near",
+    "new", "nice", "of", "on", "or", "park", "place", "see", "shop", "thanks", "the", "time", "to", "top", "trip",
+    "us", "visit", "want", "what", "when", "where", "who", "why", "with", "you", "your",
+}
+
+def fold(text: str) -> str:
+    """Latin text with accents dropped, so "Łódź" is "Lodz" and "São Paulo" is "Sao Paulo"; other scripts are dropped"""
+    return unicodedata.normalize("NFKD", text.translate(FOLD_EXTRA)).encode("ascii", "ignore").decode()
+
+def normalize_name(name: str) -> str:
+    return " ".join(WORD.findall(fold(name).lower()))
+
+class Gazetteer:
+    """Place names from a GeoNames-style dump, matched in free text.
+
+    Places live in parallel NumPy arrays; names map to the index of their most
+    populous place, so disambiguation is decided once at load time. Matching
+    walks the message's words once: a first-word table records the longest
+    name starting with each word, so multi-word names ("mount abu", "new
+    delhi") are tried longest first and only where they can start. Names
+    are ASCII-folded, both when indexed and when matched. A single word that
+    is also a small town ("man", "can") only matches when it is capitalised
+    mid-sentence, or when the place is a country or a city of at least
+    single_word_min_population.
+
+    Parsing a large dump takes seconds, so the arrays and name table are
+    written to an .npz cache next to the source and reused while it is newer
+    than the dump.
+    """
+
+    def __init__(
+        self,
+        display_names: List[str],
+        lats: np.ndarray,
+        lons: np.ndarray,
+        populations: np.ndarray,
+        countries: np.ndarray,
+        kinds: np.ndarray,
+        index: Dict[str, int],
+    ):
+        self.display_names = display_names
+        self.lats = lats
+        self.lons = lons
+        self.populations = populations
+        self.countries = countries
+        self.kinds = kinds
+        self.index = index
+        self.single_word_min_population = SINGLE_WORD_MIN_POPULATION
+        self._lead_lengths: Dict[str, int] = {}
+        for key in index:
+            words = key.split(" ")
+            if len(words) > 1 and len(words) > self._lead_lengths.get(words[0], 1):
+                self._lead_lengths[words[0]] = len(words)
+
+    def __len__(self) -> int:
+        return len(self.display_names)
+
+    def find(self, text: str) -> List[str]:
+        """Place names mentioned in the text, in order, longest match first at each position.
+
+        Pass the text as typed: capitalisation decides whether a small town's
+        single-word name counts.
+        """
+        words: List[str] = []
+        capitalised: List[bool] = []
+        text = fold(text)
+        end = 0
+        for match in CASED_WORD.finditer(text):
+            word = match.group()
+            # Sentence-initial capitals say nothing about the word
+            sentence_start = not words or SENTENCE_END.search(text, end, match.start()) is not None
+            words.append(word.lower())
+            capitalised.append(word[0].isupper() and not sentence_start)
+            end = match.end()
+
+        found = []
+        i = 0
+        while i < len(words):
+            matched = 0
+            for length in range(min(self._lead_lengths.get(words[i], 1), len(words) - i), 0, -1):
+                if length == 1 and words[i] in STOPWORDS:
+                    break
+                key = words[i] if length == 1 else " ".join(words[i:i + length])
+                place_id = self.index.get(key)
+                if place_id is None:
+                    continue
+                if length == 1 and not capitalised[i] and not self._well_known(place_id):
+                    break
+                found.append(key)
+                matched = length
+                break
+            i += matched or 1
+        return found
+
+    def _well_known(self, place_id: int) -> bool:
+        return self.kinds[place_id] == KIND_COUNTRY or self.populations[place_id] >= self.single_word_min_population
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        """Most populous place with this name"""
+        place_id = self.index.get(normalize_name(name))
+        if place_id is None:
+            return None
+        return {
+            "name": self.display_names[place_id],
+            "lat": float(self.lats[place_id]),
+            "lon": float(self.lons[place_id]),
+            "country": str(self.countries[place_id]),
+            "population": int(self.populations[place_id]),
+            "kind": "country" if self.kinds[place_id] == KIND_COUNTRY else "city",
+        }
+
+    @classmethod
+    def from_geonames(cls, path: str, min_population: int = 0, alias_min_population: int = 100_000) -> "Gazetteer":
+        """Parse a GeoNames dump (e.g. cities5000.txt, or allCountries.txt filtered to P and PCL* rows)"""
+        display_names: List[str] = []
+        lats: List[float] = []
+        lons: List[float] = []
+        populations: List[int] = []
+        countries: List[str] = []
+        kinds: List[int] = []
+        index: Dict[str, int] = {}
+
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                feature_class, feature_code = cols[COL_CLASS], cols[COL_CODE]
+                population = int(cols[COL_POPULATION] or 0)
+                if feature_class == "A" and feature_code.startswith("PCL"):
+                    kind = KIND_COUNTRY
+                elif feature_class == "P" and population >= min_population:
+                    kind = KIND_CITY
+                else:
+                    continue
+
+                place_id = len(display_names)
+                display_names.append(cols[COL_NAME])
+                lats.append(float(cols[COL_LAT]))
+                lons.append(float(cols[COL_LON]))
+                populations.append(population)
+                countries.append(cols[COL_COUNTRY])
+                kinds.append(kind)
+
+                names = {cols[COL_NAME], cols[COL_ASCII]}
+                # Alternate names run to dozens of languages per place, so only
+                # countries ("UK", "USA") and big cities ("Bangalore", "Bombay")
+                # contribute their ASCII ones
+                if cols[COL_ALTERNATES] and (kind == KIND_COUNTRY or population >= alias_min_population):
+                    names.update(name for name in cols[COL_ALTERNATES].split(",") if name.isascii())
+                for name in names:
+                    key = normalize_name(name)
+                    if not key:
+                        continue
+                    current = index.get(key)
+                    # Countries win over towns of the same name, then population
+                    if current is None or (kind, population) > (kinds[current], populations[current]):
+                        index[key] = place_id
+
+        return cls(
+            display_names,
+            np.asarray(lats, dtype=np.float64),
+            np.asarray(lons, dtype=np.float64),
+            np.asarray(populations, dtype=np.int64),
+            np.asarray(countries, dtype="U2"),
+            np.asarray(kinds, dtype=np.int8),
+            index,
+        )
+
+    def save_cache(self, path: str):
+        keys = list(self.index)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                version=CACHE_VERSION,
+                display_names=np.frombuffer("\n".join(self.display_names).encode(), dtype=np.uint8),
+                lats=self.lats,
+                lons=self.lons,
+                populations=self.populations,
+                countries=self.countries,
+                kinds=self.kinds,
+                keys=np.frombuffer("\n".join(keys).encode(), dtype=np.uint8),
+                ids=np.fromiter(self.index.values(), dtype=np.int32, count=len(keys)),
+            )
+
+    @classmethod
+    def load_cache(cls, path: str) -> "Gazetteer":
+        data = np.load(path)
+        if int(data["version"]) != CACHE_VERSION:
+            raise ValueError(f"Gazetteer cache {path} has an old layout")
+        display_names = data["display_names"].tobytes().decode().split("\n")
+        keys = data["keys"].tobytes().decode().split("\n")
+        return cls(
+            display_names,
+            data["lats"],
+            data["lons"],
+            data["populations"],
+            data["countries"],
+            data["kinds"],
+            dict(zip(keys, data["ids"].tolist())),
+        )
+
+    @classmethod
+    def load(cls, path: str, min_population: int = 0, use_cache: bool = True) -> "Gazetteer":
+        """Load from the .npz cache when it is up to date, otherwise parse and refresh it"""
+        cache_path = f"{path}.{min_population}.npz"
+        if use_cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            try:
+                return cls.load_cache(cache_path)
+            except Exception as e:
+                print(f"⚠️ Ignoring gazetteer cache {cache_path}: {e}")
+        gazetteer = cls.from_geonames(path, min_population)
+        if use_cache:
+            try:
+                gazetteer.save_cache(cache_path)
+            except OSError as e:
+                print(f"⚠️ Could not write gazetteer cache {cache_path}: {e}")
+        return gazetteer
+
+_gazetteer: Optional[Gazetteer] = None
+
+def get_gazetteer() -> Gazetteer:
+    """Process-wide gazetteer from settings.GAZETTEER_PATH (the bundled sample by default)"""
+    global _gazetteer
+    if _gazetteer is None:
+        path = settings.GAZETTEER_PATH or DEFAULT_GAZETTEER_PATH
+        started = time.perf_counter()
+        _gazetteer = Gazetteer.load(path, settings.GAZETTEER_MIN_POPULATION)
+        _gazetteer.single_word_min_population = settings.GAZETTEER_SINGLE_WORD_MIN_POPULATION
+        print(f"🗺️ Loaded {len(_gazetteer)} places from {path} in {time.perf_counter() - started:.2f}s")
+    return _gazetteer
@@ -0,0 +1,52 @@
+from typing import Sequence, Tuple
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+def haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Great-circle distance in km between two (lat, lon) pairs"""
+    return float(haversine_matrix([a[0]], [a[1]], [b[0]], [b[1]])[0, 0])
+
+def haversine_matrix(
+    lats_a: Sequence[float],
+    lons_a: Sequence[float],
+    lats_b: Sequence[float],
+    lons_b: Sequence[float],
+) -> np.ndarray:
+    """Pairwise great-circle distances in km, shape (len(a), len(b))"""
+    lat1 = np.radians(np.asarray(lats_a, dtype=np.float64))[:, None]
+    lon1 = np.radians(np.asarray(lons_a, dtype=np.float64))[:, None]
+    lat2 = np.radians(np.asarray(lats_b, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(lons_b, dtype=np.float64))[None, :]
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+def geometric_median(lats: Sequence[float], lons: Sequence[float], iterations: int = 50, tol_km: float = 1e-4) -> Tuple[float, float]:
+    """Point minimising the summed distance to all inputs (Weiszfeld's algorithm).
+
+    Points are projected onto a local equirectangular plane around their
+    centroid, which is accurate for the city-scale spreads we deal with.
+    """
+    lat = np.asarray(lats, dtype=np.float64)
+    lon = np.asarray(lons, dtype=np.float64)
+    lat0, lon0 = lat.mean(), lon.mean()
+    km_per_deg = np.radians(1.0) * EARTH_RADIUS_KM
+    xs = (lon - lon0) * km_per_deg * np.cos(np.radians(lat0))
+    ys = (lat - lat0) * km_per_deg
+    points = np.stack([xs, ys], axis=1)
+
+    guess = points.mean(axis=0)
+    for _ in range(iterations):
+        dist = np.linalg.norm(points - guess, axis=1)
+        # A guess sitting exactly on an input point is already optimal for that term
+        dist = np.maximum(dist, 1e-9)
+        weights = 1.0 / dist
+        new_guess = (points * weights[:, None]).sum(axis=0) / weights.sum()
+        if np.linalg.norm(new_guess - guess) < tol_km:
+            guess = new_guess
+            break
+        guess = new_guess
+
+    med_lat = lat0 + guess[1] / km_per_deg
+    med_lon = lon0 + guess[0] / (km_per_deg * np.cos(np.radians(lat0)))
+    return float(med_lat), float(med_lon)
@@ -0,0 +1,68 @@
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+
+class HedgePolicy:
+    """When to send a duplicate of a slow upstream request, and how many we can afford.
+
+    Latencies of recent attempts are kept in a sliding window; a request that
+    hasn't answered by the window's `percentile` is hedged. Attempts cut off
+    by a winning hedge are recorded with the time they had run, a lower bound
+    that keeps the tail from looking shorter than it is. Hedges are paid for
+    from credits earned at max_extra per request (0.05 = at most 5% extra
+    calls), so a slow upstream can't be answered with a doubling of traffic.
+    """
+
+    def __init__(self, percentile: float = 95, max_extra: float = 0.05, window: int = 512, min_samples: int = 50, max_credits: float = 5.0):
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.min_samples = min_samples
+        self.max_credits = max_credits
+        self._latencies: deque = deque(maxlen=window)
+        self._responses: deque = deque(maxlen=window)
+        self._credits = 0.0
+        self._delay: Optional[float] = None
+        self._since_update = 0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, seconds: float):
+        self._latencies.append(seconds)
+        self._since_update += 1
+        # Percentiles are recomputed every few samples rather than per request
+        if self._delay is None or self._since_update >= 16:
+            self._since_update = 0
+            if len(self._latencies) >= self.min_samples:
+                self._delay = float(np.percentile(self._latencies, self.percentile))
+
+    def record_response(self, seconds: float):
+        """What the caller waited, hedge or not; reported as the request percentiles"""
+        self._responses.append(seconds)
+
+    def start(self) -> Optional[float]:
+        """Count a new request; returns how long to wait before hedging it, or None until there is enough data"""
+        self.requests += 1
+        self._credits = min(self._credits + self.max_extra, self.max_credits)
+        return self._delay
+
+    def try_hedge(self, admit: Callable[[], bool] = lambda: True) -> bool:
+        """Spend a credit on a hedge if one is available and admit() (e.g. a rate limiter) agrees"""
+        if self._credits < 1 or not admit():
+            return False
+        self._credits -= 1
+        self.hedges += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "extra_calls": round(self.hedges / self.requests, 4) if self.requests else 0.0,
+            "hedge_after_ms": round(self._delay * 1000, 1) if self._delay is not None else None,
+        }
+        for name, window in (("attempt", self._latencies), ("request", self._responses)):
+            for q in (50, 95, 99):
+                stats[f"{name}_p{q}_ms"] = round(float(np.percentile(window, q)) * 1000, 1) if window else None
+        return stats
@@ -0,0 +1,70 @@
+import re
+from typing import Dict, List
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English)"""
+    return len(text) // 4 + 1
+
+def _speaker(msg: Dict) -> str:
+    return "User" if msg["role"] == "user" else "URNAV"
+
+def compact_message(msg: Dict, max_words: int = 20) -> str:
+    """One short line for a message: its first sentence, cut to max_words"""
+    content = " ".join(msg["content"].split())
+    first = SENTENCE_END.split(content, 1)[0]
+    words = first.split()
+    if len(words) > max_words:
+        first = " ".join(words[:max_words]) + "…"
+    return f"{_speaker(msg)}: {first}"
+
+class HistoryPacker:
+    """Fits conversation history into a token budget for chat prompts.
+
+    The newest `recent_messages` are sent verbatim. Older messages still in
+    the window are shortened to their first sentence. Messages that leave the
+    window are folded into a rolling summary (one compact line each, oldest
+    lines dropped past summary_tokens), so the summary is updated
+    incrementally rather than rebuilt from the whole conversation.
+    """
+
+    def __init__(self, budget_tokens: int = 600, recent_messages: int = 4, summary_tokens: int = 150):
+        self.budget_tokens = budget_tokens
+        self.recent_messages = recent_messages
+        self.summary_tokens = summary_tokens
+
+    def fold(self, summary: List[str], dropped: List[Dict]) -> List[str]:
+        """Add messages leaving the window to the rolling summary"""
+        lines = summary + [compact_message(msg, max_words=12) for msg in dropped]
+        while lines and sum(estimate_tokens(line) for line in lines) > self.summary_tokens:
+            lines.pop(0)
+        return lines
+
+    def pack(self, messages: List[Dict], summary: List[str] | None = None) -> str:
+        if not messages and not summary:
+            return "No previous conversation."
+
+        remaining = self.budget_tokens
+        header = ""
+        if summary:
+            header = "Earlier: " + " | ".join(summary)
+            remaining -= estimate_tokens(header)
+
+        packed: List[str] = []
+        for age, msg in enumerate(reversed(messages)):
+            if age < self.recent_messages:
+                line = f"{_speaker(msg)}: {msg['content']}"
+            else:
+                line = compact_message(msg)
+            cost = estimate_tokens(line)
+            if cost > remaining:
+                if age == 0:
+                    # Always keep the newest message, cut to whatever budget is left
+                    packed.append(line[: max(remaining, 1) * 4])
+                break
+            packed.append(line)
+            remaining -= cost
+
+        lines = ([header] if header else []) + list(reversed(packed))
+        return "\n".join(lines)
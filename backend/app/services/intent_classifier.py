@@ -0,0 +1,197 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+from .gazetteer import Gazetteer
+
+# Phrase syntax used by the rule tables below: words are separated by single
+# spaces (matched as \s+), "*" matches any word and a trailing "s?" makes a
+# word's plural optional. Every rule is anchored at a word boundary.
+
+# Used only when no gazetteer is given; chat routing matches places with the gazetteer
+CITY_NAMES = [
+    "manali", "jaipur", "delhi", "mumbai", "bangalore", "chennai", "kolkata", "hyderabad", "pune",
+    "ahmedabad", "udaipur", "jodhpur", "jaisalmer", "mount abu", "pushkar", "germany", "france",
+    "italy", "spain", "uk", "usa", "canada", "australia", "japan", "china", "thailand", "singapore", "dubai",
+]
+
+# (phrases, require a word boundary after the phrase)
+TRAVEL_RULES: List[Tuple[List[str], bool]] = [
+    (["places?", "attractions?", "restaurants?", "hotels?", "cafes?", "parks?", "museums?", "shops?"], True),
+    (["visit", "go", "travel", "explore", "roam", "wander", "see", "find"], True),
+    (["near *", "around *", "in *", "at *", "to *"], False),
+    (["best *", "top *", "popular *", "famous *", "recommended *"], False),
+    (["where places?", "where to do", "where to visit", "what places?", "what to do", "what to visit"], False),
+    (CITY_NAMES, True),
+    (["coffee", "food", "eat", "drink", "shopping", "entertainment"], True),
+    (["travel", "trip", "vacation", "holiday", "journey"], True),
+    (["want to go", "planning to visit", "thinking of going"], True),
+]
+
+PERSONAL_RULES: List[Tuple[List[str], bool]] = [
+    (["hi", "hello", "hey", "good morning", "good afternoon", "good evening"], True),
+    (["how are you", "how you doing"], True),
+    (["what is your name", "who are you"], True),
+    (["my name is", "i am called", "call me"], True),
+    (["thank you", "thanks", "bye", "goodbye"], True),
+    (["weather", "time", "date", "day"], True),
+    (["joke", "funny", "entertain", "tell me"], True),
+]
+
+ACTIVITY_WORDS = ["coffee", "cafe", "restaurant", "food", "park", "museum", "shopping", "hotel", "attraction", "place"]
+
+# Substring checks, deliberately not word-bounded ("travelling" counts)
+TRAVEL_WORDS = ["travel", "trip", "vacation", "holiday", "journey"]
+TRAVEL_PHRASES = ["want to go", "planning to visit", "thinking of going"]
+
+TRAVEL_WEIGHT = 0.4
+PERSONAL_WEIGHT = 0.3
+CITY_WEIGHT = 0.8
+ACTIVITY_WEIGHT = 0.4
+TRAVEL_WORD_WEIGHT = 0.6
+TRAVEL_PHRASE_WEIGHT = 0.7
+
+WORD = re.compile(r"\w+")
+
+def _phrase_regex(phrase: str) -> str:
+    words = []
+    for word in phrase.split(" "):
+        if word == "*":
+            words.append(r"\w+")
+        elif word.endswith("s?"):
+            words.append(re.escape(word[:-2]) + "s?")
+        else:
+            words.append(re.escape(word))
+    return r"\s+".join(words)
+
+def _lead_words(phrase: str) -> List[str]:
+    first = phrase.split(" ")[0]
+    if first.endswith("s?"):
+        return [first[:-2], first[:-1]]
+    return [first]
+
+class IntentClassifier:
+    """Scores a message as travel, personal or general in one pass over its words.
+
+    Each rule is compiled once. A lookup table from a rule's possible first
+    words to the rule lets a single scan over the message's words try only the
+    rules that can start at that word. Matches are counted per rule without
+    overlap, exactly like re.findall, so scores match the original
+    per-pattern implementation.
+
+    With a gazetteer, place names are matched by it instead of the CITY_NAMES
+    rule: each place found scores like a matched travel rule and the first one
+    is the extracted city.
+    """
+
+    def __init__(self, gazetteer: Optional[Gazetteer] = None):
+        self.gazetteer = gazetteer
+        travel_rules = [r for r in TRAVEL_RULES if r[0] is not CITY_NAMES] if gazetteer else TRAVEL_RULES
+        rules = (
+            [("travel", phrases, bounded) for phrases, bounded in travel_rules]
+            + [("personal", phrases, bounded) for phrases, bounded in PERSONAL_RULES]
+            + [("city", CITY_NAMES, True), ("activity", ACTIVITY_WORDS, True)]
+        )
+        self._kinds = [kind for kind, _, _ in rules]
+        self._patterns = []
+        self._leads: Dict[str, List[int]] = {}
+        for i, (_, phrases, bounded) in enumerate(rules):
+            body = "|".join(_phrase_regex(p) for p in phrases)
+            self._patterns.append(re.compile(rf"\b({body})" + (r"\b" if bounded else "")))
+            for phrase in phrases:
+                for word in _lead_words(phrase):
+                    ids = self._leads.setdefault(word, [])
+                    if i not in ids:
+                        ids.append(i)
+        self._city_rule = self._kinds.index("city")
+        self._activity_rule = self._kinds.index("activity")
+
+    def _scan(self, text: str) -> Tuple[List[int], List[str | None]]:
+        """Per-rule match counts and first matched text for a lowercased message"""
+        n = len(self._patterns)
+        counts = [0] * n
+        last_end = [0] * n
+        firsts: List[str | None] = [None] * n
+        for word in WORD.finditer(text):
+            rule_ids = self._leads.get(word.group())
+            if not rule_ids:
+                continue
+            pos = word.start()
+            for i in rule_ids:
+                if pos < last_end[i]:
+                    continue
+                match = self._patterns[i].match(text, pos)
+                if match:
+                    counts[i] += 1
+                    last_end[i] = match.end()
+                    if firsts[i] is None:
+                        firsts[i] = match.group(1)
+        return counts, firsts
+
+    def classify(self, query: str) -> Tuple[str, float, Dict]:
+        """Returns: (query_type, confidence, extracted_info)"""
+        query_lower = query.lower()
+        counts, firsts = self._scan(query_lower)
+
+        travel_score = 0
+        personal_score = 0
+        extracted_info = {}
+
+        # Accumulate in the same order as the rule tables so float sums are stable
+        for kind, count in zip(self._kinds, counts):
+            if not count:
+                continue
+            if kind == "travel":
+                travel_score += count * TRAVEL_WEIGHT
+            elif kind == "personal":
+                personal_score += count * PERSONAL_WEIGHT
+
+        if self.gazetteer:
+            places = self.gazetteer.find(query)
+            travel_score += len(places) * TRAVEL_WEIGHT
+            city = places[0] if places else None
+        else:
+            city = firsts[self._city_rule]
+        if city is not None:
+            extracted_info["city"] = city
+            travel_score += CITY_WEIGHT
+
+        if firsts[self._activity_rule] is not None:
+            extracted_info["activity"] = firsts[self._activity_rule]
+            travel_score += ACTIVITY_WEIGHT
+
+        if any(word in query_lower for word in TRAVEL_WORDS):
+            travel_score += TRAVEL_WORD_WEIGHT
+
+        if any(phrase in query_lower for phrase in TRAVEL_PHRASES):
+            travel_score += TRAVEL_PHRASE_WEIGHT
+
+        if travel_score > personal_score and travel_score > 0.2:
+            result = "travel"
+        elif personal_score > 0.3:
+            result = "personal"
+        else:
+            result = "general"
+
+        return result, travel_score if result == "travel" else personal_score, extracted_info
+
+    def classify_batch(self, queries: Sequence[str]) -> List[Tuple[str, float, Dict]]:
+        return [self.classify(q) for q in queries]
+
+    def extract(self, query: str) -> Dict:
+        """City and activity mentioned in a message, without scoring it"""
+        query_lower = query.lower()
+        extracted_info = {}
+        city = self.find_city(query)
+        if city:
+            extracted_info["city"] = city
+        activity = self._patterns[self._activity_rule].search(query_lower)
+        if activity:
+            extracted_info["activity"] = activity.group(1)
+        return extracted_info
+
+    def find_city(self, text: str) -> str | None:
+        """First known city or country mentioned in the text"""
+        if self.gazetteer:
+            places = self.gazetteer.find(text)
+            return places[0] if places else None
+        match = self._patterns[self._city_rule].search(text.lower())
+        return match.group(1) if match else None
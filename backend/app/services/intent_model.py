@@ -0,0 +1,171 @@
+import os
+import re
+import zlib
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+from ..config import settings
+from .gazetteer import get_gazetteer
+from .intent_classifier import IntentClassifier
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+DEFAULT_MODEL_PATH = os.path.join(DATA_DIR, "intent_model.npz")
+DEFAULT_TRAINING_PATH = os.path.join(DATA_DIR, "intent_training.tsv")
+
+# Bump when the feature extraction changes; saved models record it
+FEATURE_VERSION = 1
+
+WORD = re.compile(r"\w+")
+
+def hashed_features(text: str, n_features: int) -> List[int]:
+    """Hashed word unigrams, word bigrams and in-word character trigrams.
+
+    crc32 is used instead of hash() so indices are stable across processes.
+    """
+    tokens = WORD.findall(text.lower())
+    mask = n_features - 1
+    feats = []
+    prev = "<s>"
+    for tok in tokens:
+        feats.append(zlib.crc32(b"w:" + tok.encode()) & mask)
+        feats.append(zlib.crc32(f"b:{prev} {tok}".encode()) & mask)
+        padded = f"<{tok}>"
+        for i in range(len(padded) - 2):
+            feats.append(zlib.crc32(b"c:" + padded[i:i + 3].encode()) & mask)
+        prev = tok
+    return feats
+
+def read_labeled_file(path: str) -> Tuple[List[str], List[str]]:
+    """Read label<TAB>message lines, skipping blanks and # comments"""
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            label, text = line.split("\t", 1)
+            labels.append(label)
+            texts.append(text)
+    return texts, labels
+
+class IntentModel:
+    """Multinomial logistic regression over hashed n-gram features"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels: Sequence[str]):
+        self.weights = weights
+        self.bias = bias
+        self.labels = list(labels)
+        self.n_features = weights.shape[0]
+
+    def _batch_features(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        idx: List[int] = []
+        rows: List[int] = []
+        for row, text in enumerate(texts):
+            feats = hashed_features(text, self.n_features)
+            idx.extend(feats)
+            rows.extend([row] * len(feats))
+        return np.asarray(idx, dtype=np.int64), np.asarray(rows, dtype=np.int64)
+
+    def _logits(self, idx: np.ndarray, rows: np.ndarray, n: int) -> np.ndarray:
+        picked = self.weights[idx]
+        logits = np.empty((n, len(self.labels)), dtype=np.float64)
+        for c in range(len(self.labels)):
+            logits[:, c] = np.bincount(rows, weights=picked[:, c], minlength=n)
+        return logits + self.bias
+
+    def predict_proba_batch(self, texts: Sequence[str]) -> np.ndarray:
+        idx, rows = self._batch_features(texts)
+        logits = self._logits(idx, rows, len(texts))
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def predict_batch(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        probs = self.predict_proba_batch(texts)
+        best = probs.argmax(axis=1)
+        return [(self.labels[b], float(probs[i, b])) for i, b in enumerate(best)]
+
+    @classmethod
+    def train(
+        cls,
+        texts: Sequence[str],
+        labels: Sequence[str],
+        n_features: int = 2 ** 14,
+        epochs: int = 300,
+        learning_rate: float = 0.5,
+        l2: float = 1e-4,
+    ) -> "IntentModel":
+        """Full-batch gradient descent; fine for the few hundred examples we label by hand"""
+        classes = sorted(set(labels))
+        model = cls(np.zeros((n_features, len(classes))), np.zeros(len(classes)), classes)
+        idx, rows = model._batch_features(texts)
+        n = len(texts)
+        targets = np.zeros((n, len(classes)))
+        targets[np.arange(n), [classes.index(label) for label in labels]] = 1.0
+
+        for _ in range(epochs):
+            logits = model._logits(idx, rows, n)
+            logits -= logits.max(axis=1, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+            grad_logits = (probs - targets) / n
+            grad_w = np.zeros_like(model.weights)
+            np.add.at(grad_w, idx, grad_logits[rows])
+            grad_w += l2 * model.weights
+            model.weights -= learning_rate * grad_w
+            model.bias -= learning_rate * grad_logits.sum(axis=0)
+
+        model.weights = model.weights.astype(np.float32)
+        return model
+
+    def save(self, path: str):
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float32),
+            bias=self.bias.astype(np.float32),
+            labels=np.asarray(self.labels),
+            feature_version=FEATURE_VERSION,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentModel":
+        data = np.load(path)
+        if int(data["feature_version"]) != FEATURE_VERSION:
+            raise ValueError(f"Intent model at {path} was trained with different features; retrain it")
+        return cls(data["weights"], data["bias"], [str(label) for label in data["labels"]])
+
+class ModelIntentClassifier:
+    """Intent backend that routes with the learned model.
+
+    City/activity extraction still comes from the rule tables, since those
+    feed the place search rather than the routing decision.
+    """
+
+    def __init__(self, model: IntentModel, rules: IntentClassifier | None = None):
+        self.model = model
+        self.rules = rules or IntentClassifier(get_gazetteer())
+
+    def classify(self, query: str) -> Tuple[str, float, Dict]:
+        return self.classify_batch([query])[0]
+
+    def classify_batch(self, queries: Sequence[str]) -> List[Tuple[str, float, Dict]]:
+        predictions = self.model.predict_batch(queries)
+        return [
+            (label, confidence, self.rules.extract(query))
+            for (label, confidence), query in zip(predictions, queries)
+        ]
+
+    def extract(self, query: str) -> Dict:
+        return self.rules.extract(query)
+
+    def find_city(self, text: str) -> str | None:
+        return self.rules.find_city(text)
+
+def create_intent_classifier():
+    """Intent backend selected by settings.INTENT_BACKEND ("regex" or "model")"""
+    if settings.INTENT_BACKEND == "model":
+        path = settings.INTENT_MODEL_PATH or DEFAULT_MODEL_PATH
+        try:
+            return ModelIntentClassifier(IntentModel.load(path))
+        except Exception as e:
+            print(f"⚠️ Could not load intent model from {path}, using regex intents: {e}")
+    return IntentClassifier(get_gazetteer())
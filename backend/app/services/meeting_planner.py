@@ -0,0 +1,64 @@
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from .geo import geometric_median, haversine_matrix
+
+# Supported ranking objectives for group meet-ups
+OBJECTIVES = ("total", "minimax", "fairness")
+
+class MeetingPlanner:
+    """Finds meeting venues for any number of participants"""
+
+    def search_center(self, participants: List[Tuple[float, float]]) -> Tuple[Dict[str, float], float]:
+        """Geometric median of the participants and their max distance to it in km"""
+        lats = [p[0] for p in participants]
+        lons = [p[1] for p in participants]
+        lat, lon = geometric_median(lats, lons)
+        spread_km = float(haversine_matrix([lat], [lon], lats, lons).max())
+        return {"lat": lat, "lon": lon}, spread_km
+
+    def rank(
+        self,
+        candidates: List[Dict[str, Any]],
+        participants: List[Tuple[float, float]],
+        objective: str = "total",
+    ) -> List[Dict[str, Any]]:
+        """Score every candidate against every participant in one distance matrix.
+
+        - total: smallest summed travel distance
+        - minimax: smallest worst-case individual distance
+        - fairness: smallest variance between participants' distances
+        Ties are broken by total distance.
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown objective '{objective}', expected one of {', '.join(OBJECTIVES)}")
+
+        located = []
+        for place in candidates:
+            lat = place.get("latitude") or place.get("lat")
+            lon = place.get("longitude") or place.get("lon")
+            if lat is not None and lon is not None:
+                located.append((place, lat, lon))
+        if not located:
+            return []
+
+        dist = haversine_matrix(
+            [c[1] for c in located],
+            [c[2] for c in located],
+            [p[0] for p in participants],
+            [p[1] for p in participants],
+        )
+        total = dist.sum(axis=1)
+        worst = dist.max(axis=1)
+        spread = dist.var(axis=1)
+        primary = {"total": total, "minimax": worst, "fairness": spread}[objective]
+        order = np.lexsort((total, primary))
+
+        ranked = []
+        for i in order:
+            place = dict(located[i][0])
+            place["participant_distances_km"] = [round(float(d), 2) for d in dist[i]]
+            place["total_km"] = round(float(total[i]), 2)
+            place["max_km"] = round(float(worst[i]), 2)
+            place["score"] = round(float(primary[i]), 4)
+            ranked.append(place)
+        return ranked
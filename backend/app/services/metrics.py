@@ -0,0 +1,30 @@
+from collections import defaultdict
+from typing import Any, Dict
+
+class Metrics:
+    """Process-wide counters and timings, reported by GET /metrics"""
+
+    def __init__(self):
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    def incr(self, name: str, amount: float = 1):
+        self.counters[name] += amount
+
+    def observe(self, name: str, seconds: float):
+        timing = self.timings.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+        timing["count"] += 1
+        timing["total_s"] += seconds
+        timing["max_s"] = max(timing["max_s"], seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        timings = {}
+        for name, timing in self.timings.items():
+            timings[name] = {
+                "count": int(timing["count"]),
+                "avg_ms": round(timing["total_s"] / timing["count"] * 1000, 1),
+                "max_ms": round(timing["max_s"] * 1000, 1),
+            }
+        return {"counters": dict(self.counters), "timings": timings}
+
+metrics = Metrics()
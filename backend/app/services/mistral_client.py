@@ -0,0 +1,195 @@
+import asyncio
+import json
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+import httpx
+from ..config import settings
+from . import deadline
+from .metrics import metrics
+
+MISTRAL_CHAT_URL = "https://api.mistral.ai/v1/chat/completions"
+
+# Worth retrying: rate limited or a transient server-side failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class MistralError(RuntimeError):
+    pass
+
+class MistralClient:
+    """One pooled HTTP client for every Mistral completion in the process.
+
+    Connections are kept alive between calls, connect and read timeouts are
+    separate (a slow generation shouldn't be cut off by the connect budget),
+    and a semaphore caps how many completions are in flight at once. 429 and
+    5xx responses are retried with exponential backoff and jitter, honouring
+    Retry-After when the API sends it, but never waiting longer than
+    max_backoff_seconds; a call gives up its semaphore slot while it backs
+    off so it doesn't hold up calls that could go ahead. Within a request every wait is clamped
+    to the request's remaining deadline, and a retry that can't fit in it is
+    not attempted (DeadlineExceeded is raised instead).
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 20.0,
+        max_concurrency: int = 8,
+        max_retries: int = 2,
+        backoff_seconds: float = 0.5,
+        max_backoff_seconds: float = 10.0,
+    ):
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(connect=connect_timeout, read=read_timeout, write=connect_timeout, pool=read_timeout)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), self.max_backoff_seconds)
+            except ValueError:
+                pass
+        return min(self.backoff_seconds * (2 ** attempt) * (0.5 + random.random()), self.max_backoff_seconds)
+
+    @asynccontextmanager
+    async def _response(self, payload: Dict[str, Any], stream: bool) -> AsyncIterator[httpx.Response]:
+        """Send a completion request, retrying retryable failures, and yield the successful response.
+
+        A semaphore slot is held for each attempt and for as long as the
+        successful response is in use, but not across backoff sleeps.
+        """
+        client = self._get_client()
+        response = None
+        held = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                await deadline.wait(self._semaphore.acquire())
+                held = True
+                try:
+                    response = await deadline.wait(client.send(client.build_request("POST", MISTRAL_CHAT_URL, json=payload), stream=stream))
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    if attempt == self.max_retries:
+                        raise MistralError(f"Mistral request failed: {e}") from e
+                    response = None
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                        break
+                    await response.aclose()
+                self._semaphore.release()
+                held = False
+                delay = self._retry_delay(attempt, response)
+                left = deadline.remaining()
+                if left is not None and delay >= left:
+                    deadline.mark_partial()
+                    raise deadline.DeadlineExceeded("No time left in the request deadline to retry Mistral")
+                metrics.incr("mistral.retries")
+                await asyncio.sleep(delay)
+
+            if response.status_code >= 400:
+                body = (await response.aread()).decode(errors="replace")[:200]
+                await response.aclose()
+                raise MistralError(f"Mistral API error: {response.status_code} - {body}")
+            try:
+                yield response
+            finally:
+                await response.aclose()
+        finally:
+            if held:
+                self._semaphore.release()
+
+    def _record_usage(self, usage: Optional[Dict[str, Any]]):
+        if usage:
+            metrics.incr("mistral.prompt_tokens", usage.get("prompt_tokens") or 0)
+            metrics.incr("mistral.completion_tokens", usage.get("completion_tokens") or 0)
+
+    async def complete(self, payload: Dict[str, Any]) -> str:
+        """Return the completion text for a chat payload; raises MistralError on failure"""
+        started = time.monotonic()
+        try:
+            async with self._response(payload, stream=False) as response:
+                data = response.json()
+        except MistralError:
+            metrics.incr("mistral.errors")
+            raise
+        except ValueError as e:
+            metrics.incr("mistral.errors")
+            raise MistralError(f"Mistral returned invalid JSON: {e}") from e
+        metrics.observe("mistral.completion", time.monotonic() - started)
+        self._record_usage(data.get("usage"))
+        content = (data.get("choices") or [{}])[0].get("message", {}).get("content")
+        if not isinstance(content, str) or not content.strip():
+            raise MistralError("Mistral returned an empty completion")
+        return content.strip()
+
+    async def stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """Yield completion text as it streams in; raises MistralError on failure"""
+        payload = {**payload, "stream": True}
+        started = time.monotonic()
+        first_token = None
+        try:
+            async with self._response(payload, stream=True) as response:
+                lines = response.aiter_lines()
+                while True:
+                    # Each chunk waits at most for what's left of the request deadline
+                    try:
+                        line = await deadline.wait(lines.__anext__())
+                    except StopAsyncIteration:
+                        break
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    self._record_usage(chunk.get("usage"))
+                    delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                    if delta:
+                        if first_token is None:
+                            first_token = time.monotonic() - started
+                            metrics.observe("mistral.first_token", first_token)
+                        yield delta
+        except MistralError:
+            metrics.incr("mistral.errors")
+            raise
+        except (httpx.HTTPError, ValueError) as e:
+            metrics.incr("mistral.errors")
+            raise MistralError(f"Mistral stream failed: {e}") from e
+        metrics.observe("mistral.stream", time.monotonic() - started)
+
+mistral_client = MistralClient(
+    api_key=settings.MISTRAL_API_KEY,
+    connect_timeout=settings.MISTRAL_CONNECT_TIMEOUT,
+    read_timeout=settings.MISTRAL_READ_TIMEOUT,
+    max_concurrency=settings.MISTRAL_MAX_CONCURRENCY,
+    max_retries=settings.MISTRAL_MAX_RETRIES,
+    max_backoff_seconds=settings.MISTRAL_MAX_BACKOFF_SECONDS,
+)
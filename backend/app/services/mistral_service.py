@@ -1,6 +1,9 @@
-from typing import Any, Dict
-import httpx
+from typing import Any, AsyncIterator, Dict
+import time
 from ..config import settings
+from .deadline import DeadlineExceeded
+from .mistral_client import MistralError, mistral_client
+from .response_cache import contains_personal_name, response_cache
 
 class MistralService:
     async def parse_query(self, text: str) -> Dict[str, Any]:
@@ -42,9 +45,14 @@ class MistralService:
 
         return {"tasks": tasks}
 
-    async def generate_reply(self, text: str, context: Dict[str, Any] | None = None) -> str:
-        # If a Mistral API key is configured, attempt to call it for a richer response
-        api_key = settings.MISTRAL_API_KEY
+    def _chat_payload(
+        self,
+        text: str,
+        context: Dict[str, Any] | None = None,
+        model: str | None = None,
+        temperature: float | None = None,
+        max_tokens: int | None = None,
+    ) -> Dict[str, Any]:
         system_prompt = "You are URNAV, a helpful navigation assistant. Use provided context only when relevant. Be concise."
         user_message = text
         if context:
@@ -59,34 +67,95 @@ class MistralService:
                 meta.append(f"coords=({coords.get('lat')},{coords.get('lon')})")
             if meta:
                 user_message = f"Context: {'; '.join(meta)}\nQuestion: {text}"
+        return {
+            "model": model or settings.MISTRAL_MODEL,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message},
+            ],
+            "temperature": settings.MISTRAL_TEMPERATURE if temperature is None else temperature,
+            "max_tokens": max_tokens or settings.MISTRAL_MAX_TOKENS,
+        }
 
-        if api_key:
-            try:
-                async with httpx.AsyncClient(timeout=20.0) as client:
-                    resp = await client.post(
-                        "https://api.mistral.ai/v1/chat/completions",
-                        headers={
-                            "Authorization": f"Bearer {api_key}",
-                            "Content-Type": "application/json",
-                        },
-                        json={
-                            "model": "mistral-small-latest",
-                            "messages": [
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": user_message},
-                            ],
-                            "temperature": 0.5,
-                        },
-                    )
-                    data = resp.json()
-                    content = data.get("choices", [{}])[0].get("message", {}).get("content")
-                    if isinstance(content, str) and content.strip():
-                        return content.strip()
-            except Exception:
-                # fall back to heuristic below
-                pass
-
+    def _fallback_reply(self, text: str) -> str:
         # Heuristic fallback reply
         if any(k in text.lower() for k in ["nearby", "around me", "close by", "near me"]):
             return "Looking for nearby options... I’ll list a few suggestions for you."
-        return "Got it. Let me think about that and gather relevant options."
\ No newline at end of file
+        return "Got it. Let me think about that and gather relevant options."
+
+    def _cache_key(self, text: str, context: Dict[str, Any] | None, payload: Dict[str, Any]) -> str | None:
+        """Response cache key, or None when the prompt mentions the user's name"""
+        if contains_personal_name(text, context):
+            return None
+        return response_cache.key(payload["messages"], payload["model"], payload["temperature"], payload["max_tokens"])
+
+    async def generate_reply(
+        self,
+        text: str,
+        context: Dict[str, Any] | None = None,
+        cache: bool = False,
+        model: str | None = None,
+        temperature: float | None = None,
+        max_tokens: int | None = None,
+    ) -> str:
+        """Reply to a prompt; callers pass cache=True when the reply doesn't depend on who asks.
+
+        model, temperature and max_tokens default to the MISTRAL_* settings.
+        """
+        # If a Mistral API key is configured, attempt to call it for a richer response
+        if mistral_client.configured:
+            payload = self._chat_payload(text, context, model, temperature, max_tokens)
+            cache_key = self._cache_key(text, context, payload) if cache else None
+            if cache_key:
+                cached = response_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            try:
+                started = time.monotonic()
+                content = await mistral_client.complete(payload)
+                if cache_key:
+                    response_cache.put(cache_key, content, time.monotonic() - started)
+                return content
+            except (MistralError, DeadlineExceeded) as e:
+                print(f"⚠️ Mistral completion failed, using fallback reply: {e}")
+
+        return self._fallback_reply(text)
+
+    async def stream_reply(
+        self,
+        text: str,
+        context: Dict[str, Any] | None = None,
+        cache: bool = False,
+        model: str | None = None,
+        temperature: float | None = None,
+        max_tokens: int | None = None,
+    ) -> AsyncIterator[str]:
+        """Yield reply text as Mistral streams it; falls back to the heuristic reply in one chunk.
+
+        If the stream breaks off after text was already yielded, the error is
+        re-raised so the caller knows the reply is incomplete.
+        """
+        sent = False
+        if mistral_client.configured:
+            payload = self._chat_payload(text, context, model, temperature, max_tokens)
+            cache_key = self._cache_key(text, context, payload) if cache else None
+            cached = response_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                yield cached
+                return
+            try:
+                started = time.monotonic()
+                chunks = []
+                async for delta in mistral_client.stream(payload):
+                    sent = True
+                    chunks.append(delta)
+                    yield delta
+                reply = "".join(chunks).strip()
+                if cache_key and reply:
+                    response_cache.put(cache_key, reply, time.monotonic() - started)
+            except (MistralError, DeadlineExceeded) as e:
+                print(f"⚠️ Mistral stream failed: {e}")
+                if sent:
+                    raise
+        if not sent:
+            yield self._fallback_reply(text)
@@ -0,0 +1,172 @@
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+from ..config import settings
+from .metrics import metrics
+from .place_index import place_index
+
+WORD = re.compile(r"[a-z]+")
+
+# Too generic to say anything about taste
+STOPWORDS = {"and", "the", "of", "a", "an", "place", "places", "shop", "store", "spot", "spots"}
+
+# Preference keys whose contents count against a category
+NEGATIVE_KEYS = {"dislikes", "dislike", "avoid", "exclude", "hate", "hates"}
+
+# A disliked venue's category counts this much against similar venues, before normalising
+DISLIKE_WEIGHT = -0.5
+
+class UserVector(NamedTuple):
+    """Category weights over the shared vocabulary (in [-1, 1]) and the disliked venue ids"""
+    weights: np.ndarray
+    disliked: FrozenSet[str]
+
+def words(text: str) -> List[str]:
+    """Lowercase category words with a plural s dropped, so parks matches Park"""
+    found = []
+    # Accents dropped so "Café" and "cafe" are the same word
+    plain = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode()
+    for word in WORD.findall(plain):
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        if word not in STOPWORDS:
+            found.append(word)
+    return found
+
+def preference_terms(value: Any, sign: float = 1.0) -> Iterator[Tuple[str, float]]:
+    """(text, weight) pairs from free-form preferences: lists of likes, {name: weight}, {"avoid": [...]}"""
+    if isinstance(value, str):
+        yield value, sign
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from preference_terms(item, sign)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, bool):
+                if item:
+                    yield str(key), sign
+            elif isinstance(item, (int, float)):
+                yield str(key), sign * float(item)
+            elif str(key).lower() in NEGATIVE_KEYS:
+                yield from preference_terms(item, -sign)
+            else:
+                yield from preference_terms(item, sign)
+
+class Personalizer:
+    """Reranks result lists by a per-user category-weight vector.
+
+    A user's preferences and the categories of the venues they disliked are
+    folded into one weight per category word, stored as a dense vector over
+    a vocabulary shared by all users (only words some profile mentions get a
+    column). Weights are cached per user until their TTL runs out or the
+    user's preferences or dislikes change; the disliked ids are read from
+    the User row on every request, so a fresh dislike is dropped at once
+    even on a worker whose cached weights predate it. Scoring a list is one pass: each
+    place's category words map to columns, and np.bincount sums their
+    weights per place. The affinity is added to the place's position in the
+    incoming order, so a strong match moves up but distance still counts.
+    """
+
+    def __init__(self, weight: float = 0.5, ttl_seconds: int = 600, max_users: int = 10000):
+        self.weight = weight
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._vocab: Dict[str, int] = {}
+        self._weights: "OrderedDict[int, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._columns: Dict[str, Tuple[int, List[int]]] = {}
+
+    def vector(self, user: Any) -> Optional[UserVector]:
+        """Cached weights plus the User row's current dislikes; None for anonymous requests"""
+        if user is None:
+            return None
+        disliked = frozenset(str(place_id) for place_id in (user.dislikes or {}))
+        entry = self._weights.get(user.id)
+        if entry is not None and entry[0] >= time.monotonic():
+            self._weights.move_to_end(user.id)
+            metrics.incr("personalization.cache_hits")
+            return UserVector(entry[1], disliked)
+        metrics.incr("personalization.cache_misses")
+        weights = self._build(user.preferences, disliked)
+        self._weights[user.id] = (time.monotonic() + self.ttl_seconds, weights)
+        self._weights.move_to_end(user.id)
+        while len(self._weights) > self.max_users:
+            self._weights.popitem(last=False)
+        return UserVector(weights, disliked)
+
+    def invalidate(self, user_id: int):
+        self._weights.pop(user_id, None)
+
+    def rerank(self, places: List[Dict[str, Any]], vector: Optional[UserVector]) -> List[Dict[str, Any]]:
+        """Drop disliked venues and reorder the rest by affinity; anonymous lists pass through"""
+        if vector is None or not places:
+            return places
+        if vector.disliked:
+            kept = [p for p in places if str(p.get("fsq_place_id") or p.get("fsq_id") or "") not in vector.disliked]
+            if len(kept) < len(places):
+                metrics.incr("personalization.dropped", len(places) - len(kept))
+            places = kept
+        if not places or not vector.weights.any():
+            return places
+
+        rows: List[int] = []
+        cols: List[int] = []
+        for row, place in enumerate(places):
+            for col in self._place_columns(place):
+                rows.append(row)
+                cols.append(col)
+        n = len(places)
+        if not cols:
+            return places
+        cols_array = np.asarray(cols)
+        # Columns added to the vocabulary after this vector was built carry no weight
+        known = cols_array < len(vector.weights)
+        column_weights = np.where(known, vector.weights[np.minimum(cols_array, len(vector.weights) - 1)], 0.0)
+        affinity = np.clip(np.bincount(np.asarray(rows), weights=column_weights, minlength=n), -1.0, 1.0)
+        score = self.weight * affinity - np.arange(n) / n
+        order = np.argsort(-score, kind="stable")
+        return [places[i] for i in order]
+
+    def _build(self, preferences: Any, disliked: FrozenSet[str]) -> np.ndarray:
+        weights: Dict[int, float] = {}
+        for text, weight in preference_terms(preferences or {}):
+            for word in words(text):
+                column = self._vocab.setdefault(word, len(self._vocab))
+                weights[column] = weights.get(column, 0.0) + weight
+        for place_id in disliked:
+            # Dislikes only store an id and a name; the category comes from venues we've seen
+            seen = place_index.get(place_id)
+            if seen is None:
+                continue
+            for word in words(seen["category"]):
+                column = self._vocab.setdefault(word, len(self._vocab))
+                weights[column] = weights.get(column, 0.0) + DISLIKE_WEIGHT
+        vector = np.zeros(len(self._vocab), dtype=np.float32)
+        for column, weight in weights.items():
+            vector[column] = weight
+        scale = np.abs(vector).max() if vector.size else 0.0
+        if scale > 0:
+            vector /= scale
+        return vector
+
+    def _place_columns(self, place: Dict[str, Any]) -> List[int]:
+        names = [c.get("name", "") for c in place.get("categories") or [] if isinstance(c, dict)]
+        if not names and place.get("category"):
+            names = [place["category"]]
+        columns: List[int] = []
+        for name in names:
+            cached = self._columns.get(name)
+            # Recomputed once the vocabulary has grown, since a new word may now have a column
+            if cached is None or cached[0] != len(self._vocab):
+                if len(self._columns) > 50_000:
+                    self._columns.clear()
+                cached = self._columns[name] = (len(self._vocab), sorted({self._vocab[w] for w in words(name) if w in self._vocab}))
+            columns.extend(cached[1])
+        return columns
+
+personalizer = Personalizer(
+    weight=settings.PERSONALIZATION_WEIGHT,
+    ttl_seconds=settings.PERSONALIZATION_TTL_SECONDS,
+)
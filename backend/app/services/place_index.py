@@ -0,0 +1,167 @@
+from typing import Any, Dict, List, Optional
+import time
+import numpy as np
+
+# Zoom levels follow web map tiles: 256px tiles, 2**zoom tiles around the globe
+MAX_ZOOM = 20
+TILE_PX = 256
+
+class PlaceIndex:
+    """In-memory store of every venue seen in search responses.
+
+    Coordinates and scores live in flat NumPy arrays so whole-index operations
+    (clustering, bounding box filters) are vectorised. Grid clusters are
+    precomputed per zoom level and rebuilt lazily after new places arrive, so
+    panning within a zoom level only filters the level's cluster arrays.
+    """
+
+    def __init__(self, max_places: int = 200_000, cluster_px: int = 64, rebuild_interval: float = 2.0):
+        self.max_places = max_places
+        self.cluster_px = cluster_px
+        # Levels are reused for this long after new places arrive, so a burst of
+        # searches doesn't trigger a rebuild per viewport request
+        self.rebuild_interval = rebuild_interval
+        self.places: List[Optional[Dict[str, Any]]] = []
+        self.slots: Dict[str, int] = {}
+        self.lats = np.zeros(1024)
+        self.lons = np.zeros(1024)
+        self.scores = np.zeros(1024)
+        self.size = 0
+        self._next_slot = 0
+        self._version = 0
+        self._levels: Dict[int, Dict[str, Any]] = {}
+
+    def add_places(self, results: List[Dict[str, Any]]) -> int:
+        """Record venues from a Foursquare response; returns how many were new"""
+        added = 0
+        for place in results:
+            summary = self._summarize(place)
+            if summary is None:
+                continue
+            slot = self.slots.get(summary["fsq_place_id"])
+            if slot is None:
+                slot = self._allocate_slot()
+                self.slots[summary["fsq_place_id"]] = slot
+                added += 1
+            self.places[slot] = summary
+            self.lats[slot] = summary["latitude"]
+            self.lons[slot] = summary["longitude"]
+            self.scores[slot] = summary["score"]
+        if results:
+            self._version += 1
+        return added
+
+    def get(self, place_id: str) -> Optional[Dict[str, Any]]:
+        slot = self.slots.get(place_id)
+        return self.places[slot] if slot is not None else None
+
+    def viewport(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int) -> List[Dict[str, Any]]:
+        """Clusters (or single places) whose centroid falls inside the bounding box"""
+        zoom = max(0, min(int(zoom), MAX_ZOOM))
+        level = self._level(zoom)
+        if not len(level["count"]):
+            return []
+
+        lo = np.searchsorted(level["lat"], min_lat, side="left")
+        hi = np.searchsorted(level["lat"], max_lat, side="right")
+        lons = level["lon"][lo:hi]
+        if min_lon <= max_lon:
+            mask = (lons >= min_lon) & (lons <= max_lon)
+        else:
+            # Bounding box crosses the antimeridian
+            mask = (lons >= min_lon) | (lons <= max_lon)
+        picked = np.nonzero(mask)[0] + lo
+
+        clusters = []
+        for i in picked:
+            count = int(level["count"][i])
+            representative = self.places[int(level["rep"][i])]
+            clusters.append({
+                "type": "place" if count == 1 else "cluster",
+                "lat": float(level["lat"][i]),
+                "lon": float(level["lon"][i]),
+                "count": count,
+                "representative": representative,
+            })
+        return clusters
+
+    def _level(self, zoom: int) -> Dict[str, Any]:
+        level = self._levels.get(zoom)
+        stale = level is not None and level["version"] != self._version
+        if level is None or (stale and time.monotonic() - level["built_at"] >= self.rebuild_interval):
+            level = self._build_level(zoom)
+            self._levels[zoom] = level
+        return level
+
+    def _build_level(self, zoom: int) -> Dict[str, Any]:
+        """Group places into grid cells of cluster_px pixels at this zoom level"""
+        n = self.size
+        lats, lons, scores = self.lats[:n], self.lons[:n], self.scores[:n]
+        cell_deg = 360.0 / (2 ** zoom * (TILE_PX / self.cluster_px))
+        rows = np.floor((lats + 90.0) / cell_deg).astype(np.int64)
+        cols = np.floor((lons + 180.0) / cell_deg).astype(np.int64)
+        keys = rows * (int(360.0 / cell_deg) + 1) + cols
+
+        # Sort by cell, best score first, so the first place of each group represents it
+        order = np.lexsort((-scores, keys))
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if n else np.zeros(0, dtype=np.int64)
+        counts = np.diff(np.r_[starts, n])
+        lat_sums = np.add.reduceat(lats[order], starts) if n else np.zeros(0)
+        lon_sums = np.add.reduceat(lons[order], starts) if n else np.zeros(0)
+        centroid_lat = lat_sums / np.maximum(counts, 1)
+        centroid_lon = lon_sums / np.maximum(counts, 1)
+        reps = order[starts]
+
+        # Keep clusters sorted by latitude so bounding box queries can bisect
+        by_lat = np.argsort(centroid_lat, kind="stable")
+        return {
+            "version": self._version,
+            "built_at": time.monotonic(),
+            "lat": centroid_lat[by_lat],
+            "lon": centroid_lon[by_lat],
+            "count": counts[by_lat],
+            "rep": reps[by_lat],
+        }
+
+    def _allocate_slot(self) -> int:
+        if self.size < self.max_places:
+            if self.size == len(self.lats):
+                grow = len(self.lats)
+                self.lats = np.concatenate([self.lats, np.zeros(grow)])
+                self.lons = np.concatenate([self.lons, np.zeros(grow)])
+                self.scores = np.concatenate([self.scores, np.zeros(grow)])
+            self.places.append(None)
+            self.size += 1
+            return self.size - 1
+
+        # Full: overwrite the oldest slot
+        slot = self._next_slot
+        self._next_slot = (self._next_slot + 1) % self.max_places
+        old = self.places[slot]
+        if old is not None:
+            self.slots.pop(old["fsq_place_id"], None)
+        return slot
+
+    def _summarize(self, place: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        place_id = place.get("fsq_place_id")
+        lat = place.get("latitude") or place.get("lat")
+        lon = place.get("longitude") or place.get("lon")
+        if not place_id or lat is None or lon is None:
+            return None
+        categories = place.get("categories") or []
+        rating = place.get("rating") or 0
+        popularity = place.get("popularity") or 0
+        return {
+            "fsq_place_id": place_id,
+            "name": place.get("name", "Unknown"),
+            "category": categories[0].get("name", "Place") if categories else "Place",
+            "latitude": float(lat),
+            "longitude": float(lon),
+            "rating": rating,
+            "locality": (place.get("location") or {}).get("locality"),
+            # Rating is out of 10; popularity is 0..1, so use it as a weaker tiebreaker
+            "score": float(rating) + float(popularity),
+        }
+
+place_index = PlaceIndex()
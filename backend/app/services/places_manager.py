@@ -1,5 +1,9 @@
 from typing import Dict, List, Optional, Any
 from .foursquare_service import FoursquareService
+from .density_model import density_model
+from .personalizer import UserVector, personalizer
+from .search_pipeline import SearchPipeline
+from . import deadline
 import re
 import json
 
@@ -186,6 +190,23 @@ class PlacesManager:
         else:
             return ["place", "business", "establishment"]
     
+    def _task_place(self, place: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """A search result in the shape plan-day stores, or None without valid coordinates"""
+        lat = place.get("latitude") or place.get("lat")
+        lng = place.get("longitude") or place.get("lon")
+        if not lat or not lng:
+            return None
+        return {
+            "name": place.get("name", "Unknown"),
+            "lat": lat,
+            "lng": lng,
+            "category": place.get("categories", [{}])[0].get("name", "Place") if place.get("categories") else "Place",
+            "distance": place.get("distance", 0),
+            "rating": place.get("rating", 0),
+            "fsq_id": place.get("fsq_place_id") or None,
+            "search_category": place.get("search_category"),
+        }
+    
     def _calculate_relevance_score(self, place: Dict[str, Any], task: str, keywords: List[str]) -> float:
         """Calculate how relevant a place is to a task"""
         score = 0.0
@@ -272,7 +293,15 @@ class PlacesManager:
             "fsq_id": f"fallback_{keyword}_{index}"
         }
     
-    async def find_place_for_task(self, task: str, origin_lat: float, origin_lon: float, radius: int = 25000, task_index: int = 0) -> Optional[Dict[str, Any]]:
+    async def find_place_for_task(
+        self,
+        task: str,
+        origin_lat: float,
+        origin_lon: float,
+        radius: int = 25000,
+        task_index: int = 0,
+        vector: Optional[UserVector] = None,
+    ) -> Optional[Dict[str, Any]]:
         """Find a suitable place for a given task near the origin coordinates"""
         try:
             print(f"🔍 Searching for task: '{task}' at ({origin_lat}, {origin_lon})")
@@ -291,58 +320,49 @@ class PlacesManager:
                 return None
             
             # Strategy 2: Search with LLM categories, prioritizing closer places
-            radiuses_to_try = [5000, 10000, 15000, 20000]  # Start with smaller radiuses for closer places
+            # Start from the smallest radius this area's density suggests, widening from there
+            radiuses_to_try = density_model.radius_ladder(origin_lat, origin_lon, search_categories, want=5, max_radius=20000)
             
             for search_radius in radiuses_to_try:
-                all_places = []
+                if deadline.expired():
+                    break
+                async def search_categories_at(search_radius: int = search_radius) -> List[Dict[str, Any]]:
+                    found = []
+                    # Search with each category
+                    for category in search_categories:
+                        try:
+                            print(f"🔎 Searching for '{category}' with radius {search_radius}m")
+                            search_result = await self.foursquare.search(
+                                lat=origin_lat,
+                                lon=origin_lon,
+                                query=category,
+                                radius=search_radius,
+                                limit=20
+                            )
+                            places = search_result.get("results", [])
+                            print(f"📍 Found {len(places)} places for '{category}' with radius {search_radius}m")
+                            found.extend({**place, "search_category": category} for place in places)
+                        except Exception as e:
+                            print(f"❌ Error searching for '{category}' with radius {search_radius}m: {e}")
+                            continue
+                    return found
                 
-                # Search with each category
-                for category in search_categories:
-                    try:
-                        print(f"🔎 Searching for '{category}' with radius {search_radius}m")
-                        search_result = await self.foursquare.search(
-                            lat=origin_lat,
-                            lon=origin_lon,
-                            query=category,
-                            radius=search_radius,
-                            limit=20
-                        )
-                        
-                        places = search_result.get("results", [])
-                        print(f"📍 Found {len(places)} places for '{category}' with radius {search_radius}m")
-                        
-                        if places:
-                            # Filter places with valid coordinates
-                            valid_places = []
-                            for place in places:
-                                lat = place.get("latitude") or place.get("lat")
-                                lng = place.get("longitude") or place.get("lon")
-                                
-                                if lat and lng:
-                                    place_data = {
-                                        "name": place.get("name", "Unknown"),
-                                        "lat": lat,
-                                        "lng": lng,
-                                        "category": place.get("categories", [{}])[0].get("name", "Place") if place.get("categories") else "Place",
-                                        "distance": place.get("distance", 0),
-                                        "rating": place.get("rating", 0),
-                                        "fsq_id": place.get("fsq_place_id", ""),
-                                        "search_category": category
-                                    }
-                                    valid_places.append(place_data)
-                            
-                            all_places.extend(valid_places)
-                    
-                    except Exception as e:
-                        print(f"❌ Error searching for '{category}' with radius {search_radius}m: {e}")
-                        continue
+                # Closest (then most relevant) first, reranked by the user's taste with dislikes dropped
+                result = await SearchPipeline(
+                    "plan_day",
+                    fetch=search_categories_at,
+                    normalize=self._task_place,
+                    dedupe_key="fsq_id",
+                    rank=[
+                        lambda items: sorted(items, key=lambda x: (x["distance"], -self._calculate_relevance_score(x, task, search_categories))),
+                        lambda items: personalizer.rerank(items, vector),
+                    ],
+                    limit=1,
+                ).run()
                 
                 # If we found places, select the best one
-                if all_places:
-                    # Sort by distance (closest first) and then by relevance
-                    all_places.sort(key=lambda x: (x["distance"], -self._calculate_relevance_score(x, task, search_categories)))
-                    
-                    best_place = all_places[0]
+                if result.results:
+                    best_place = result.results[0]
                     print(f"✅ Found best place: {best_place['name']} ({best_place['category']}) at {best_place['lat']}, {best_place['lng']} - {best_place['distance']}m away")
                     return best_place
                 
@@ -354,32 +374,23 @@ class PlacesManager:
             print(f"📝 Fallback keywords: {search_keywords}")
             
             for keyword in search_keywords:
+                if deadline.expired():
+                    break
                 try:
                     search_result = await self.foursquare.search(
                         lat=origin_lat,
                         lon=origin_lon,
                         query=keyword,
-                        radius=radius,
+                        radius=density_model.radius_for(origin_lat, origin_lon, keyword, want=5, default=radius, max_radius=radius),
                         limit=15
                     )
                     
-                    places = search_result.get("results", [])
+                    places = personalizer.rerank(search_result.get("results", []), vector)
                     if places:
                         for place in places:
-                            lat = place.get("latitude") or place.get("lat")
-                            lng = place.get("longitude") or place.get("lon")
-                            
-                            if lat and lng:
-                                place_data = {
-                                    "name": place.get("name", "Unknown"),
-                                    "lat": lat,
-                                    "lng": lng,
-                                    "category": place.get("categories", [{}])[0].get("name", "Place") if place.get("categories") else "Place",
-                                    "distance": place.get("distance", 0),
-                                    "rating": place.get("rating", 0),
-                                    "fsq_id": place.get("fsq_place_id", "")
-                                }
-                                print(f"✅ Fallback: Found place: {place_data['name']} at {lat}, {lng}")
+                            place_data = self._task_place(place)
+                            if place_data:
+                                print(f"✅ Fallback: Found place: {place_data['name']} at {place_data['lat']}, {place_data['lng']}")
                                 return place_data
                                 
                 except Exception as e:
@@ -395,12 +406,25 @@ class PlacesManager:
             fallback_place = self._get_fallback_place("general", origin_lat, origin_lon, task_index)
             return fallback_place
     
-    async def find_places_for_tasks(self, tasks: List[str], origin_lat: float, origin_lon: float, radius: int = 25000) -> List[Dict[str, Any]]:
-        """Find places for multiple tasks"""
+    async def find_places_for_tasks(
+        self,
+        tasks: List[str],
+        origin_lat: float,
+        origin_lon: float,
+        radius: int = 25000,
+        vector: Optional[UserVector] = None,
+    ) -> List[Dict[str, Any]]:
+        """Find places for multiple tasks, personalised when the user's vector is given"""
         places = []
         
         for i, task in enumerate(tasks):
-            place = await self.find_place_for_task(task, origin_lat, origin_lon, radius, i)
+            if deadline.expired():
+                # Out of time: remaining tasks get a nearby placeholder instead of a search
+                deadline.mark_partial()
+                keywords = self._extract_task_keywords(task)
+                place = self._get_fallback_place(keywords[0] if keywords else "general", origin_lat, origin_lon, i)
+            else:
+                place = await self.find_place_for_task(task, origin_lat, origin_lon, radius, i, vector)
             if place:
                 places.append({
                     "task": task,
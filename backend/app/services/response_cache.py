@@ -0,0 +1,82 @@
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from ..config import settings
+from .metrics import metrics
+
+# Prompts mentioning who the user is are never cached, so one user's name
+# can't end up in another user's reply
+PERSONAL_NAME = re.compile(
+    r"\b(?:my\s+name\s+is|i\s+am\s+called|call\s+me)\s+\w+"
+    r"|user'?s name:\s*(?!not provided\b)\w+"
+    r"|told you their name",
+    re.IGNORECASE,
+)
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+WHITESPACE = re.compile(r"\s+")
+
+def normalize_prompt(text: str) -> str:
+    """Case, punctuation and whitespace-insensitive form of a prompt"""
+    return WHITESPACE.sub(" ", PUNCTUATION.sub(" ", text.lower())).strip()
+
+def contains_personal_name(text: str, context: Dict[str, Any] | None = None) -> bool:
+    if context and (context.get("name") or context.get("user_name")):
+        return True
+    return bool(PERSONAL_NAME.search(text))
+
+class ResponseCache:
+    """LLM replies keyed on the normalized chat messages, model, temperature and max_tokens.
+
+    Entries expire after a TTL and the least recently used entry is evicted
+    beyond max_entries. Each entry remembers how long the original completion
+    took, so hits can report the latency they saved.
+    """
+
+    def __init__(self, ttl_seconds: int = 600, max_entries: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str, float]]" = OrderedDict()
+
+    def key(self, messages: List[Dict[str, str]], model: str, temperature: float, max_tokens: int | None = None) -> str:
+        normalized = [(m["role"], normalize_prompt(m["content"])) for m in messages]
+        raw = json.dumps([model, temperature, max_tokens, normalized])
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            metrics.incr("mistral_cache.misses")
+            return None
+        self._entries.move_to_end(key)
+        _, reply, latency = entry
+        metrics.incr("mistral_cache.hits")
+        metrics.incr("mistral_cache.saved_seconds", latency)
+        return reply
+
+    def put(self, key: str, reply: str, latency: float):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, reply, latency)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = metrics.counters["mistral_cache.hits"]
+        misses = metrics.counters["mistral_cache.misses"]
+        return {
+            "entries": len(self._entries),
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "saved_seconds": round(metrics.counters["mistral_cache.saved_seconds"], 2),
+        }
+
+response_cache = ResponseCache(
+    ttl_seconds=settings.MISTRAL_CACHE_TTL_SECONDS,
+    max_entries=settings.MISTRAL_CACHE_MAX_ENTRIES,
+)
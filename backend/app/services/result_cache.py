@@ -0,0 +1,103 @@
+import base64
+import binascii
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from ..config import settings
+
+# Largest page a client may ask for with page_size
+MAX_PAGE_SIZE = 100
+
+class ResultSetCache:
+    """Merged search result sets kept server-side for cursor pagination.
+
+    A search stores its full, sorted result list once and hands out a cursor;
+    later pages are sliced from the stored list without any upstream calls.
+    Sets expire after a TTL and the least recently used sets are evicted
+    whenever the total number of cached places exceeds max_items.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_sets: int = 256, max_items: int = 20000):
+        self.ttl_seconds = ttl_seconds
+        self.max_sets = max_sets
+        self.max_items = max_items
+        self._sets: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._item_count = 0
+
+    def put(self, results: List[Dict[str, Any]]) -> str:
+        """Store a result set and return its id; a set larger than max_items keeps only its first max_items"""
+        self._evict_expired()
+        results = results[:self.max_items]
+        set_id = secrets.token_urlsafe(9)
+        self._sets[set_id] = (time.monotonic() + self.ttl_seconds, results)
+        self._item_count += len(results)
+        # The new set is last in the order, so keeping one set left means it is never evicted
+        while len(self._sets) > 1 and (len(self._sets) > self.max_sets or self._item_count > self.max_items):
+            _, (_, evicted) = self._sets.popitem(last=False)
+            self._item_count -= len(evicted)
+        return set_id
+
+    def get(self, set_id: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self._sets.get(set_id)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at < time.monotonic():
+            self._drop(set_id)
+            return None
+        self._sets.move_to_end(set_id)
+        return results
+
+    def first_page(self, results: List[Dict[str, Any]], page_size: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Cache a fresh result set and return its first page and next cursor"""
+        if len(results) <= page_size:
+            return results, None
+        set_id = self.put(results)
+        return results[:page_size], encode_cursor(set_id, page_size, page_size)
+
+    def page(self, cursor: str, page_size: int | None = None) -> Optional[Tuple[List[Dict[str, Any]], Optional[str], int]]:
+        """Return (page, next cursor, total) for a cursor, or None if it is unknown or expired"""
+        decoded = decode_cursor(cursor)
+        if decoded is None:
+            return None
+        set_id, offset, cursor_size = decoded
+        results = self.get(set_id)
+        if results is None:
+            return None
+        size = page_size or cursor_size
+        end = offset + size
+        next_cursor = encode_cursor(set_id, end, size) if end < len(results) else None
+        return results[offset:end], next_cursor, len(results)
+
+    def _drop(self, set_id: str):
+        _, results = self._sets.pop(set_id)
+        self._item_count -= len(results)
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [set_id for set_id, (expires_at, _) in self._sets.items() if expires_at < now]
+        for set_id in expired:
+            self._drop(set_id)
+
+def encode_cursor(set_id: str, offset: int, page_size: int) -> str:
+    raw = f"{set_id}:{offset}:{page_size}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Optional[Tuple[str, int, int]]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        set_id, offset, page_size = base64.urlsafe_b64decode(padded).decode().rsplit(":", 2)
+        offset, page_size = int(offset), int(page_size)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+    # Forged or corrupted cursors would otherwise slice from the end of the set
+    if offset < 0 or page_size < 1:
+        return None
+    return set_id, offset, page_size
+
+result_cache = ResultSetCache(
+    ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+    max_sets=settings.RESULT_CACHE_MAX_SETS,
+    max_items=settings.RESULT_CACHE_MAX_ITEMS,
+)
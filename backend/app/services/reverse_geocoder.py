@@ -0,0 +1,249 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from ..config import settings
+from .gazetteer import (
+    COL_CLASS, COL_CODE, COL_COUNTRY, COL_LAT, COL_LON, COL_NAME, COL_POPULATION, DATA_DIR, DEFAULT_GAZETTEER_PATH,
+)
+from .geo import EARTH_RADIUS_KM
+
+DEFAULT_ADMIN1_PATH = os.path.join(DATA_DIR, "admin1_codes.tsv")
+COL_ADMIN1 = 10
+
+# Bump when the locality cache layout changes so stale caches are rebuilt
+CACHE_VERSION = 1
+
+KM_PER_DEGREE = 111.32
+
+class ReverseGeocoder:
+    """Nearest locality for a coordinate from a local GeoNames-style dump.
+
+    Localities are bucketed into a uniform lat/lon grid; cells are stored as
+    contiguous runs of a cell-sorted array, so a lookup bisects for the few
+    cells within max_km and measures only the localities in them. Answers are
+    memoised per coordinate rounded to `precision` decimals (about 110 m at
+    3), since app opens cluster around the same spots. Points farther than
+    max_km from every locality are reported as uncovered (None).
+
+    Like the gazetteer, the parsed localities are written to an .npz cache
+    next to the dump and reused while it is newer than the dump and the
+    admin1 file. The process-wide instance is built at startup, off the
+    event loop.
+    """
+
+    def __init__(
+        self,
+        names: List[str],
+        lats: np.ndarray,
+        lons: np.ndarray,
+        countries: List[str],
+        regions: List[Optional[str]],
+        country_names: Dict[str, str],
+        cell_deg: float = 0.25,
+        max_km: float = 25.0,
+        precision: int = 3,
+        cache_size: int = 50_000,
+    ):
+        self.names = names
+        self.lats = lats
+        self.lons = lons
+        self.countries = countries
+        self.regions = regions
+        self.country_names = country_names
+        self.cell_deg = cell_deg
+        self.max_km = max_km
+        self.precision = precision
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[float, float], Optional[Dict[str, Any]]]" = OrderedDict()
+
+        self._n_cols = int(round(360 / cell_deg))
+        keys = self._cell_key(self._row(lats), self._col(lons))
+        order = np.argsort(keys, kind="stable")
+        self._ids = order
+        self._keys = keys[order]
+        self._lats = np.radians(lats[order])
+        self._lons = np.radians(lons[order])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _row(self, lat):
+        return np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype(np.int64)
+
+    def _col(self, lon):
+        return np.floor((np.asarray(lon) + 180.0) / self.cell_deg).astype(np.int64) % self._n_cols
+
+    def _cell_key(self, row, col):
+        return row * self._n_cols + col
+
+    def lookup(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        """{"locality", "region", "country", "country_code", "distance_km"} or None when uncovered"""
+        key = (round(lat, self.precision), round(lon, self.precision))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        result = self._nearest(lat, lon)
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def _nearest(self, lat: float, lon: float) -> Optional[Dict[str, Any]]:
+        row, col = int(self._row(lat)), int(self._col(lon))
+        row_span = math.ceil(self.max_km / (KM_PER_DEGREE * self.cell_deg))
+        # Degrees of longitude shrink towards the poles, so search more columns there
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + row_span * self.cell_deg, 89.0))), 0.01)
+        col_span = min(math.ceil(self.max_km / (KM_PER_DEGREE * self.cell_deg * cos_lat)), self._n_cols // 2)
+
+        candidates = []
+        for r in range(row - row_span, row + row_span + 1):
+            first = self._cell_key(r, (col - col_span) % self._n_cols)
+            last = self._cell_key(r, (col + col_span) % self._n_cols)
+            if first <= last:
+                lo, hi = np.searchsorted(self._keys, [first, last + 1])
+                candidates.append(np.arange(lo, hi))
+            else:
+                # Column window wraps around the antimeridian
+                row_start, row_end = self._cell_key(r, 0), self._cell_key(r, self._n_cols)
+                for a, b in ((first, row_end), (row_start, last + 1)):
+                    lo, hi = np.searchsorted(self._keys, [a, b])
+                    candidates.append(np.arange(lo, hi))
+        picked = np.concatenate(candidates) if candidates else np.zeros(0, dtype=np.int64)
+        if not len(picked):
+            return None
+
+        lat_r, lon_r = math.radians(lat), math.radians(lon)
+        dlat = self._lats[picked] - lat_r
+        dlon = self._lons[picked] - lon_r
+        h = np.sin(dlat / 2) ** 2 + math.cos(lat_r) * np.cos(self._lats[picked]) * np.sin(dlon / 2) ** 2
+        dist = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+        best = int(np.argmin(dist))
+        if dist[best] > self.max_km:
+            return None
+
+        place_id = int(self._ids[picked[best]])
+        code = self.countries[place_id]
+        return {
+            "locality": self.names[place_id],
+            "region": self.regions[place_id],
+            "country": self.country_names.get(code, code),
+            "country_code": code,
+            "distance_km": round(float(dist[best]), 2),
+        }
+
+    @classmethod
+    def from_geonames(cls, path: str, admin1_path: Optional[str] = None, **kwargs) -> "ReverseGeocoder":
+        """Every populated place (feature class P) in the dump, with region names from admin1CodesASCII.txt"""
+        admin1: Dict[str, str] = {}
+        if admin1_path and os.path.exists(admin1_path):
+            with open(admin1_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip() and not line.startswith("#"):
+                        code, name = line.split("\t")[:2]
+                        admin1[code] = name
+
+        names: List[str] = []
+        lats: List[float] = []
+        lons: List[float] = []
+        countries: List[str] = []
+        regions: List[Optional[str]] = []
+        country_names: Dict[str, Tuple[int, str]] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                cols = line.rstrip("\n").split("\t")
+                if cols[COL_CLASS] == "A" and cols[COL_CODE].startswith("PCL"):
+                    # Several PCL* rows can share a code; the most populous names the country
+                    population = int(cols[COL_POPULATION] or 0)
+                    if population >= country_names.get(cols[COL_COUNTRY], (-1, ""))[0]:
+                        country_names[cols[COL_COUNTRY]] = (population, cols[COL_NAME])
+                    continue
+                if cols[COL_CLASS] != "P":
+                    continue
+                names.append(cols[COL_NAME])
+                lats.append(float(cols[COL_LAT]))
+                lons.append(float(cols[COL_LON]))
+                countries.append(cols[COL_COUNTRY])
+                regions.append(admin1.get(f"{cols[COL_COUNTRY]}.{cols[COL_ADMIN1]}"))
+
+        return cls(
+            names,
+            np.asarray(lats, dtype=np.float64),
+            np.asarray(lons, dtype=np.float64),
+            countries,
+            regions,
+            {code: name for code, (_, name) in country_names.items()},
+            **kwargs,
+        )
+
+    def save_cache(self, path: str):
+        codes = list(self.country_names)
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                version=CACHE_VERSION,
+                names=np.frombuffer("\n".join(self.names).encode(), dtype=np.uint8),
+                lats=self.lats,
+                lons=self.lons,
+                countries=np.asarray(self.countries, dtype="U2"),
+                # Localities without a known region are stored as ""
+                regions=np.frombuffer("\n".join(region or "" for region in self.regions).encode(), dtype=np.uint8),
+                country_codes=np.asarray(codes, dtype="U2"),
+                country_names=np.frombuffer("\n".join(self.country_names[code] for code in codes).encode(), dtype=np.uint8),
+            )
+
+    @classmethod
+    def load_cache(cls, path: str, **kwargs) -> "ReverseGeocoder":
+        data = np.load(path)
+        if int(data["version"]) != CACHE_VERSION:
+            raise ValueError(f"Locality cache {path} has an old layout")
+        names = data["names"].tobytes().decode().split("\n") if data["names"].size else []
+        regions = data["regions"].tobytes().decode().split("\n") if len(names) else []
+        country_names = data["country_names"].tobytes().decode().split("\n") if data["country_codes"].size else []
+        return cls(
+            names,
+            data["lats"],
+            data["lons"],
+            data["countries"].tolist(),
+            [region or None for region in regions],
+            dict(zip(data["country_codes"].tolist(), country_names)),
+            **kwargs,
+        )
+
+    @classmethod
+    def load(cls, path: str, admin1_path: Optional[str] = None, use_cache: bool = True, **kwargs) -> "ReverseGeocoder":
+        """Load from the .npz cache when it is up to date, otherwise parse and refresh it"""
+        cache_path = f"{path}.localities.npz"
+        sources = [path] + ([admin1_path] if admin1_path and os.path.exists(admin1_path) else [])
+        if use_cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= max(map(os.path.getmtime, sources)):
+            try:
+                return cls.load_cache(cache_path, **kwargs)
+            except Exception as e:
+                print(f"⚠️ Ignoring locality cache {cache_path}: {e}")
+        geocoder = cls.from_geonames(path, admin1_path, **kwargs)
+        if use_cache:
+            try:
+                geocoder.save_cache(cache_path)
+            except OSError as e:
+                print(f"⚠️ Could not write locality cache {cache_path}: {e}")
+        return geocoder
+
+_reverse_geocoder: Optional[ReverseGeocoder] = None
+
+def get_reverse_geocoder() -> ReverseGeocoder:
+    """Process-wide reverse geocoder over settings.LOCALITY_PATH (the gazetteer dump by default); warmed in on_startup"""
+    global _reverse_geocoder
+    if _reverse_geocoder is None:
+        path = settings.LOCALITY_PATH or settings.GAZETTEER_PATH or DEFAULT_GAZETTEER_PATH
+        started = time.perf_counter()
+        _reverse_geocoder = ReverseGeocoder.load(
+            path,
+            settings.ADMIN1_CODES_PATH or DEFAULT_ADMIN1_PATH,
+            max_km=settings.REVERSE_GEOCODE_MAX_KM,
+        )
+        print(f"🧭 Reverse geocoder ready with {len(_reverse_geocoder)} localities from {path} in {time.perf_counter() - started:.2f}s")
+    return _reverse_geocoder
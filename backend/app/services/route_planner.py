@@ -0,0 +1,95 @@
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from .geo import haversine_matrix
+
+# Walking speed used for ETA estimates across plan-day responses
+WALKING_SPEED_KMH = 4.5
+
+class RoutePlanner:
+    """Orders plan-day stops using a cached stop-to-stop distance matrix.
+
+    The matrix is built once when stops are added to a session. Re-planning
+    from a new position only needs one extra row (position -> stops), so it
+    never touches Foursquare and stays in the millisecond range.
+    """
+
+    def build_matrix(self, coords: List[Tuple[float, float]]) -> np.ndarray:
+        """Stop-to-stop distances in km for a list of (lat, lng) pairs"""
+        if not coords:
+            return np.zeros((0, 0))
+        lats = [c[0] for c in coords]
+        lngs = [c[1] for c in coords]
+        return haversine_matrix(lats, lngs, lats, lngs)
+
+    def plan(
+        self,
+        start: Tuple[float, float],
+        coords: List[Tuple[float, float]],
+        matrix: np.ndarray,
+        remaining: List[int],
+    ) -> Tuple[List[int], float]:
+        """Return (visit order of stop indices, total distance in km) from start"""
+        if not remaining:
+            return [], 0.0
+
+        lats = [coords[i][0] for i in remaining]
+        lngs = [coords[i][1] for i in remaining]
+        from_start = haversine_matrix([start[0]], [start[1]], lats, lngs)[0]
+        sub = matrix[np.ix_(remaining, remaining)]
+
+        order = self._nearest_neighbour(from_start, sub)
+        order = self._two_opt(order, from_start, sub)
+        distance = self._path_length(order, from_start, sub)
+        return [remaining[i] for i in order], distance
+
+    def _nearest_neighbour(self, from_start: np.ndarray, sub: np.ndarray) -> List[int]:
+        n = len(from_start)
+        visited = np.zeros(n, dtype=bool)
+        current = int(np.argmin(from_start))
+        order = [current]
+        visited[current] = True
+        for _ in range(n - 1):
+            candidates = np.where(visited, np.inf, sub[current])
+            current = int(np.argmin(candidates))
+            order.append(current)
+            visited[current] = True
+        return order
+
+    def _two_opt(self, order: List[int], from_start: np.ndarray, sub: np.ndarray) -> List[int]:
+        """Improve an open path (fixed start, free end) by reversing segments"""
+        n = len(order)
+        if n < 3:
+            return order
+
+        def edge(a: int, b: int) -> float:
+            # Index -1 stands for the start position
+            return from_start[b] if a == -1 else sub[a, b]
+
+        improved = True
+        while improved:
+            improved = False
+            for i in range(n - 1):
+                prev = order[i - 1] if i > 0 else -1
+                for j in range(i + 1, n):
+                    nxt = order[j + 1] if j + 1 < n else None
+                    before = edge(prev, order[i]) + (sub[order[j], nxt] if nxt is not None else 0.0)
+                    after = edge(prev, order[j]) + (sub[order[i], nxt] if nxt is not None else 0.0)
+                    if after + 1e-9 < before:
+                        order[i:j + 1] = reversed(order[i:j + 1])
+                        improved = True
+        return order
+
+    def _path_length(self, order: List[int], from_start: np.ndarray, sub: np.ndarray) -> float:
+        if not order:
+            return 0.0
+        total = float(from_start[order[0]])
+        for a, b in zip(order, order[1:]):
+            total += float(sub[a, b])
+        return total
+
+    def summarize(self, distance_km: float) -> Dict[str, Any]:
+        """Distance/ETA block shared by plan-day responses"""
+        return {
+            "distance_km": round(distance_km, 1),
+            "eta_min": int(distance_km / WALKING_SPEED_KMH * 60),
+        }
@@ -0,0 +1,109 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence
+from .metrics import metrics
+from .result_cache import result_cache
+
+Place = Dict[str, Any]
+ListStage = Callable[[List[Place]], List[Place]]
+
+class PipelineResult(NamedTuple):
+    results: List[Place]
+    total: int                    # places that survived filtering, before truncation
+    next_cursor: Optional[str]    # set when the pipeline paginated
+    timings: Dict[str, float]     # milliseconds per stage
+
+async def results_of(response: Awaitable[Dict[str, Any]]) -> List[Place]:
+    """The result list of a Foursquare-shaped {"results": [...]} response"""
+    return (await response).get("results") or []
+
+class SearchPipeline:
+    """fetch → normalize → dedupe → filter → rank → truncate → hydrate.
+
+    Routes plug their own pieces into fixed stages, so cheap work (filters,
+    dislikes, truncation to the page) always happens before the costly
+    hydration, which only sees places that will be returned. Stages that
+    aren't given are skipped. Each stage's duration is recorded as the
+    pipeline.<name>.<stage> timing in /metrics and returned with the result.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fetch: Callable[[], Awaitable[List[Place]]],
+        normalize: Optional[Callable[[Place], Optional[Place]]] = None,
+        dedupe_key: Optional[str] = "fsq_place_id",
+        filters: Sequence[ListStage] = (),
+        rank: Sequence[ListStage] = (),
+        limit: Optional[int] = None,
+        page_size: Optional[int] = None,
+        hydrate: Optional[Callable[[List[Place]], Awaitable[Any]]] = None,
+    ):
+        self.name = name
+        self.fetch = fetch
+        self.normalize = normalize
+        self.dedupe_key = dedupe_key
+        self.filters = filters
+        self.rank = rank
+        self.limit = limit
+        self.page_size = page_size
+        self.hydrate = hydrate
+
+    async def run(self) -> PipelineResult:
+        timings: Dict[str, float] = {}
+        clock = time.perf_counter()
+
+        def lap(stage: str):
+            nonlocal clock
+            now = time.perf_counter()
+            metrics.observe(f"pipeline.{self.name}.{stage}", now - clock)
+            timings[stage] = round((now - clock) * 1000, 2)
+            clock = now
+
+        places = await self.fetch()
+        lap("fetch")
+
+        if self.normalize is not None:
+            places = [p for p in map(self.normalize, places) if p is not None]
+            lap("normalize")
+
+        if self.dedupe_key:
+            places = self._dedupe(places)
+            lap("dedupe")
+
+        if self.filters:
+            for stage in self.filters:
+                places = stage(places)
+            lap("filter")
+
+        if self.rank:
+            for stage in self.rank:
+                places = stage(places)
+            lap("rank")
+
+        total = len(places)
+        next_cursor = None
+        if self.page_size:
+            # The full ranked set is kept for later pages; only the first one goes on
+            places, next_cursor = result_cache.first_page(places, self.page_size)
+        elif self.limit is not None:
+            places = places[:self.limit]
+        lap("truncate")
+
+        if self.hydrate is not None and places:
+            await self.hydrate(places)
+            lap("hydrate")
+
+        return PipelineResult(places, total, next_cursor, timings)
+
+    def _dedupe(self, places: List[Place]) -> List[Place]:
+        seen = set()
+        unique = []
+        for place in places:
+            key = place.get(self.dedupe_key)
+            if key is None:
+                # Nothing to compare on (demo or partial data): keep it
+                unique.append(place)
+            elif key not in seen:
+                seen.add(key)
+                unique.append(place)
+        return unique
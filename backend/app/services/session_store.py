@@ -0,0 +1,275 @@
+import abc
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+import numpy as np
+from ..config import settings
+
+class SessionStore(abc.ABC):
+    """Key/value store for per-user state such as chat history and task sessions.
+
+    Callers load a session with `await get()`, change it and write it back
+    with `await put()`. Wrap that read-modify-write in `async with store.lock(key)` so two requests
+    for the same user can't overwrite each other's changes.
+    """
+
+    def __init__(self, max_age_seconds: float | None = None):
+        # Sessions untouched for this long are dropped by the background sweeper
+        self.max_age_seconds = max_age_seconds
+        self._locks: Dict[str, list] = {}
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    async def put(self, key: str, value: Dict[str, Any]):
+        ...
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    async def purge(self, max_age_seconds: float) -> int:
+        """Drop sessions not written for max_age_seconds; returns how many were dropped"""
+
+    @asynccontextmanager
+    async def lock(self, key: str) -> AsyncIterator[None]:
+        # [lock, number of requests holding or waiting for it]
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+class MemorySessionStore(SessionStore):
+    """Sessions kept in this process, least recently used dropped past max_entries.
+
+    get() hands out the stored dict itself, so in-place changes are visible
+    before put() is called. Both get() and put() move an entry to the end of
+    the ordered dict, which therefore stays sorted by last touch: expiry and
+    eviction only ever pop from the front.
+    """
+
+    def __init__(self, max_entries: int = 10000, max_age_seconds: float | None = None):
+        super().__init__(max_age_seconds)
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries[key] = (time.time(), entry[1])
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def put(self, key: str, value: Dict[str, Any]):
+        self._entries[key] = (time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def purge(self, max_age_seconds: float) -> int:
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        while self._entries:
+            touched_at, _ = next(iter(self._entries.values()))
+            if touched_at >= cutoff:
+                break
+            self._entries.popitem(last=False)
+            removed += 1
+        return removed
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, np.ndarray):
+        return {"__ndarray__": value.tolist()}
+    raise TypeError(f"Cannot store {type(value).__name__} in a session")
+
+def _decode(obj: Dict[str, Any]) -> Any:
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__ndarray__" in obj:
+        return np.asarray(obj["__ndarray__"], dtype=np.float64)
+    return obj
+
+def dumps(value: Dict[str, Any]) -> bytes:
+    """Compact session encoding: minified JSON, zlib compressed"""
+    return zlib.compress(json.dumps(value, default=_encode, separators=(",", ":")).encode())
+
+def loads(blob: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(blob), object_hook=_decode)
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file, shared by every worker on the host.
+
+    The database runs in WAL mode so readers don't block the writer. Besides
+    the in-process lock, lock() takes a lease row in session_locks, which
+    serialises a user's requests across workers too. Leases expire after
+    lock_timeout seconds in case a worker dies while holding one, so the
+    holder renews its lease while it runs; each lease carries an owner
+    token and is only renewed or released by the lock() that took it. Every
+    statement, session reads and writes as well as leases, runs in a thread,
+    since busy_timeout can make it wait up to 5 s on another worker's write.
+    """
+
+    def __init__(self, path: str, namespace: str, max_entries: int = 100000, lock_timeout: float = 30.0, max_age_seconds: float | None = None):
+        super().__init__(max_age_seconds)
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.lock_timeout = lock_timeout
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_store ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS session_store_age ON session_store (namespace, updated_at)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_locks (name TEXT PRIMARY KEY, expires_at REAL NOT NULL, owner TEXT NOT NULL DEFAULT '')"
+        )
+        # Lease tables created before leases had owners
+        if "owner" not in {row[1] for row in self._conn.execute("PRAGMA table_info(session_locks)")}:
+            self._conn.execute("ALTER TABLE session_locks ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, value: Dict[str, Any]):
+        await asyncio.to_thread(self._put, key, value)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete, key)
+
+    async def purge(self, max_age_seconds: float) -> int:
+        return await asyncio.to_thread(self._purge, max_age_seconds)
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT value FROM session_store WHERE namespace = ? AND key = ?", (self.namespace, key)
+        ).fetchone()
+        return loads(row[0]) if row else None
+
+    def _put(self, key: str, value: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO session_store (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (self.namespace, key, dumps(value), time.time()),
+        )
+
+    def _delete(self, key: str):
+        self._conn.execute("DELETE FROM session_store WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def _purge(self, max_age_seconds: float) -> int:
+        cur = self._conn.execute(
+            "DELETE FROM session_store WHERE namespace = ? AND updated_at < ?",
+            (self.namespace, time.time() - max_age_seconds),
+        )
+        removed = cur.rowcount
+        # Enforce the size cap by dropping the least recently written sessions
+        cur = self._conn.execute(
+            "DELETE FROM session_store WHERE namespace = ? AND key IN ("
+            " SELECT key FROM session_store WHERE namespace = ? ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_entries),
+        )
+        return removed + cur.rowcount
+
+    @asynccontextmanager
+    async def lock(self, key: str) -> AsyncIterator[None]:
+        async with super().lock(key):
+            name = f"{self.namespace}:{key}"
+            owner = uuid.uuid4().hex
+            while not await asyncio.to_thread(self._try_lease, name, owner):
+                await asyncio.sleep(0.01)
+            renewer = asyncio.create_task(self._renew_lease(name, owner))
+            try:
+                yield
+            finally:
+                renewer.cancel()
+                await asyncio.to_thread(
+                    self._conn.execute, "DELETE FROM session_locks WHERE name = ? AND owner = ?", (name, owner)
+                )
+
+    def _try_lease(self, name: str, owner: str) -> bool:
+        now = time.time()
+        cur = self._conn.execute(
+            "INSERT INTO session_locks (name, expires_at, owner) VALUES (?, ?, ?)"
+            " ON CONFLICT (name) DO UPDATE SET expires_at = excluded.expires_at, owner = excluded.owner"
+            " WHERE session_locks.expires_at < ?",
+            (name, now + self.lock_timeout, owner, now),
+        )
+        return cur.rowcount == 1
+
+    async def _renew_lease(self, name: str, owner: str):
+        """Push the lease's expiry out every third of lock_timeout while lock() is held"""
+        while True:
+            await asyncio.sleep(self.lock_timeout / 3)
+            try:
+                cur = await asyncio.to_thread(
+                    self._conn.execute,
+                    "UPDATE session_locks SET expires_at = ? WHERE name = ? AND owner = ?",
+                    (time.time() + self.lock_timeout, name, owner),
+                )
+            except sqlite3.Error as e:
+                print(f"⚠️ Session lease renewal failed: {e}")
+                continue
+            if cur.rowcount != 1:
+                print(f"⚠️ Session lease {name} was lost while held")
+                return
+
+# Every store created through create_session_store, swept by run_session_sweeper
+_stores: List[SessionStore] = []
+
+def create_session_store(namespace: str, max_age_seconds: float | None = None) -> SessionStore:
+    """Session store selected by settings.SESSION_STORE ("memory" or "sqlite")"""
+    if settings.SESSION_STORE == "sqlite":
+        store = SQLiteSessionStore(
+            settings.SESSION_STORE_PATH,
+            namespace,
+            max_entries=settings.SESSION_STORE_MAX_ENTRIES,
+            max_age_seconds=max_age_seconds,
+        )
+    else:
+        store = MemorySessionStore(max_entries=settings.SESSION_STORE_MAX_ENTRIES, max_age_seconds=max_age_seconds)
+    _stores.append(store)
+    return store
+
+async def sweep_sessions() -> int:
+    removed = 0
+    for store in _stores:
+        if store.max_age_seconds is not None:
+            removed += await store.purge(store.max_age_seconds)
+    return removed
+
+async def run_session_sweeper(interval_seconds: float):
+    """Expire idle sessions periodically so request handlers never have to"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            removed = await sweep_sessions()
+            if removed:
+                print(f"🧹 Expired {removed} idle sessions")
+        except Exception as e:
+            print(f"⚠️ Session sweep failed: {e}")
@@ -1,11 +1,17 @@
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 import json
+import numpy as np
+from .geo import haversine_matrix
+from .route_planner import RoutePlanner
+from .session_store import create_session_store
+from ..config import settings
 
 class TaskManager:
     def __init__(self):
-        # In-memory storage for demo (in production, use Redis/PostgreSQL)
-        self.task_sessions: Dict[str, Dict[str, Any]] = {}
+        # Per-process LRU by default; settings.SESSION_STORE="sqlite" shares sessions between workers
+        self.task_sessions = create_session_store("tasks", max_age_seconds=settings.SESSION_MAX_AGE_HOURS * 3600)
+        self.route_planner = RoutePlanner()
         
     def _get_session_key(self, user_id: str, origin_lat: float, origin_lon: float) -> str:
         """Generate a unique session key based on user and location"""
@@ -14,24 +20,30 @@ class TaskManager:
         lon_rounded = round(origin_lon, 4)
         return f"{user_id}_{lat_rounded}_{lon_rounded}"
     
-    def get_or_create_session(self, user_id: str, origin_lat: float, origin_lon: float) -> Dict[str, Any]:
+    def lock(self, user_id: str):
+        """Hold while changing a user's sessions so concurrent requests don't lose updates"""
+        return self.task_sessions.lock(user_id)
+    
+    async def get_or_create_session(self, user_id: str, origin_lat: float, origin_lon: float) -> Dict[str, Any]:
         """Get or create a task session for a user at a specific location"""
         session_key = self._get_session_key(user_id, origin_lat, origin_lon)
         
-        if session_key not in self.task_sessions:
-            self.task_sessions[session_key] = {
+        session = await self.task_sessions.get(session_key)
+        if session is None:
+            session = {
                 "user_id": user_id,
                 "origin": {"lat": origin_lat, "lng": origin_lon},
                 "tasks": [],
                 "created_at": datetime.now(),
                 "last_updated": datetime.now()
             }
+            await self.task_sessions.put(session_key, session)
         
-        return self.task_sessions[session_key]
+        return session
     
-    def add_tasks(self, user_id: str, origin_lat: float, origin_lon: float, tasks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def add_tasks(self, user_id: str, origin_lat: float, origin_lon: float, tasks: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Add new tasks to a session"""
-        session = self.get_or_create_session(user_id, origin_lat, origin_lon)
+        session = await self.get_or_create_session(user_id, origin_lat, origin_lon)
         
         # Add status to each task
         for task in tasks:
@@ -45,17 +57,82 @@ class TaskManager:
             if task["task"] not in existing_task_names:
                 session["tasks"].append(task)
         
+        self._refresh_route_cache(session)
         session["last_updated"] = datetime.now()
+        await self.task_sessions.put(self._get_session_key(user_id, origin_lat, origin_lon), session)
         return session
     
-    def complete_task(self, user_id: str, origin_lat: float, origin_lon: float, task_name: str) -> Optional[Dict[str, Any]]:
-        """Mark a task as completed"""
-        session_key = self._get_session_key(user_id, origin_lat, origin_lon)
+    def _refresh_route_cache(self, session: Dict[str, Any]):
+        """Keep the stop coordinates and distance matrix in sync with the session's tasks.
+
+        Tasks are only ever appended, so rows for stops already in the cache
+        are reused and only the new stops are measured.
+        """
+        cache = session.get("route_cache") or {"names": [], "coords": [], "matrix": np.zeros((0, 0))}
+        known = set(cache["names"])
+        new_stops = [
+            t for t in session["tasks"]
+            if t["task"] not in known and t.get("lat") is not None and t.get("lng") is not None
+        ]
+        if not new_stops and "route_cache" in session:
+            return
         
-        if session_key not in self.task_sessions:
+        names = cache["names"] + [t["task"] for t in new_stops]
+        coords = cache["coords"] + [(t["lat"], t["lng"]) for t in new_stops]
+        old_n = len(cache["names"])
+        matrix = np.zeros((len(names), len(names)))
+        matrix[:old_n, :old_n] = cache["matrix"]
+        if new_stops:
+            lats = [c[0] for c in coords]
+            lngs = [c[1] for c in coords]
+            new_rows = haversine_matrix(lats[old_n:], lngs[old_n:], lats, lngs)
+            matrix[old_n:, :] = new_rows
+            matrix[:, old_n:] = new_rows.T
+        
+        session["route_cache"] = {"names": names, "coords": coords, "matrix": matrix}
+    
+    async def replan(self, user_id: str, origin_lat: float, origin_lon: float, current: Optional[Dict[str, float]] = None) -> Optional[Dict[str, Any]]:
+        """Re-order the remaining stops from the user's current position.
+
+        Uses only the session's cached coordinates and distance matrix, so no
+        upstream search is made.
+        """
+        session_key = self._get_session_key(user_id, origin_lat, origin_lon)
+        session = await self.task_sessions.get(session_key)
+        if session is None:
             return None
         
-        session = self.task_sessions[session_key]
+        route = self._replan_session(session, current)
+        await self.task_sessions.put(session_key, session)
+        return route
+    
+    def _replan_session(self, session: Dict[str, Any], current: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        if current and current.get("lat") is not None and current.get("lng") is not None:
+            session["current_location"] = {"lat": current["lat"], "lng": current["lng"]}
+        start = session.get("current_location") or session["origin"]
+        
+        self._refresh_route_cache(session)
+        cache = session["route_cache"]
+        pending = {t["task"] for t in session["tasks"] if t["status"] == "pending"}
+        remaining = [i for i, name in enumerate(cache["names"]) if name in pending]
+        
+        order, distance_km = self.route_planner.plan(
+            (start["lat"], start["lng"]), cache["coords"], cache["matrix"], remaining
+        )
+        session["route"] = {
+            "start": start,
+            "stops": [cache["names"][i] for i in order],
+            **self.route_planner.summarize(distance_km),
+        }
+        session["last_updated"] = datetime.now()
+        return session["route"]
+    
+    async def complete_task(self, user_id: str, origin_lat: float, origin_lon: float, task_name: str, current: Optional[Dict[str, float]] = None) -> Optional[Dict[str, Any]]:
+        """Mark a task as completed and re-plan the remaining stops"""
+        session_key = self._get_session_key(user_id, origin_lat, origin_lon)
+        session = await self.task_sessions.get(session_key)
+        if session is None:
+            return None
         
         # Find and mark the task as completed
         for task in session["tasks"]:
@@ -63,34 +140,32 @@ class TaskManager:
                 task["status"] = "completed"
                 task["completed_at"] = datetime.now().isoformat()
                 session["last_updated"] = datetime.now()
+                # Without an explicit position, assume the user is at the stop they just finished
+                if not current and task.get("lat") is not None and task.get("lng") is not None:
+                    current = {"lat": task["lat"], "lng": task["lng"]}
+                self._replan_session(session, current)
+                await self.task_sessions.put(session_key, session)
                 return session
         
         return None
     
-    def get_pending_tasks(self, user_id: str, origin_lat: float, origin_lon: float) -> List[Dict[str, Any]]:
+    async def get_pending_tasks(self, user_id: str, origin_lat: float, origin_lon: float) -> List[Dict[str, Any]]:
         """Get only pending tasks for a session"""
-        session = self.get_or_create_session(user_id, origin_lat, origin_lon)
+        session = await self.get_or_create_session(user_id, origin_lat, origin_lon)
         return [task for task in session["tasks"] if task["status"] == "pending"]
     
-    def get_all_tasks(self, user_id: str, origin_lat: float, origin_lon: float) -> List[Dict[str, Any]]:
+    async def get_all_tasks(self, user_id: str, origin_lat: float, origin_lon: float) -> List[Dict[str, Any]]:
         """Get all tasks (pending and completed) for a session"""
-        session = self.get_or_create_session(user_id, origin_lat, origin_lon)
+        session = await self.get_or_create_session(user_id, origin_lat, origin_lon)
         return session["tasks"]
     
-    def cleanup_old_sessions(self, max_age_hours: int = 24):
-        """Remove old task sessions"""
-        cutoff = datetime.now() - timedelta(hours=max_age_hours)
-        expired_keys = [
-            key for key, session in self.task_sessions.items()
-            if session["last_updated"] < cutoff
-        ]
-        
-        for key in expired_keys:
-            del self.task_sessions[key]
+    async def cleanup_old_sessions(self, max_age_hours: int = 24):
+        """Remove old task sessions now; the background sweeper normally does this"""
+        await self.task_sessions.purge(timedelta(hours=max_age_hours).total_seconds())
     
-    def get_session_summary(self, user_id: str, origin_lat: float, origin_lon: float) -> Dict[str, Any]:
+    async def get_session_summary(self, user_id: str, origin_lat: float, origin_lon: float) -> Dict[str, Any]:
         """Get a summary of the task session"""
-        session = self.get_or_create_session(user_id, origin_lat, origin_lon)
+        session = await self.get_or_create_session(user_id, origin_lat, origin_lon)
         
         total_tasks = len(session["tasks"])
         completed_tasks = len([t for t in session["tasks"] if t["status"] == "completed"])
@@ -0,0 +1,321 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from ..config import settings
+from . import admission, deadline
+from .deadline import DeadlineExceeded
+from .geo import EARTH_RADIUS_KM, haversine_matrix
+from .metrics import metrics
+from .upstream_scheduler import BACKGROUND, upstream_priority
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Foursquare's largest page; tiles are fetched whole so any later query can reuse them
+TILE_FETCH_LIMIT = 50
+
+# Wider searches (city-scale forward geocoding) would need tiles too coarse for
+# a 50-venue page to cover, so they go upstream directly
+MAX_TILED_RADIUS_M = 10_000
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Finest tiles used; a dense tile at this precision keeps its 50 venues nearest the centre
+MAX_TILE_PRECISION = 7
+
+TileFetch = Callable[[float, float, int], Awaitable[List[Dict[str, Any]]]]
+Bounds = Tuple[float, float, float, float]
+Tile = Tuple[str, Bounds]
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a geohash cell at this precision"""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    return 180.0 / 2 ** (bits - lon_bits), 360.0 / 2 ** lon_bits
+
+def tile_precision(radius_m: float) -> int:
+    """Coarsest geohash precision whose cells are still at least as tall as the radius"""
+    precision = 6
+    while precision > 1 and cell_size(precision)[0] * KM_PER_DEGREE * 1000 < radius_m:
+        precision -= 1
+    return precision
+
+def encode_cell(row: int, col: int, precision: int) -> str:
+    """Geohash of the cell at this grid row (latitude) and column (longitude)"""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits - lon_bits
+    value = 0
+    for i in range(bits):
+        if i % 2 == 0:
+            lon_bits -= 1
+            value = value << 1 | (col >> lon_bits) & 1
+        else:
+            lat_bits -= 1
+            value = value << 1 | (row >> lat_bits) & 1
+    return "".join(BASE32[value >> shift & 31] for shift in range(bits - 5, -1, -5))
+
+def point_geohash(lat: float, lon: float, precision: int) -> str:
+    height, width = cell_size(precision)
+    row = min(int((lat + 90) // height), round(180 / height) - 1)
+    col = int((lon + 180) // width) % round(360 / width)
+    return encode_cell(row, col, precision)
+
+def covering_tiles(lat: float, lon: float, radius_m: float, precision: int, within: Bounds | None = None) -> List[Tile]:
+    """(geohash, bounds) of every cell the circle touches, optionally only those inside a parent cell"""
+    height, width = cell_size(precision)
+    radius_km = radius_m / 1000
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    south_edge, north_edge = max(lat - dlat, -90), min(lat + dlat, 90 - 1e-9)
+    west_edge, east_edge = lon - dlon, lon + dlon
+    if within is not None:
+        # Cells nest exactly, so the parent's box (nudged inwards) selects its children
+        south_edge, west_edge = max(south_edge, within[0] + height / 2), max(west_edge, within[1] + width / 2)
+        north_edge, east_edge = min(north_edge, within[2] - height / 2), min(east_edge, within[3] - width / 2)
+    rows = range(int((south_edge + 90) // height), int((north_edge + 90) // height) + 1)
+    cols = range(int((west_edge + 180) // width), int((east_edge + 180) // width) + 1)
+    n_cols = round(360 / width)
+
+    tiles = []
+    for row in rows:
+        south = row * height - 90
+        for col in cols:
+            west = col * width - 180
+            # Skip bounding-box corners the circle doesn't reach
+            near_lat = min(max(lat, south), south + height)
+            near_lon = min(max(lon, west), west + width)
+            if haversine_matrix([lat], [lon], [near_lat], [near_lon])[0, 0] > radius_km:
+                continue
+            wrapped = col % n_cols
+            west = wrapped * width - 180
+            tiles.append((encode_cell(row, wrapped, precision), (south, west, south + height, west + width)))
+    return tiles
+
+class TileSearchCache:
+    """Venue searches answered from geohash tiles instead of per-circle calls.
+
+    A circle query is decomposed into the geohash cells it touches, at a
+    precision chosen from the radius. Each cell is fetched once per query and
+    category set (from its centre, wide enough to reach its corners), trimmed
+    to the cell and cached for ttl_seconds, so nearby, overlapping and panning
+    searches share cells. A cell whose fetch came back as a full page is
+    dense: its venues are kept, and the query also descends into the child
+    cells it touches, so busy areas end up with finer tiles than quiet ones.
+    Missing or stale cells are fetched concurrently, and callers asking for a
+    cell already in flight wait for that fetch. Results from all cells are
+    then deduplicated, filtered to the circle and sorted by distance.
+
+    A cold query costs one call per missing cell, several times what a single
+    direct search would. A query that would need more than max_cold_fetches
+    new cells gets None instead, and the caller searches upstream directly.
+    Before returning None it starts background fetches for the nearest
+    missing cells, within what is left of its max_cold_fetches budget. Busy
+    areas, whose full tiles always send a query down to more children, then
+    fill in over repeated searches rather than staying cold.
+    """
+
+    def __init__(self, ttl_seconds: int = 900, max_tiles: int = 5000, max_cold_fetches: int = 6):
+        self.ttl_seconds = ttl_seconds
+        self.max_tiles = max_tiles
+        self.max_cold_fetches = max_cold_fetches
+        self._tiles: "OrderedDict[Tuple[str, ...], Tuple[float, List[Dict[str, Any]], bool]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, ...], "asyncio.Task[Tuple[List[Dict[str, Any]], bool]]"] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+    async def search(
+        self,
+        fetch: TileFetch,
+        lat: float,
+        lon: float,
+        radius: int,
+        query: str | None = None,
+        categories: str | None = None,
+        lang: str | None = None,
+        limit: int | None = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Foursquare-shaped {"results": [...]} for the circle, nearest first; None when too few cells are cached"""
+        scope = ((query or "").strip().lower(), categories or "", lang or "")
+        tiles = covering_tiles(lat, lon, radius, tile_precision(radius))
+        merged: Dict[str, Dict[str, Any]] = {}
+        failures: List[BaseException] = []
+        fetched = 0
+        cold = 0
+        # Under load, answer from cached tiles alone when any cover the circle
+        cached_only = admission.degraded() and any(self._fresh(scope + (geohash,)) for geohash, _ in tiles)
+        while tiles:
+            if cached_only:
+                cached = [tile for tile in tiles if self._fresh(scope + (tile[0],))]
+                if len(cached) < len(tiles):
+                    metrics.incr("search_tiles.skipped", len(tiles) - len(cached))
+                    deadline.mark_partial()
+                tiles = cached
+                if not tiles:
+                    break
+            missing = [tile for tile in tiles if not self._fresh(scope + (tile[0],)) and scope + (tile[0],) not in self._inflight]
+            if cold + len(missing) > self.max_cold_fetches:
+                # Cells already fetched stay cached for the next query, and so will these
+                self._warm(fetch, scope, lat, lon, missing, self.max_cold_fetches - cold)
+                metrics.incr("search_tiles.too_cold")
+                return None
+            cold += len(missing)
+            outcomes = await asyncio.gather(
+                *(self._tile(fetch, scope + (geohash,), bounds) for geohash, bounds in tiles),
+                return_exceptions=True,
+            )
+            fetched += len(tiles)
+            dense: List[Tile] = []
+            for (geohash, bounds), outcome in zip(tiles, outcomes):
+                if isinstance(outcome, BaseException):
+                    failures.append(outcome)
+                    continue
+                places, truncated = outcome
+                for place in places:
+                    merged.setdefault(place["fsq_place_id"], place)
+                if truncated and len(geohash) < MAX_TILE_PRECISION:
+                    dense.append((geohash, bounds))
+            # Children farther away than the limit-th venue found so far can't change the answer
+            reach = self._reach(merged, lat, lon, radius, limit) if dense else radius
+            tiles = [
+                child
+                for geohash, bounds in dense
+                for child in covering_tiles(lat, lon, reach, len(geohash) + 1, within=bounds)
+            ]
+        if failures and len(failures) == fetched:
+            raise failures[0]
+        if failures:
+            print(f"⚠️ {len(failures)} of {fetched} search tiles failed: {failures[0]}")
+
+        places = list(merged.values())
+        if not places:
+            return {"results": []}
+        distances = haversine_matrix([lat], [lon], [p["latitude"] for p in places], [p["longitude"] for p in places])[0] * 1000
+        results = []
+        for place, distance in sorted(zip(places, distances.tolist()), key=lambda pair: pair[1]):
+            if distance > radius:
+                break
+            # Copies, since callers annotate results (photos) and tiles are shared
+            results.append({**place, "distance": int(round(distance))})
+        return {"results": results[:limit] if limit else results}
+
+    def _reach(self, merged: Dict[str, Dict[str, Any]], lat: float, lon: float, radius: int, limit: int | None) -> float:
+        if not limit or len(merged) < limit:
+            return radius
+        places = list(merged.values())
+        distances = haversine_matrix([lat], [lon], [p["latitude"] for p in places], [p["longitude"] for p in places])[0] * 1000
+        return min(float(np.partition(distances, limit - 1)[limit - 1]), radius)
+
+    def _warm(self, fetch: TileFetch, scope: Tuple[str, ...], lat: float, lon: float, missing: List[Tile], budget: int):
+        """Fetch up to budget of the missing cells nearest the centre in the background"""
+        if budget <= 0:
+            return
+        near_lats = [min(max(lat, bounds[0]), bounds[2]) for _, bounds in missing]
+        near_lons = [min(max(lon, bounds[1]), bounds[3]) for _, bounds in missing]
+        distances = haversine_matrix([lat], [lon], near_lats, near_lons)[0]
+        # Nobody waits for these, so they neither count against the request's deadline nor outrank its calls
+        with deadline.detached(), upstream_priority(BACKGROUND):
+            for i in np.argsort(distances, kind="stable")[:budget]:
+                geohash, bounds = missing[i]
+                key = scope + (geohash,)
+                metrics.incr("search_tiles.warmed")
+                task = asyncio.ensure_future(self._fetch_and_store(fetch, key, bounds))
+                task.add_done_callback(_report_warm_failure)
+                self._inflight[key] = task
+
+    def _fresh(self, key: Tuple[str, ...]) -> bool:
+        entry = self._tiles.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    async def _tile(self, fetch: TileFetch, key: Tuple[str, ...], bounds: Bounds) -> Tuple[List[Dict[str, Any]], bool]:
+        """(venues inside the cell, whether the fetch was cut off by the page size)"""
+        entry = self._tiles.get(key)
+        if entry is not None and entry[0] >= time.monotonic():
+            self._tiles.move_to_end(key)
+            metrics.incr("search_tiles.hits")
+            return entry[1], entry[2]
+
+        retried = False
+        while True:
+            task = self._inflight.get(key)
+            started_here = task is None
+            if started_here:
+                metrics.incr("search_tiles.misses")
+                # The cache owns the fetch, so one caller giving up can't cancel it for the others
+                task = asyncio.ensure_future(self._fetch_and_store(fetch, key, bounds))
+                self._inflight[key] = task
+            else:
+                metrics.incr("search_tiles.shared")
+            self._waiters[task] = self._waiters.get(task, 0) + 1
+            try:
+                return await asyncio.shield(task)
+            except DeadlineExceeded:
+                # The request that started a shared fetch ran out of time; this one may not have
+                if started_here or retried:
+                    raise
+                retried = True
+            except asyncio.CancelledError:
+                # Stop the fetch once nobody is left waiting for it
+                if self._waiters[task] == 1 and not task.done():
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+                    task.cancel()
+                raise
+            finally:
+                self._waiters[task] -= 1
+                if not self._waiters[task]:
+                    del self._waiters[task]
+
+    async def _fetch_and_store(self, fetch: TileFetch, key: Tuple[str, ...], bounds: Bounds) -> Tuple[List[Dict[str, Any]], bool]:
+        try:
+            outcome = await self._fetch_tile(fetch, bounds)
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        self._tiles[key] = (time.monotonic() + self.ttl_seconds, *outcome)
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return outcome
+
+    async def _fetch_tile(self, fetch: TileFetch, bounds: Bounds) -> Tuple[List[Dict[str, Any]], bool]:
+        south, west, north, east = bounds
+        center_lat, center_lon = (south + north) / 2, (west + east) / 2
+        corner_km = haversine_matrix([center_lat], [center_lon], [north], [east])[0, 0]
+        started = time.perf_counter()
+        results = await fetch(center_lat, center_lon, int(math.ceil(corner_km * 1000)))
+        metrics.observe("search_tiles.fetch", time.perf_counter() - started)
+
+        places = []
+        for place in results:
+            place_lat = place.get("latitude")
+            place_lon = place.get("longitude")
+            if not place.get("fsq_place_id") or place_lat is None or place_lon is None:
+                continue
+            # Each venue belongs to exactly one tile; neighbours fetch the rest
+            if south <= place_lat < north and west <= place_lon < east:
+                places.append(place)
+        return places, len(results) >= TILE_FETCH_LIMIT
+
+    def stats(self) -> Dict[str, Any]:
+        hits = metrics.counters["search_tiles.hits"] + metrics.counters["search_tiles.shared"]
+        misses = metrics.counters["search_tiles.misses"]
+        return {
+            "tiles": len(self._tiles),
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "too_cold": int(metrics.counters["search_tiles.too_cold"]),
+            "warmed": int(metrics.counters["search_tiles.warmed"]),
+        }
+
+def _report_warm_failure(task: "asyncio.Task[Any]"):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️ Background tile fetch failed: {task.exception()}")
+
+tile_cache = TileSearchCache(
+    ttl_seconds=settings.SEARCH_TILE_TTL_SECONDS,
+    max_tiles=settings.SEARCH_TILE_MAX_TILES,
+    max_cold_fetches=settings.SEARCH_TILE_MAX_COLD_FETCHES,
+)
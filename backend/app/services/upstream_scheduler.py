@@ -0,0 +1,168 @@
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, Optional, Set, Tuple, TypeVar
+from .metrics import metrics
+from .rate_limiter import TokenBucket
+
+T = TypeVar("T")
+
+INTERACTIVE = "interactive"
+HYDRATION = "hydration"
+BACKGROUND = "background"
+
+_priority: ContextVar[str] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+@contextmanager
+def upstream_priority(name: str) -> Iterator[None]:
+    """Run upstream calls made inside (and in tasks started inside) in the given priority class"""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+class UpstreamScheduler:
+    """Admits upstream calls under one rate limit and connection cap, by priority class.
+
+    Calls queue per class and are started in weighted fair order: each
+    queued call gets a virtual finish time of 1/weight after its class's
+    previous one, and the smallest goes next, so under contention the
+    classes share starts in proportion to their weights and none starves.
+    A call only starts when the rate limiter has a token and fewer than
+    max_concurrency calls are running. Calls in a preemptible class
+    (background) are cancelled when an interactive call is waiting for a
+    slot, then queued again, so their callers only see them take longer.
+    """
+
+    def __init__(
+        self,
+        limiter: TokenBucket,
+        max_concurrency: int,
+        weights: Dict[str, float],
+        preemptible: Tuple[str, ...] = (BACKGROUND,),
+    ):
+        self.limiter = limiter
+        self.max_concurrency = max_concurrency
+        self.weights = weights
+        self.preemptible = preemptible
+        self._queues: Dict[str, Deque[Tuple[float, asyncio.Future]]] = {name: deque() for name in weights}
+        self._last_finish: Dict[str, float] = {name: 0.0 for name in weights}
+        self._virtual_time = 0.0
+        self._running: Dict[str, int] = {name: 0 for name in weights}
+        self._preemptible_calls: Set[asyncio.Future] = set()
+        self._preempted: Set[asyncio.Future] = set()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._max_queued: Dict[str, int] = {name: 0 for name in weights}
+
+    async def run(self, call: Callable[[], Awaitable[T]], priority: str | None = None) -> T:
+        """Await call() once admitted; priority defaults to the caller's upstream_priority()"""
+        name = priority or _priority.get()
+        if name not in self.weights:
+            name = INTERACTIVE
+        metrics.incr(f"upstream.{name}.calls")
+        while True:
+            await self._admit(name)
+            try:
+                if name not in self.preemptible:
+                    return await call()
+                inner = asyncio.ensure_future(call())
+                self._preemptible_calls.add(inner)
+                try:
+                    return await inner
+                except asyncio.CancelledError:
+                    # Cancelled by _preempt rather than by our caller: queue up again
+                    if inner not in self._preempted:
+                        raise
+                    metrics.incr(f"upstream.{name}.preempted")
+                finally:
+                    self._preemptible_calls.discard(inner)
+                    self._preempted.discard(inner)
+            finally:
+                self._release(name)
+
+    async def _admit(self, name: str):
+        if self._free() and not any(self._queues.values()) and self.limiter.try_acquire():
+            self._running[name] += 1
+            return
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        finish = max(self._virtual_time, self._last_finish[name]) + 1 / self.weights[name]
+        self._last_finish[name] = finish
+        queue = self._queues[name]
+        queue.append((finish, granted))
+        self._max_queued[name] = max(self._max_queued[name], len(queue))
+        if name not in self.preemptible and not self._free():
+            self._preempt()
+        self._dispatch()
+        try:
+            await granted
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled():
+                # Admitted just as our caller gave up: hand the slot on
+                self._release(name)
+            else:
+                self._forget(name, granted)
+            raise
+
+    def _free(self) -> bool:
+        return sum(self._running.values()) < self.max_concurrency
+
+    def _preempt(self):
+        candidates = [call for call in self._preemptible_calls if call not in self._preempted and not call.done()]
+        if candidates:
+            call = candidates[-1]
+            self._preempted.add(call)
+            call.cancel()
+
+    def _release(self, name: str):
+        self._running[name] -= 1
+        self._dispatch()
+
+    def _forget(self, name: str, granted: asyncio.Future):
+        queue = self._queues[name]
+        for i, (_, waiter) in enumerate(queue):
+            if waiter is granted:
+                del queue[i]
+                break
+
+    def _dispatch(self):
+        """Start queued calls in virtual finish order while slots and tokens allow"""
+        while self._free():
+            heads = [(queue[0][0], name) for name, queue in self._queues.items() if queue]
+            if not heads:
+                return
+            wait = self.limiter.wait_time()
+            if wait > 0:
+                self._schedule_wakeup(wait)
+                return
+            if not self.limiter.try_acquire():
+                self._schedule_wakeup(1 / self.limiter.rate)
+                return
+            _, name = min(heads)
+            finish, granted = self._queues[name].popleft()
+            self._virtual_time = finish
+            self._running[name] += 1
+            granted.set_result(None)
+
+    def _schedule_wakeup(self, delay: float):
+        if self._wakeup is not None and not self._wakeup.cancelled():
+            return
+
+        def wake():
+            self._wakeup = None
+            self._dispatch()
+
+        self._wakeup = asyncio.get_running_loop().call_later(delay, wake)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "queued": len(self._queues[name]),
+                "max_queued": self._max_queued[name],
+                "running": self._running[name],
+                "weight": self.weights[name],
+            }
+            for name in self.weights
+        }
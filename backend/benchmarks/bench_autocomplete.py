@@ -0,0 +1,58 @@
+"""Autocomplete latency over a synthetic gazetteer plus venues arriving from searches.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_autocomplete [n_places] [n_venues]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from app.services import autocomplete, gazetteer as gazetteer_module
+from app.services.autocomplete import AutocompleteIndex
+from app.services.gazetteer import Gazetteer
+from app.services.place_index import place_index
+from benchmarks.bench_gazetteer import make_name, write_dump
+
+PREFIXES = ["k", "ka", "kal", "new", "new ga", "mount r", "pur", "zel", "bo", "quen"]
+
+def main():
+    n_places = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    n_venues = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "places.txt")
+        write_dump(path, n_places)
+        gazetteer_module._gazetteer = Gazetteer.from_geonames(path)
+
+        index = AutocompleteIndex()
+        start = time.perf_counter()
+        index._ensure_gazetteer()
+        print(f"gazetteer indexed in {time.perf_counter() - start:.2f}s")
+
+        batches = [[{
+            "fsq_place_id": f"v{b}-{i}",
+            "name": f"{make_name(rng)} Cafe",
+            "latitude": 26.9 + rng.uniform(-0.2, 0.2),
+            "longitude": 75.8 + rng.uniform(-0.2, 0.2),
+            "rating": rng.uniform(5, 9.5),
+        } for i in range(50)] for b in range(n_venues // 50)]
+        start = time.perf_counter()
+        for batch in batches:
+            place_index.add_places(batch)
+            index.add_venues(batch)
+        spent = time.perf_counter() - start
+        print(f"{n_venues} venues added in {spent:.2f}s ({spent / len(batches) * 1e3:.2f} ms per search response)")
+
+        for lat, lon in ((None, None), (26.9, 75.8)):
+            for prefix in PREFIXES:
+                start = time.perf_counter()
+                for _ in range(200):
+                    results = index.search(prefix, lat, lon)
+                spent = (time.perf_counter() - start) / 200
+                top = results[0]["name"] if results else "-"
+                print(f"{prefix!r:10} near={lat is not None!s:5} {spent * 1e6:7.0f} µs  top: {top}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Gazetteer load time, memory and lookup throughput on a synthetic GeoNames dump.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_gazetteer [n_places]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from app.services.gazetteer import Gazetteer
+
+SYLLABLES = [
+    "ka", "ra", "pur", "ga", "bad", "na", "li", "ma", "de", "sh", "abu", "ton", "ville", "berg", "o", "an", "el", "ur",
+    "vi", "ze", "lo", "tam", "dor", "ri", "su", "hal", "mir", "qu", "en", "bo",
+]
+
+MESSAGES = [
+    "best cafes in kalipur", "planning to visit mount rabad next week", "hi there", "what is your name",
+    "coffee shops near me", "thinking of going to germany for a holiday", "where to eat in new ganaberg",
+    "tell me a joke", "top museums to see around here", "any parks nearby?",
+]
+
+def make_name(rng: random.Random) -> str:
+    word = lambda: "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+    prefix = rng.random()
+    if prefix < 0.05:
+        return f"Mount {word()}"
+    if prefix < 0.1:
+        return f"New {word()}"
+    return word()
+
+def write_dump(path: str, n: int):
+    rng = random.Random(5)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            name = make_name(rng)
+            cols = [str(i), name, name, "", f"{rng.uniform(-60, 70):.4f}", f"{rng.uniform(-180, 180):.4f}",
+                    "P", "PPL", rng.choice(["IN", "US", "DE", "FR"]), "", "", "", "", "", str(rng.randint(500, 2_000_000)),
+                    "", "", "", ""]
+            f.write("\t".join(cols) + "\n")
+        f.write("\t".join([str(n), "Germany", "Germany", "Deutschland", "51.1657", "10.4515", "A", "PCLI", "DE",
+                           "", "", "", "", "", "82927922", "", "", "", ""]) + "\n")
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "places.txt")
+        write_dump(path, n)
+
+        gazetteer, parse_s = timed(lambda: Gazetteer.from_geonames(path))
+        _, save_s = timed(lambda: gazetteer.save_cache(path + ".npz"))
+        cached, load_s = timed(lambda: Gazetteer.load_cache(path + ".npz"))
+
+        # Memory is measured on separate runs; tracing slows loading several times over
+        tracemalloc.start()
+        Gazetteer.from_geonames(path)
+        _, parse_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        tracemalloc.start()
+        kept = Gazetteer.load_cache(path + ".npz")
+        resident, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del kept
+
+        print(f"{len(gazetteer)} places, {len(gazetteer.index)} names")
+        print(f"parse dump:  {parse_s:.2f}s (peak {parse_peak / 1e6:.0f} MB)")
+        print(f"write cache: {save_s:.2f}s ({os.path.getsize(path + '.npz') / 1e6:.1f} MB on disk)")
+        print(f"load cache:  {load_s:.2f}s ({resident / 1e6:.0f} MB resident)")
+
+        messages = MESSAGES * 5000
+        _, find_s = timed(lambda: [cached.find(m) for m in messages])
+        print(f"find:   {len(messages) / find_s:,.0f} messages/s")
+        names = list(cached.index)[:50000]
+        _, lookup_s = timed(lambda: [cached.lookup(name) for name in names])
+        print(f"lookup: {len(names) / lookup_s:,.0f} names/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Foursquare latency percentiles with and without request hedging.
+
+Starts the local stand-in (benchmarks/foursquare_standin.py) in its own
+process and replays the same stream of searches against it twice, hedging off
+then on, through FoursquareService. Run from the backend directory:
+
+    python -m benchmarks.bench_hedging [n_requests] [concurrency]
+"""
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+import httpx
+import numpy as np
+from app.config import settings
+from app.services import foursquare_service
+from app.services.foursquare_service import FoursquareService
+from app.services.hedging import HedgePolicy
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_until_up(base_url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"{base_url}/places/probe/tips")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("stand-in server did not start")
+
+async def run(n: int, concurrency: int, hedging: bool):
+    settings.FOURSQUARE_HEDGING = hedging
+    foursquare_service.hedge_policy = HedgePolicy(settings.FOURSQUARE_HEDGE_PERCENTILE, settings.FOURSQUARE_HEDGE_MAX_EXTRA)
+    fs = FoursquareService(api_key="standin")
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            # Plain search without a radius, so the tile cache doesn't answer repeats
+            await fs.search(26.9 + (i % 50) * 1e-3, 75.8, query="cafe", limit=10)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return np.asarray(latencies) * 1000, foursquare_service.hedge_policy.stats()
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.foursquare_standin", str(port)])
+    settings.FOURSQUARE_BASE_URL = f"http://127.0.0.1:{port}"
+    settings.FOURSQUARE_RATE_LIMIT_PER_SECOND = 0
+    foursquare_service.rate_limiter.rate = 0
+    try:
+        await wait_until_up(settings.FOURSQUARE_BASE_URL)
+        for hedging in (False, True):
+            latencies, stats = await run(n, concurrency, hedging)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            print(f"hedging {'on ' if hedging else 'off'}: p50 {p50:6.0f} ms  p95 {p95:6.0f} ms  p99 {p99:6.0f} ms  "
+                  f"extra calls {stats['extra_calls']:.1%} ({stats['hedge_wins']} hedges won)")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
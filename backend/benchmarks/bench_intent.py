@@ -0,0 +1,72 @@
+"""Intent classifier throughput, compared with the original per-pattern scoring.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_intent
+"""
+import random
+import re
+import time
+from app.services.intent_classifier import (
+    ACTIVITY_WORDS, CITY_NAMES, PERSONAL_RULES, TRAVEL_RULES, IntentClassifier, _phrase_regex,
+)
+
+SAMPLE_MESSAGES = [
+    "hi there", "what is your name", "my name is Asha", "thanks, bye!",
+    "best cafes near me", "I want to go to Jaipur next week", "planning to visit mount abu",
+    "where to visit in udaipur", "find a good restaurant around here", "tell me a joke",
+    "how are you doing today", "coffee shops in bangalore", "what's the weather like",
+    "thinking of going to dubai for a holiday", "top museums to see", "any parks nearby?",
+]
+
+def _rule(phrases, bounded) -> str:
+    return rf"\b({'|'.join(_phrase_regex(p) for p in phrases)})" + (r"\b" if bounded else "")
+
+# Pattern strings as the old implementation had them inline (re caches their compilation)
+LEGACY_TRAVEL = [_rule(*r) for r in TRAVEL_RULES]
+LEGACY_PERSONAL = [_rule(*r) for r in PERSONAL_RULES]
+LEGACY_CITY = _rule(CITY_NAMES, True)
+LEGACY_ACTIVITY = _rule(ACTIVITY_WORDS, True)
+
+def legacy_scores(query: str):
+    """Per-pattern re.findall scoring as it was before the compiled classifier"""
+    q = query.lower()
+    travel = 0
+    personal = 0
+    for pattern in LEGACY_TRAVEL:
+        matches = re.findall(pattern, q)
+        if matches:
+            travel += len(matches) * 0.4
+    for pattern in LEGACY_PERSONAL:
+        matches = re.findall(pattern, q)
+        if matches:
+            personal += len(matches) * 0.3
+    return travel, personal, re.findall(LEGACY_CITY, q), re.findall(LEGACY_ACTIVITY, q)
+
+def make_messages(n: int):
+    rng = random.Random(11)
+    words = " ".join(SAMPLE_MESSAGES).split()
+    messages = list(SAMPLE_MESSAGES)
+    while len(messages) < n:
+        messages.append(" ".join(rng.choice(words) for _ in range(rng.randint(2, 30))))
+    return messages
+
+def rate(fn, messages) -> float:
+    start = time.perf_counter()
+    fn(messages)
+    return len(messages) / (time.perf_counter() - start)
+
+def main():
+    messages = make_messages(20000)
+    classifier = IntentClassifier()
+
+    legacy = rate(lambda ms: [legacy_scores(m) for m in ms], messages)
+    single = rate(lambda ms: [classifier.classify(m) for m in ms], messages)
+    batch = rate(classifier.classify_batch, messages)
+
+    print(f"legacy findall scoring: {legacy:10.0f} msg/s")
+    print(f"compiled classify:      {single:10.0f} msg/s")
+    print(f"compiled classify_batch:{batch:10.0f} msg/s")
+
+if __name__ == "__main__":
+    main()
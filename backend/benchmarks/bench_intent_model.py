@@ -0,0 +1,64 @@
+"""Routing accuracy and latency: regex intent scoring vs the learned model.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_intent_model [labeled.tsv]
+
+Accuracy is measured with 5-fold cross-validation over the labeled file, so
+the model is never scored on messages it was trained on.
+"""
+import random
+import sys
+import time
+from app.services.intent_classifier import IntentClassifier
+from app.services.intent_model import DEFAULT_TRAINING_PATH, IntentModel, ModelIntentClassifier, read_labeled_file
+
+FOLDS = 5
+
+def regex_route(classifier: IntentClassifier, message: str) -> str:
+    """Final route the chat handler takes for a regex classification"""
+    query_type, _, _ = classifier.classify(message)
+    if query_type == "general":
+        # Mirrors ChatHandler.process_message's fallback for general queries
+        return "travel" if any(w in message.lower() for w in ["place", "visit", "go", "see", "find"]) else "personal"
+    return query_type
+
+def per_message_us(fn, messages, repeat: int = 20) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for m in messages:
+            fn(m)
+    return (time.perf_counter() - start) / (repeat * len(messages)) * 1e6
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TRAINING_PATH
+    texts, labels = read_labeled_file(path)
+    pairs = list(zip(texts, labels))
+    random.Random(0).shuffle(pairs)
+
+    rules = IntentClassifier()
+    regex_correct = sum(regex_route(rules, t) == l for t, l in pairs)
+
+    model_correct = 0
+    for fold in range(FOLDS):
+        test = pairs[fold::FOLDS]
+        train = [p for i, p in enumerate(pairs) if i % FOLDS != fold]
+        model = IntentModel.train([t for t, _ in train], [l for _, l in train])
+        predicted = model.predict_batch([t for t, _ in test])
+        model_correct += sum(p == l for (p, _), (_, l) in zip(predicted, test))
+
+    print(f"examples: {len(pairs)}")
+    print(f"regex routing accuracy: {regex_correct / len(pairs):.1%}")
+    print(f"model routing accuracy: {model_correct / len(pairs):.1%} ({FOLDS}-fold CV)")
+
+    model = ModelIntentClassifier(IntentModel.train(texts, labels), rules)
+    messages = [t for t, _ in pairs]
+    print(f"regex classify:        {per_message_us(rules.classify, messages):7.1f} us/msg")
+    print(f"model classify:        {per_message_us(model.classify, messages):7.1f} us/msg")
+    start = time.perf_counter()
+    model.classify_batch(messages * 20)
+    batch_us = (time.perf_counter() - start) / (len(messages) * 20) * 1e6
+    print(f"model classify_batch:  {batch_us:7.1f} us/msg")
+
+if __name__ == "__main__":
+    main()
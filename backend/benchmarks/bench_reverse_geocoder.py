@@ -0,0 +1,35 @@
+"""Reverse geocoder build time and lookup latency on a synthetic locality set.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_reverse_geocoder [n_localities]
+"""
+import sys
+import time
+import numpy as np
+from app.services.reverse_geocoder import ReverseGeocoder
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    rng = np.random.default_rng(7)
+    lats = rng.uniform(-60, 70, n)
+    lons = rng.uniform(-180, 180, n)
+
+    start = time.perf_counter()
+    geocoder = ReverseGeocoder([f"Place {i}" for i in range(n)], lats, lons, ["XX"] * n, [None] * n, {})
+    print(f"{n} localities indexed in {time.perf_counter() - start:.2f}s")
+
+    points = list(zip(rng.uniform(-60, 70, 20_000).tolist(), rng.uniform(-180, 180, 20_000).tolist()))
+    start = time.perf_counter()
+    for lat, lon in points:
+        geocoder.lookup(lat, lon)
+    cold = (time.perf_counter() - start) / len(points)
+
+    start = time.perf_counter()
+    for lat, lon in points:
+        geocoder.lookup(lat, lon)
+    warm = (time.perf_counter() - start) / len(points)
+    print(f"lookup: {cold * 1e6:.1f} µs uncached, {warm * 1e6:.2f} µs cached")
+
+if __name__ == "__main__":
+    main()
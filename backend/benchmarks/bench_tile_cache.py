@@ -0,0 +1,121 @@
+"""Upstream calls and recall of tiled venue searches on a replayed request trace.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_tile_cache [trace.csv]
+
+The trace has one search per line: lat,lon,query,radius_m (e.g. exported
+from access logs). Without one, a synthetic trace of users clustered
+around a few Jaipur hotspots, panning and re-searching, is replayed. The
+upstream is simulated over a fixed field of venues and answers like
+Foursquare: the nearest `limit` venues within the radius.
+
+Also reported: the cold cost, i.e. upstream calls for a single search at a
+few radii against an empty cache, where a direct search makes one call.
+A search that falls back also warms the nearest missing tiles, which is
+counted in its cost.
+"""
+import asyncio
+import csv
+import random
+import sys
+import time
+import numpy as np
+from app.services.geo import haversine_matrix
+from app.services.tile_cache import TILE_FETCH_LIMIT, TileSearchCache
+
+HOTSPOTS = [(26.9239, 75.8267), (26.9124, 75.7873), (26.8549, 75.8050), (26.9855, 75.8513), (26.8880, 75.7400)]
+QUERIES = ["cafe", "cafe", "cafe", "restaurant", "park", "museum"]
+RESULT_LIMIT = 20
+
+class Upstream:
+    def __init__(self, n: int, rng: random.Random):
+        self.lats = np.array([rng.gauss(26.9, 0.06) for _ in range(n)])
+        self.lons = np.array([rng.gauss(75.8, 0.06) for _ in range(n)])
+        self.kinds = np.array([rng.choice(QUERIES) for _ in range(n)])
+        self.calls = 0
+
+    async def search(self, lat: float, lon: float, query: str, radius: int, limit: int):
+        self.calls += 1
+        picked = np.nonzero(self.kinds == query)[0]
+        distances = haversine_matrix([lat], [lon], self.lats[picked], self.lons[picked])[0] * 1000
+        inside = np.argsort(distances)[: np.searchsorted(np.sort(distances), radius, side="right")][:limit]
+        return [
+            {"fsq_place_id": str(picked[i]), "latitude": float(self.lats[picked[i]]), "longitude": float(self.lons[picked[i]])}
+            for i in inside
+        ]
+
+def synthetic_trace(rng: random.Random, n: int = 2000):
+    trace = []
+    while len(trace) < n:
+        lat, lon = rng.choice(HOTSPOTS)
+        lat, lon = lat + rng.gauss(0, 0.004), lon + rng.gauss(0, 0.004)
+        query, radius = rng.choice(QUERIES), rng.choice([1000, 2000, 2000, 3000])
+        # A session: a first search, then a few pans of a few hundred metres
+        for _ in range(rng.randint(1, 4)):
+            trace.append((lat, lon, query, radius))
+            lat, lon = lat + rng.uniform(-0.004, 0.004), lon + rng.uniform(-0.004, 0.004)
+    return trace[:n]
+
+def load_trace(path: str):
+    with open(path, newline="") as f:
+        return [(float(lat), float(lon), query, int(radius)) for lat, lon, query, radius in csv.reader(f)]
+
+async def replay(trace, upstream: Upstream):
+    cache = TileSearchCache()
+    recalls = []
+    started = time.perf_counter()
+    for lat, lon, query, radius in trace:
+        async def fetch(tile_lat, tile_lon, tile_radius, query=query):
+            return await upstream.search(tile_lat, tile_lon, query, tile_radius, TILE_FETCH_LIMIT)
+        tiled = await cache.search(fetch, lat, lon, radius, query, limit=RESULT_LIMIT)
+        if tiled is None:
+            # Too cold: the service falls back to one direct search
+            tiled = {"results": await upstream.search(lat, lon, query, radius, RESULT_LIMIT)}
+        calls = upstream.calls
+        direct = await upstream.search(lat, lon, query, radius, RESULT_LIMIT)
+        upstream.calls = calls
+        expected = {p["fsq_place_id"] for p in direct}
+        if expected:
+            recalls.append(len(expected & {p["fsq_place_id"] for p in tiled["results"]}) / len(expected))
+    return time.perf_counter() - started, cache, recalls
+
+async def cold_calls(upstream: Upstream, rng: random.Random, radius: int, samples: int = 50):
+    """Mean upstream calls of one search against an empty cache, and how often it fell back to a direct search"""
+    calls = []
+    fallbacks = 0
+    for _ in range(samples):
+        cache = TileSearchCache()
+        lat, lon = rng.gauss(26.9, 0.03), rng.gauss(75.8, 0.03)
+        before = upstream.calls
+
+        async def fetch(tile_lat, tile_lon, tile_radius):
+            return await upstream.search(tile_lat, tile_lon, "cafe", tile_radius, TILE_FETCH_LIMIT)
+
+        if await cache.search(fetch, lat, lon, radius, "cafe", limit=RESULT_LIMIT) is None:
+            fallbacks += 1
+            await upstream.search(lat, lon, "cafe", radius, RESULT_LIMIT)
+        # Background warm-up fetches it started count towards its cost
+        while cache._inflight:
+            await asyncio.gather(*list(cache._inflight.values()))
+        calls.append(upstream.calls - before)
+    return np.mean(calls), np.max(calls), fallbacks / samples
+
+def main():
+    rng = random.Random(3)
+    trace = load_trace(sys.argv[1]) if len(sys.argv) > 1 else synthetic_trace(rng)
+    upstream = Upstream(6000, rng)
+    spent, cache, recalls = asyncio.run(replay(trace, upstream))
+    stats = cache.stats()
+    print(f"{len(trace)} searches replayed in {spent:.2f}s")
+    print(f"upstream calls: {upstream.calls} tiled vs {len(trace)} direct ({1 - upstream.calls / len(trace):.0%} saved)")
+    print(f"tile hit rate: {stats['hit_rate']:.1%} over {stats['tiles']} tiles")
+    print(f"recall of the direct top {RESULT_LIMIT}: {np.mean(recalls):.1%} mean, {np.percentile(recalls, 5):.1%} p5")
+    print(f"fell back to direct searches: {stats['too_cold']}")
+    print("cold cost per search (a direct search makes 1 call):")
+    for radius in (1000, 2000, 3000, 5000):
+        mean, worst, fell_back = asyncio.run(cold_calls(upstream, rng, radius))
+        print(f"  {radius / 1000:.0f} km: {mean:.1f} calls mean, {worst} max, {fell_back:.0%} fell back to direct")
+
+if __name__ == "__main__":
+    main()
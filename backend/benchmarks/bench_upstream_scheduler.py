@@ -0,0 +1,70 @@
+"""Search latency during a photo hydration burst, with and without priority classes.
+
+Starts the Foursquare stand-in (benchmarks/foursquare_standin.py) in its own
+process, caps the upstream at a low rate so calls have to queue, then fires a
+burst of photo lookups (many result lists hydrating at once) with searches arriving steadily on top. Runs once with
+every call in one class (first come, first served) and once with photos as
+hydration and a slice of searches as background prefetches. Run from the
+backend directory:
+
+    python -m benchmarks.bench_upstream_scheduler [photos] [searches] [rate]
+"""
+import asyncio
+import subprocess
+import sys
+import time
+import numpy as np
+from app.config import settings
+from app.services import foursquare_service
+from app.services.foursquare_service import FoursquareService
+from app.services.rate_limiter import TokenBucket
+from app.services.upstream_scheduler import BACKGROUND, INTERACTIVE, UpstreamScheduler, upstream_priority
+from benchmarks.bench_hedging import free_port, wait_until_up
+
+async def run(photos: int, searches: int, rate: float, prioritised: bool):
+    weights = settings.UPSTREAM_PRIORITY_WEIGHTS if prioritised else {INTERACTIVE: 1.0}
+    scheduler = UpstreamScheduler(TokenBucket(rate, burst=5), settings.FOURSQUARE_MAX_CONCURRENCY, weights)
+    foursquare_service.scheduler = scheduler
+    fs = FoursquareService(api_key="standin")
+    places = [{"fsq_place_id": f"standin-{i}"} for i in range(photos)]
+    latencies = {INTERACTIVE: [], BACKGROUND: []}
+
+    async def search(i: int):
+        await asyncio.sleep(i * 0.1)
+        kind = BACKGROUND if i % 4 == 3 else INTERACTIVE
+        started = time.perf_counter()
+        with upstream_priority(kind):
+            await fs.search(26.9 + i * 1e-3, 75.8, query="cafe", limit=10, tiled=False)
+        latencies[kind].append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    # Result lists of 20, as if many users' searches were being hydrated together
+    hydration = asyncio.gather(*(fs.attach_photos(places[i:i + 20]) for i in range(0, photos, 20)))
+    await asyncio.gather(*(search(i) for i in range(searches)))
+    await hydration
+    return latencies, time.perf_counter() - started
+
+async def main():
+    photos = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    searches = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 60.0
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.foursquare_standin", str(port)])
+    settings.FOURSQUARE_BASE_URL = f"http://127.0.0.1:{port}"
+    try:
+        await wait_until_up(settings.FOURSQUARE_BASE_URL)
+        for prioritised in (False, True):
+            latencies, total = await run(photos, searches, rate, prioritised)
+            interactive = np.asarray(latencies[INTERACTIVE])
+            background = np.asarray(latencies[BACKGROUND])
+            print(f"{'priority classes' if prioritised else 'single queue    '}: "
+                  f"search p50 {np.percentile(interactive, 50):6.0f} ms  p95 {np.percentile(interactive, 95):6.0f} ms  "
+                  f"prefetch p50 {np.percentile(background, 50):6.0f} ms  burst done in {total:4.1f} s")
+            if prioritised:
+                print(f"  preempted prefetches: {foursquare_service.metrics.counters.get('upstream.background.preempted', 0):.0f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""Viewport clustering benchmark over 100k synthetic places.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_viewport
+"""
+import time
+import numpy as np
+from app.services.place_index import PlaceIndex
+
+N_PLACES = 100_000
+CENTER = (26.9124, 75.7873)
+
+def make_places(n: int, rng: np.random.Generator):
+    # A dense core plus a sparse ring, roughly like a city's venue spread
+    core = rng.normal(0, 0.03, size=(n // 2, 2))
+    outer = rng.normal(0, 0.25, size=(n - n // 2, 2))
+    offsets = np.vstack([core, outer])
+    return [
+        {
+            "fsq_place_id": f"p{i}",
+            "name": f"Place {i}",
+            "categories": [{"name": "Cafe"}],
+            "latitude": CENTER[0] + dlat,
+            "longitude": CENTER[1] + dlon,
+            "rating": float(rng.uniform(5, 10)),
+        }
+        for i, (dlat, dlon) in enumerate(offsets)
+    ]
+
+def timed(fn, repeat: int = 1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat * 1000
+
+def main():
+    rng = np.random.default_rng(7)
+    places = make_places(N_PLACES, rng)
+    index = PlaceIndex()
+
+    _, ingest_ms = timed(lambda: index.add_places(places))
+    print(f"ingest {N_PLACES} places: {ingest_ms:.1f} ms")
+
+    for zoom in (8, 11, 13, 15, 17):
+        # Viewport roughly the size of a phone screen at this zoom
+        span = 360.0 / 2 ** zoom * 1.5
+        bbox = (CENTER[0] - span / 2, CENTER[1] - span / 2, CENTER[0] + span / 2, CENTER[1] + span / 2)
+        _, build_ms = timed(lambda: index._build_level(zoom))
+        index._levels.pop(zoom, None)
+        clusters, first_ms = timed(lambda: index.viewport(*bbox, zoom))
+
+        pans = []
+        for _ in range(50):
+            dlat, dlon = rng.uniform(-span, span, size=2)
+            pans.append((bbox[0] + dlat, bbox[1] + dlon, bbox[2] + dlat, bbox[3] + dlon))
+        _, pan_ms = timed(lambda: [index.viewport(*b, zoom) for b in pans])
+        points = sum(c["count"] for c in clusters)
+        print(
+            f"zoom {zoom:2d}: {len(clusters):4d} clusters / {points:6d} points, "
+            f"level build {build_ms:6.1f} ms, first query {first_ms:6.1f} ms, "
+            f"pan {pan_ms / len(pans):.3f} ms/query"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Local stand-in for the Foursquare Places API with a heavy latency tail.
+
+Serves /places/search, /places/{id}, /photos and /tips with fake venues. Most
+responses take tens of milliseconds; a small share take seconds, like the
+occasional slow upstream responses we see in production. Point the backend at
+it with FOURSQUARE_BASE_URL and any FOURSQUARE_API_KEY:
+
+    python -m benchmarks.foursquare_standin [port]
+"""
+import asyncio
+import random
+import sys
+from fastapi import FastAPI, Request
+
+# (probability, low, high) seconds: mostly fast, sometimes slow, rarely very slow
+LATENCY_PROFILE = [(0.96, 0.02, 0.08), (0.03, 0.3, 0.8), (0.01, 1.5, 3.0)]
+
+app = FastAPI(title="Foursquare stand-in")
+rng = random.Random(7)
+
+async def _delay():
+    roll = rng.random()
+    for probability, low, high in LATENCY_PROFILE:
+        if roll < probability:
+            await asyncio.sleep(rng.uniform(low, high))
+            return
+        roll -= probability
+    await asyncio.sleep(LATENCY_PROFILE[-1][2])
+
+@app.get("/places/search")
+async def search(request: Request, ll: str = "26.9124,75.7873", query: str = "", limit: int = 20):
+    await _delay()
+    lat, lon = map(float, ll.split(","))
+    return {"results": [
+        {
+            "fsq_place_id": f"standin-{query or 'place'}-{i}",
+            "name": f"{(query or 'Place').title()} {i}",
+            "latitude": lat + 0.001 * i,
+            "longitude": lon + 0.001 * i,
+            "distance": 150 * i,
+            "categories": [{"name": (query or "Place").title()}],
+            "location": {"locality": "Jaipur"},
+        }
+        for i in range(min(limit, 50))
+    ]}
+
+@app.get("/places/{place_id}")
+async def details(place_id: str):
+    await _delay()
+    return {"fsq_place_id": place_id, "name": place_id, "latitude": 26.9124, "longitude": 75.7873}
+
+@app.get("/places/{place_id}/photos")
+async def photos(place_id: str):
+    await _delay()
+    return []
+
+@app.get("/places/{place_id}/tips")
+async def tips(place_id: str):
+    await _delay()
+    return []
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=int(sys.argv[1]) if len(sys.argv) > 1 else 8765, log_level="warning")
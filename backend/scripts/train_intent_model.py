@@ -0,0 +1,34 @@
+"""Train the hashed n-gram intent model from a labeled file.
+
+Run from the backend directory:
+
+    python -m scripts.train_intent_model [labeled.tsv] [output.npz]
+
+Defaults to app/data/intent_training.tsv and app/data/intent_model.npz.
+Set INTENT_BACKEND=model to route chat messages with the result.
+"""
+import random
+import sys
+from app.services.intent_model import DEFAULT_MODEL_PATH, DEFAULT_TRAINING_PATH, IntentModel, read_labeled_file
+
+def main():
+    data_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TRAINING_PATH
+    out_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODEL_PATH
+    texts, labels = read_labeled_file(data_path)
+
+    # Report held-out accuracy before fitting on everything
+    pairs = list(zip(texts, labels))
+    random.Random(0).shuffle(pairs)
+    cut = int(len(pairs) * 0.8)
+    train, test = pairs[:cut], pairs[cut:]
+    model = IntentModel.train([t for t, _ in train], [l for _, l in train])
+    predicted = model.predict_batch([t for t, _ in test])
+    correct = sum(p == l for (p, _), (_, l) in zip(predicted, test))
+    print(f"held-out accuracy: {correct}/{len(test)} ({correct / len(test):.1%})")
+
+    model = IntentModel.train(texts, labels)
+    model.save(out_path)
+    print(f"trained on {len(texts)} examples, saved {out_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+from app.services.gazetteer import Gazetteer
+from app.services.intent_classifier import IntentClassifier
+
+# Rows as they appear in cities5000.txt: native name, ASCII name, alternates, population
+ROWS = [
+    ("3093133", "Łódź", "Lodz", "Lodsch,Lodz,Łódź,Лодзь", "51.75", "19.46667", "P", "PPLA", "PL", "768755"),
+    ("2886242", "Köln", "Koeln", "Cologne,Koeln,Köln,Кёльн", "50.93333", "6.95", "P", "PPLA2", "DE", "963395"),
+    ("3448439", "São Paulo", "Sao Paulo", "Sampa,Sao Paulo,São Paulo", "-23.5475", "-46.63611", "P", "PPLA", "BR", "10021295"),
+    ("750598", "Çan", "Can", "Can,Çan", "40.02694", "27.05139", "P", "PPLA2", "TR", "30428"),
+    ("2287298", "Man", "Man", "Man", "7.41251", "-7.55383", "P", "PPLA", "CI", "146974"),
+    ("1268008", "Udaipur", "Udaipur", "Udaypur", "24.58584", "73.71346", "P", "PPL", "IN", "451100"),
+    ("2921044", "Germany", "Germany", "Deutschland,Allemagne", "51.5", "10.5", "A", "PCLI", "DE", "82927922"),
+]
+
+def write_dump(path):
+    with open(path, "w", encoding="utf-8") as f:
+        for geonameid, name, ascii_name, alternates, lat, lon, feature_class, code, country, population in ROWS:
+            cols = [geonameid, name, ascii_name, alternates, lat, lon, feature_class, code, country] + [""] * 5 + [population] + [""] * 4
+            f.write("\t".join(cols) + "\n")
+
+def load(tmp_path):
+    path = tmp_path / "cities5000.txt"
+    write_dump(path)
+    return Gazetteer.from_geonames(str(path))
+
+def test_native_names_are_ascii_folded(tmp_path):
+    gazetteer = load(tmp_path)
+    assert {"lodz", "koln", "sao paulo", "can", "man"} <= set(gazetteer.index)
+    assert not {"d", "k ln", "s o paulo", "l d"} & set(gazetteer.index)
+    assert gazetteer.find("Weekend in São Paulo") == ["sao paulo"]
+    assert gazetteer.lookup("Köln")["name"] == "Köln"
+
+def test_small_towns_need_a_capital(tmp_path):
+    gazetteer = load(tmp_path)
+    assert gazetteer.find("can you tell me a joke") == []
+    assert gazetteer.find("hi man how are you") == []
+    assert gazetteer.find("Man, what a day") == []
+    assert gazetteer.find("heading to Man next week") == ["man"]
+    # Big cities and countries match however they are typed
+    assert gazetteer.find("cafes in udaipur and lodz") == ["udaipur", "lodz"]
+    assert gazetteer.find("trip to germany") == ["germany"]
+
+def test_everyday_messages_have_no_city(tmp_path):
+    classifier = IntentClassifier(load(tmp_path))
+    assert "city" not in classifier.classify("I'd like to know the time")[2]
+    for message in ["can you tell me a joke", "hi man how are you"]:
+        query_type, _, info = classifier.classify(message)
+        assert query_type != "travel", message
+        assert "city" not in info, message
+    query_type, _, info = classifier.classify("best cafes in Köln")
+    assert query_type == "travel" and info["city"] == "koln"
@@ -0,0 +1,44 @@
+import asyncio
+import random
+import numpy as np
+from app.services.geo import haversine_matrix
+from app.services.tile_cache import TILE_FETCH_LIMIT, TileSearchCache
+
+class DenseField:
+    """Upstream over a few thousand venues packed into a couple of km, answering like Foursquare"""
+
+    def __init__(self, lat: float, lon: float, n: int = 4000):
+        rng = random.Random(3)
+        self.lats = np.array([lat + rng.gauss(0, 0.01) for _ in range(n)])
+        self.lons = np.array([lon + rng.gauss(0, 0.01) for _ in range(n)])
+        self.calls = 0
+
+    async def fetch(self, lat: float, lon: float, radius: int):
+        self.calls += 1
+        distances = haversine_matrix([lat], [lon], self.lats, self.lons)[0] * 1000
+        nearest = [i for i in np.argsort(distances) if distances[i] <= radius][:TILE_FETCH_LIMIT]
+        return [{"fsq_place_id": str(i), "latitude": float(self.lats[i]), "longitude": float(self.lons[i])} for i in nearest]
+
+def test_dense_area_warms_up_over_repeated_searches():
+    lat, lon = 26.9239, 75.8267
+    field = DenseField(lat, lon)
+    cache = TileSearchCache(max_cold_fetches=6)
+
+    async def run():
+        served = []
+        for _ in range(20):
+            before = field.calls
+            result = await cache.search(field.fetch, lat, lon, 1000, "cafe", limit=20)
+            # Background warm-up fetches finish before the next search
+            while cache._inflight:
+                await asyncio.gather(*list(cache._inflight.values()))
+            assert field.calls - before <= cache.max_cold_fetches
+            served.append((result, field.calls - before))
+        return served
+
+    served = asyncio.run(run())
+    assert served[0][0] is None
+    # Eventually answered from tiles alone, with no upstream calls
+    result, calls = served[-1]
+    assert result is not None and calls == 0
+    assert len(result["results"]) == 20